@@ -1,20 +1,109 @@
+import functools
 import streamlit as st
-import json
-import os
+import time
 from datetime import datetime
 
-from router.query_router import router
+from router.query_router import RuleRouter, router
+from router.scheduler import RequestScheduler, SchedulerOverloaded
+from router.cache_index import CacheIndex
 from evaluation.evaluator import Evaluator
+from evaluation.report_index import CsvReport, ReportIndex
 from config import Config
 
+# Results kept per browser session, oldest dropped first
+MAX_SESSION_RESULTS = 50
+# Seconds between reruns while a query is still running
+POLL_INTERVAL = 0.3
+CACHE_PAGE_SIZE = 50
+REPORT_PAGE_SIZE = 20
+TEST_QUERY_PREVIEW = 100
+
+
+@st.cache_resource
+def get_cache():
+    """Query cache shared by every session and router"""
+    return router.cache
+
+
+@st.cache_resource
+def get_router(model_provider):
+    """One router per model provider for the whole process"""
+    if model_provider == router.model_provider:
+        return router
+    return RuleRouter(model_provider=model_provider, cache=get_cache())
+
+
+@st.cache_resource
+def get_evaluator():
+    """Evaluator with the test queries loaded once per process"""
+    return Evaluator()
+
+
+@st.cache_resource
+def get_cache_index():
+    """Paginated index over the cache file, shared by every session"""
+    return CacheIndex(get_cache().cache_file)
+
+
+@st.cache_resource
+def get_report_index():
+    """Index of evaluation reports, shared by every session"""
+    return ReportIndex()
+
+
+@st.cache_resource
+def get_scheduler(model_provider):
+    """Per-tier workers that run model calls off the script thread, with
+    UI queries ahead of any batch work in the same process"""
+    return RequestScheduler(get_router(model_provider))
+
+
+def run_query(query_router, query, model_level, use_cache, level=None,
+              session=None, complexity=None):
+    """Route (or send straight to a tier) and time one query in the context
+    of session, which is only read here: this runs on scheduler workers
+    and the script thread adds the turn. level is the tier the scheduler
+    finally runs it on, complexity the classification it was queued
+    under."""
+    start = time.perf_counter()
+
+    if model_level == "Router":
+        result = query_router.route_query_and_return_response(
+            query,
+            use_cache=use_cache,
+            model_level=level,
+            session=session,
+            complexity=complexity,
+            record_turn=False
+        )
+    else:
+        # Use specific model level
+        response, model_name = query_router.generate_on_tier(
+            session.prompt_for(query) if session else query,
+            level or model_level
+        )
+        result = {
+            "query": query,
+            "response": response,
+            "complexity": model_level,
+            "model_name": model_name,
+            "cached": False
+        }
+
+    return result, time.perf_counter() - start
+
 
 class DynamicRoutingUI:
     def __init__(self):
         """Initialize the UI components"""
-        self.config = Config()
-        self.router = router
-        self.evaluator = Evaluator()
         self.setup_page_config()
+        self.config = Config()
+        self.evaluator = get_evaluator()
+        self.model_provider = st.session_state.get(
+            "model_provider",
+            self.config.MODEL_PROVIDER
+        )
+        self.router = get_router(self.model_provider)
 
     def setup_page_config(self):
         """Configure Streamlit page settings"""
@@ -30,22 +119,24 @@ class DynamicRoutingUI:
 
         # Model Provider
         st.sidebar.subheader("Model Provider")
+        providers = list(self.config.MODEL_POOLS)
         model_provider = st.sidebar.selectbox(
             "Select Model Provider",
-            ["gemini", "mock"],
-            index=0 if self.config.MODEL_PROVIDER == "gemini" else 1
+            providers,
+            index=providers.index(self.model_provider)
         )
 
-        if model_provider != self.config.MODEL_PROVIDER:
-            self.config.MODEL_PROVIDER = model_provider
-            self.router = router
+        if model_provider != self.model_provider:
+            self.model_provider = model_provider
+            self.router = get_router(model_provider)
             st.sidebar.success(f"Switched to {model_provider} mode")
+        st.session_state.model_provider = model_provider
 
         # Model Level Selection
         st.sidebar.subheader("Model Level")
         model_level = st.sidebar.selectbox(
             "Select Model Level",
-            ["Router", "simple", "medium", "advanced"],
+            ["Router"] + self.config.MODEL_LEVELS,
             index=0
         )
 
@@ -55,202 +146,458 @@ class DynamicRoutingUI:
             "Enable Cache",
             value=self.config.CACHE_ENABLED
         )
-        self.config.CACHE_ENABLED = cache_enabled
 
         # Current Settings Display
         st.sidebar.subheader("Current Settings")
-        st.sidebar.write(f"**Model Provider:** {self.config.MODEL_PROVIDER}")
+        st.sidebar.write(f"**Model Provider:** {self.model_provider}")
         st.sidebar.write(f"**Model Level:** {model_level}")
-        cache_status = 'Enabled' if self.config.CACHE_ENABLED else 'Disabled'
+        cache_status = 'Enabled' if cache_enabled else 'Disabled'
         st.sidebar.write(f"**Cache:** {cache_status}")
 
-        # Store model level for use in query processing
+        st.sidebar.subheader("Conversation")
+        if st.sidebar.button("New conversation"):
+            st.session_state.pop("conversation", None)
+        st.sidebar.write(f"**Turns:** {self.get_session().turn_count}")
+
+        st.sidebar.subheader("Model Queues")
+        tiers = get_scheduler(self.model_provider).stats()["tiers"]
+        for tier, tier_stats in tiers.items():
+            queued = sum(tier_stats["queued"].values())
+            st.sidebar.write(
+                f"**{tier.title()}:** {tier_stats['running']}/"
+                f"{tier_stats['workers']} running, {queued} queued"
+            )
+
+        # Store settings for use in query processing
         st.session_state.model_level = model_level
+        st.session_state.cache_enabled = cache_enabled
+
+    def get_session(self):
+        """This browser session's conversation; each query is a turn"""
+        if "conversation" not in st.session_state:
+            st.session_state.conversation = self.router.new_session()
+        return st.session_state.conversation
 
     def render_query_tab(self):
         """Render the main query tab"""
         st.subheader("Query Interface")
 
-        # Query input
-        query = st.text_area(
-            "Enter your query:",
-            placeholder="Type your question here...",
-            height=100
+        # The form only reruns the script with the text on submit, so
+        # typing and sidebar changes never start a model call
+        with st.form("query_form"):
+            query = st.text_area(
+                "Enter your query:",
+                placeholder="Type your question here...",
+                height=100
+            )
+            send_button = st.form_submit_button("Send Query", type="primary")
+
+        if send_button:
+            if query.strip():
+                self.submit_query(query.strip())
+            else:
+                st.warning("Please enter a query before sending.")
+
+        self.render_query_result()
+
+    def submit_query(self, query):
+        """Start a query in the background unless this session has it"""
+        model_level = st.session_state.get('model_level', 'Router')
+        use_cache = st.session_state.get('cache_enabled', True)
+        session = self.get_session()
+        # The same query is a new turn once the conversation has moved on
+        key = (
+            self.model_provider,
+            model_level,
+            use_cache,
+            query,
+            session.fingerprint()
+        )
+
+        results = st.session_state.setdefault("query_results", {})
+        pending = st.session_state.setdefault("pending_queries", {})
+        st.session_state.current_query = key
+
+        if key in results or key in pending:
+            return
+
+        if (
+            model_level == "Router"
+            and use_cache
+            and self.router.cache.get(
+                self.router.cache_key(query, session)
+            ) is not None
+        ):
+            # Cache hits are answered on the spot
+            value = run_query(
+                self.router,
+                query,
+                model_level,
+                use_cache,
+                session=session
+            )
+            self.router.add_turn(session, value[0])
+            results[key] = {"value": value}
+            return
+
+        if model_level == "Router":
+            tier, downgradable = self.router.classify(query, session), True
+        else:
+            tier, downgradable = model_level, False
+        run = functools.partial(
+            run_query,
+            self.router,
+            query,
+            model_level,
+            use_cache,
+            session=session,
+            complexity=tier if downgradable else None
         )
+        try:
+            future = get_scheduler(self.model_provider).submit(
+                run,
+                tier,
+                priority="interactive",
+                downgradable=downgradable
+            )
+            # The session goes along so the turn is added to the
+            # conversation the query was asked in, even after a reset
+            pending[key] = (future, session)
+        except SchedulerOverloaded as e:
+            results[key] = {"error": str(e)}
+
+    def collect_finished_queries(self):
+        """Move finished background queries into the session results and
+        their turns into the conversation, on the script thread: the
+        Session is never written by a scheduler worker"""
+        results = st.session_state.setdefault("query_results", {})
+        pending = st.session_state.setdefault("pending_queries", {})
+
+        for key, (future, session) in list(pending.items()):
+            if not future.done():
+                continue
+            del pending[key]
+            try:
+                value = future.result()
+            except Exception as e:
+                results[key] = {"error": str(e)}
+            else:
+                self.router.add_turn(session, value[0])
+                results[key] = {"value": value}
+
+            while len(results) > MAX_SESSION_RESULTS:
+                del results[next(iter(results))]
+
+    def has_pending_queries(self):
+        """Whether this session is still waiting on a query"""
+        return bool(st.session_state.get("pending_queries"))
+
+    def render_query_result(self):
+        """Render the result of the current query, if any"""
+        self.collect_finished_queries()
+        key = st.session_state.get("current_query")
+        if key is None:
+            return
+
+        if key in st.session_state.pending_queries:
+            st.info("Processing query...")
+            return
+
+        outcome = st.session_state.query_results.get(key)
+        if outcome is None:
+            return
 
-        # Options
-        col1, col2 = st.columns([1, 4])
-
-        with col1:
-            send_button = st.button("Send Query", type="primary")
-
-        # Process query
-        if query.strip():
-            with st.spinner("Processing query..."):
-                try:
-                    # Start timing
-                    self.evaluator.start_timer()
-
-                    # Get model level from session state
-                    model_level = st.session_state.get('model_level', 'auto')
-
-                    # Route query with specific model level if not auto
-                    if model_level == 'auto':
-                        result = self.router.route_query_and_return_response(
-                            query
-                        )
-                    else:
-                        # Use specific model level
-                        response = self.router.model.generate(
-                            query,
-                            model_level
-                        )
-                        result = {
-                            "query": query,
-                            "response": response,
-                            "complexity": model_level,
-                            "model_name": self.router._get_model_name(
-                                model_level
-                                ),
-                            "cached": False
-                        }
-
-                    # Stop timing
-                    elapsed = self.evaluator.stop_timer()
-
-                    # Display response
-                    st.success("Query processed successfully!")
-
-                    # Response content
-                    st.subheader("Response:")
-                    st.write(result["response"])
-
-                    # Details
-                    st.subheader("Response Details:")
-
-                    details_col1, details_col2 = st.columns(2)
-
-                    with details_col1:
-                        st.write(f"**Query:** {result['query']}")
-                        st.write(f"**Complexity:** {result['complexity']}")
-                        st.write(f"**Model Used:** {result['model_name']}")
-                        level_mode = (
-                            'Auto' if model_level == 'auto' else 'Manual'
-                        )
-                        st.write(f"**Level Mode:** {level_mode}")
-
-                    with details_col2:
-                        from_cache = 'Yes' if result['cached'] else 'No'
-                        st.write(f"**From Cache:** {from_cache}")
-                        st.write(f"**Processing Time:** {elapsed:.3f}s")
-                        st.write(
-                            f"**Response Length:** "
-                            f"{len(result['response'])} characters"
-                        )
-
-                except Exception as e:
-                    st.error(f"Error processing query: {str(e)}")
-
-        elif send_button and not query.strip():
-            st.warning("Please enter a query before sending.")
+        if "error" in outcome:
+            st.error(f"Error processing query: {outcome['error']}")
+            return
+
+        result, elapsed = outcome["value"]
+        model_level = key[1]
+
+        # Display response
+        st.success("Query processed successfully!")
+
+        # Response content
+        st.subheader("Response:")
+        st.write(result["response"])
+
+        # Details
+        st.subheader("Response Details:")
+
+        details_col1, details_col2 = st.columns(2)
+
+        with details_col1:
+            st.write(f"**Query:** {result['query']}")
+            st.write(f"**Complexity:** {result['complexity']}")
+            st.write(f"**Model Used:** {result['model_name']}")
+            level_mode = 'Auto' if model_level == 'Router' else 'Manual'
+            st.write(f"**Level Mode:** {level_mode}")
+
+        with details_col2:
+            from_cache = 'Yes' if result['cached'] else 'No'
+            st.write(f"**From Cache:** {from_cache}")
+            st.write(f"**Processing Time:** {elapsed:.3f}s")
+            st.write(
+                f"**Response Length:** "
+                f"{len(result['response'])} characters"
+            )
 
     def render_evaluation_tab(self):
         """Render the evaluation results tab"""
         st.subheader("Evaluation Results")
 
-        # Check for evaluation reports
-        reports_dir = os.path.join("data", "evaluation_reports")
+        report_index = get_report_index()
+        report_index.refresh()
 
-        if not os.path.exists(reports_dir):
+        if not report_index.reports:
             st.info("No evaluation reports found. Run an evaluation first.")
             return
 
-        # Get latest report
-        report_files = [
-            f for f in os.listdir(reports_dir)
-        ]
-
-        if not report_files:
-            st.info("No evaluation reports found.")
+        search_col, page_col = st.columns([3, 1])
+        with search_col:
+            search = st.text_input("Filter reports:", key="report_search")
+
+        _, total = report_index.search(search, page_size=0)
+        with page_col:
+            page = self.render_page_input(
+                "report_page",
+                total,
+                REPORT_PAGE_SIZE
+            )
+
+        reports, _ = report_index.search(
+            search,
+            page=page,
+            page_size=REPORT_PAGE_SIZE
+        )
+        if not reports:
+            st.info("No reports match the filter.")
             return
 
-        # Sort by modification time
-        report_files.sort(
-            key=lambda x: os.path.getmtime(
-                os.path.join(reports_dir, x)
-            ), reverse=True)
-
         # Display report selector
-        selected_report = st.selectbox(
+        selected = st.selectbox(
             "Select Report:",
-            report_files,
-            index=0
+            reports,
+            index=0,
+            format_func=lambda report: report[0]
         )
-
-        # Display report content
-        report_path = os.path.join(reports_dir, selected_report)
+        name, mtime, size = selected
 
         try:
-            st.subheader(f"Report: {selected_report}")
-            if selected_report.lower().endswith(".json"):
-                with open(report_path, 'r', encoding='utf-8') as f:
-                    report_json = json.load(f)
-                st.json(report_json)
+            st.subheader(f"Report: {name}")
+            content = report_index.load(name)
+            if isinstance(content, dict):
+                self.render_json_report(content)
+            elif isinstance(content, CsvReport):
+                self.render_csv_rows(content.name, content.rows)
             else:
-                with open(report_path, 'r', encoding='utf-8') as f:
-                    report_content = f.read()
-                st.text(report_content)
+                st.text(content)
 
             # Report metadata
-            file_stats = os.stat(report_path)
-            st.caption(f"Last modified: {datetime.fromtimestamp(
-                file_stats.st_mtime
-            )}")
+            modified = datetime.fromtimestamp(mtime)
+            st.caption(f"Last modified: {modified} | {size:,} bytes")
 
         except Exception as e:
             st.error(f"Error reading report: {str(e)}")
 
+    def render_json_report(self, report):
+        """Render a JSON report summary with paginated per-query details"""
+        results = report.get("results", [])
+        st.write(f"**Date:** {report.get('date', 'unknown')}")
+        summary_keys = [
+            "macro_f1", "over_provisioning", "under_provisioning",
+            "latency_p95", "total_cost"
+        ]
+        st.dataframe(
+            [
+                {
+                    **{k: v for k, v in result.items()
+                       if k not in ("details", "metrics", "details_file")},
+                    **{k: result.get("metrics", {}).get(k)
+                       for k in summary_keys if "metrics" in result}
+                }
+                for result in results
+            ]
+        )
+
+        with_details = [
+            r for r in results
+            if r.get("details") or r.get("details_file") or r.get("metrics")
+        ]
+        if not with_details:
+            return
+
+        test = st.selectbox(
+            "Details for:",
+            with_details,
+            format_func=lambda result: result["test_type"]
+        )
+
+        metrics = test.get("metrics")
+        if metrics and metrics["labeled"]:
+            levels = metrics["levels"]
+            st.write("**Confusion matrix** (rows: true tier, "
+                     "columns: routed tier)")
+            st.dataframe([
+                {"true": level, **dict(zip(levels, row))}
+                for level, row in zip(levels, metrics["confusion_matrix"])
+            ])
+            st.dataframe([
+                {"tier": level, **scores}
+                for level, scores in metrics["per_tier"].items()
+            ])
+
+        if test.get("details_file"):
+            self.render_csv_rows(test["details_file"], test["queries_tested"])
+        elif test.get("details"):
+            details = test["details"]
+            page = self.render_page_input(
+                "report_details_page",
+                len(details),
+                CACHE_PAGE_SIZE
+            )
+            start = page * CACHE_PAGE_SIZE
+            st.dataframe(details[start:start + CACHE_PAGE_SIZE])
+
+    def render_csv_rows(self, name, total):
+        """Page through the rows of a CSV report without loading it"""
+        page = self.render_page_input(
+            "report_details_page",
+            total,
+            CACHE_PAGE_SIZE
+        )
+        try:
+            rows = get_report_index().read_rows(
+                name,
+                page * CACHE_PAGE_SIZE,
+                CACHE_PAGE_SIZE
+            )
+        except FileNotFoundError:
+            st.warning(f"Details file {name} not found.")
+            return
+        st.dataframe(rows)
+
+    def render_page_input(self, key, total, page_size):
+        """Page number selector; returns the zero-based page"""
+        pages = max(1, -(-total // page_size))
+        # Filters can shrink the page count under a stored page number
+        if st.session_state.get(key, 1) > pages:
+            st.session_state[key] = pages
+        page = st.number_input(
+            f"Page (of {pages})",
+            min_value=1,
+            max_value=pages,
+            value=1,
+            key=key
+        )
+        return int(page) - 1
+
     def render_test_queries_tab(self):
         """Render the test queries management tab"""
         st.subheader("Test Queries")
 
-        # Load test queries
-        test_queries_file = os.path.join("data", "test_queries.json")
+        # Workloads can be large: only the head of the file is read
+        test_queries = self.evaluator.preview_queries(TEST_QUERY_PREVIEW)
 
-        if not os.path.exists(test_queries_file):
+        if not test_queries:
             st.error("Test queries file not found!")
             return
 
-        try:
-            with open(test_queries_file, 'r', encoding='utf-8') as f:
-                test_queries = json.load(f)
-
-            # Display JSON content
-            st.json(test_queries)
-
-        except Exception as e:
-            st.error(f"Error loading test queries: {str(e)}")
+        st.caption(
+            f"First {len(test_queries)} queries of "
+            f"{self.evaluator.test_queries_file}"
+        )
+        st.json(test_queries)
 
     def render_cache_tab(self):
         """Render the cache management tab"""
         st.subheader("Cache")
 
-        # Load cache file
-        cache_file = os.path.join("data", "cache", "query_cache.json")
+        cache_index = get_cache_index()
+        cache_index.refresh()
+        status = cache_index.status()
 
-        if not os.path.exists(cache_file):
+        if status["error"]:
+            st.error(f"Error loading cache: {status['error']}")
+        if cache_index.signature is None:
             st.info("Cache file not found.")
             return
+        if status["loading"]:
+            st.caption(f"Indexing cache... {status['entries']:,} entries")
 
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
+        search_col, model_col, complexity_col, date_col = st.columns(
+            [3, 2, 2, 2]
+        )
+        with search_col:
+            search = st.text_input("Search queries:", key="cache_search")
+        with model_col:
+            model = st.selectbox(
+                "Model:",
+                ["All"] + cache_index.models(),
+                key="cache_model"
+            )
+        with complexity_col:
+            complexity = st.selectbox(
+                "Complexity:",
+                ["All"] + cache_index.complexities(),
+                key="cache_complexity"
+            )
+        with date_col:
+            date_range = st.date_input(
+                "Date range:",
+                value=(),
+                key="cache_dates"
+            )
+
+        filters = {
+            "text": search or None,
+            "model": None if model == "All" else model,
+            "complexity": None if complexity == "All" else complexity
+        }
+        if len(date_range) == 2:
+            filters["since"] = datetime.combine(
+                date_range[0], datetime.min.time()
+            ).timestamp()
+            filters["until"] = datetime.combine(
+                date_range[1], datetime.max.time()
+            ).timestamp()
+
+        _, total = cache_index.search(page_size=0, **filters)
+        page = self.render_page_input("cache_page", total, CACHE_PAGE_SIZE)
+        entries, total = cache_index.search(
+            page=page,
+            page_size=CACHE_PAGE_SIZE,
+            **filters
+        )
+
+        st.caption(f"{total:,} matching entries")
+        if not entries:
+            return
 
-            # Display JSON content
-            st.json(cache_data)
+        st.dataframe(
+            [
+                {
+                    "query": entry.query,
+                    "model": entry.model,
+                    "complexity": entry.complexity,
+                    "date": datetime.fromtimestamp(entry.timestamp),
+                    "response_length": entry.response_length
+                }
+                for entry in entries
+            ]
+        )
 
-        except Exception as e:
-            st.error(f"Error loading cache: {str(e)}")
+        # Only the selected entry's response is read from disk
+        selected = st.selectbox(
+            "Show entry:",
+            entries,
+            format_func=lambda entry: entry.query[:100]
+        )
+        with st.expander("Response", expanded=False):
+            try:
+                st.write(cache_index.load_record(selected)["response"])
+            except Exception as e:
+                st.error(f"Error loading entry: {str(e)}")
 
     def render_tabs(self):
         """Render main application tabs"""
@@ -284,6 +631,16 @@ class DynamicRoutingUI:
         self.render_sidebar()
         self.render_tabs()
 
+        # Poll until this session's background query (or the cache index)
+        # finishes; widgets stay usable in between because each run
+        # returns quickly
+        if (
+            self.has_pending_queries()
+            or get_cache_index().status()["loading"]
+        ):
+            time.sleep(POLL_INTERVAL)
+            st.rerun()
+
 
 def main():
     """Main application entry point"""
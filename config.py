@@ -1,3 +1,5 @@
+import os
+
 from dotenv import load_dotenv
 
 
@@ -16,12 +18,226 @@ class Config:
         self.MEDIUM_MODEL = "gemini-2.5-flash"
         self.ADVANCED_MODEL = "gemini-2.5-pro"
 
+        # Ordered backend pools per tier for each provider. The registry
+        # sends each call to the fastest healthy backend in the pool.
+        # provider: "gemini", "mock" or "local" (LOCAL_MODEL_ENDPOINT)
+        self.MODEL_POOLS = {
+            "gemini": {
+                "simple": [
+                    {"name": self.SIMPLE_MODEL, "provider": "gemini",
+                     "cost_per_million_tokens": 0.075},
+                    {"name": "gemini-2.0-flash-lite", "provider": "gemini",
+                     "cost_per_million_tokens": 0.075},
+                ],
+                "medium": [
+                    {"name": self.MEDIUM_MODEL, "provider": "gemini",
+                     "cost_per_million_tokens": 0.30},
+                    {"name": "gemini-2.0-flash", "provider": "gemini",
+                     "cost_per_million_tokens": 0.10},
+                ],
+                "advanced": [
+                    {"name": self.ADVANCED_MODEL, "provider": "gemini",
+                     "cost_per_million_tokens": 1.25},
+                ],
+            },
+            "mock": {
+                "simple": [{"name": "mock-simple", "provider": "mock"}],
+                "medium": [{"name": "mock-medium", "provider": "mock"}],
+                "advanced": [{"name": "mock-advanced", "provider": "mock"}],
+            },
+        }
+
+        self.LOCAL_MODEL_ENDPOINT = "http://localhost:11434/api/generate"
+        self.LOCAL_MODEL_TIMEOUT = 60
+
+        # Record/replay of provider calls (models/cassette.py), also set
+        # with the MODEL_CASSETTE_MODE environment variable. "record" saves
+        # every call's response or error, latency and token usage to
+        # MODEL_CASSETTE; "replay" answers every call from it instead of
+        # the providers, after the recorded latency divided by
+        # MODEL_CASSETTE_SPEED (0 for no waiting). None for neither.
+        self.MODEL_CASSETTE_MODE = os.getenv("MODEL_CASSETTE_MODE") or None
+        self.MODEL_CASSETTE = os.getenv("MODEL_CASSETTE") or os.path.join(
+            "data", "cassettes", "models.cassette"
+        )
+        self.MODEL_CASSETTE_SPEED = float(
+            os.getenv("MODEL_CASSETTE_SPEED", "1")
+        )
+
+        # Weight of the newest sample in the latency/error-rate EWMAs
+        self.REGISTRY_EWMA_ALPHA = 0.3
+        # Backends above this error rate are skipped while others are up
+        self.REGISTRY_MAX_ERROR_RATE = 0.5
+        # Seconds before an idle backend is probed again
+        self.REGISTRY_PROBE_INTERVAL = 60
+
+        # Per-model circuit breaker: opens when BREAKER_FAILURE_RATE of the
+        # last BREAKER_WINDOW calls failed or took longer than
+        # BREAKER_SLOW_CALL_SECONDS, then lets BREAKER_HALF_OPEN_CALLS
+        # trial calls through after BREAKER_OPEN_SECONDS
+        self.BREAKER_WINDOW = 20
+        self.BREAKER_MIN_CALLS = 5
+        self.BREAKER_FAILURE_RATE = 0.5
+        self.BREAKER_SLOW_CALL_SECONDS = 90
+        self.BREAKER_OPEN_SECONDS = 30
+        self.BREAKER_HALF_OPEN_CALLS = 1
+
         self.LLM_ROUTE_MODEL = "gemini-1.5-flash-002"
         # self.LLM_ROUTE_MODEL_BACKUP = "gemini-1.5-flash-latest"
 
         self.MAX_SIMPLE_LENGTH = 50
         self.MAX_MEDIUM_LENGTH = 200
 
+        # Online tuning of the length thresholds and keyword weights from
+        # observed latency and fallbacks; see router/tuner.py. Opt-in, and
+        # only routers on live providers observe: mock and replayed
+        # answers, evaluations and benchmarks never tune the classifier.
+        self.TUNER_ENABLED = False
+        # Share of queries the first tier tried must answer validly
+        self.TUNER_VALIDITY_TARGET = 0.9
+        self.TUNER_REFIT_EVERY = 200
+        self.TUNER_MIN_OBSERVATIONS = 100
+        # Observations kept in memory, and per log file: the log rotates
+        # to observations.1.jsonl once it holds this many
+        self.TUNER_HISTORY = 5000
+        # Observations buffered before they are appended to the log
+        self.TUNER_LOG_FLUSH_EVERY = 50
+        # Seconds per tier assumed before real latencies are observed
+        self.TUNER_LATENCY_PRIORS = {
+            "simple": 1.0,
+            "medium": 8.0,
+            "advanced": 25.0
+        }
+        # Pseudo-observations behind each prior
+        self.TUNER_PRIOR_STRENGTH = 5
+        # Advanced answers at least this long are taken as a sign the
+        # medium tier would not have been enough
+        self.TUNER_LONG_RESPONSE_LENGTH = 3000
+
+        # Token/latency accounting: ring buffer slots per (tier, routing
+        # method, cache status) and the rolling windows (seconds, None for
+        # everything buffered) reported by the 'usage' command
+        self.USAGE_BUFFER_SIZE = 10000
+        self.USAGE_WINDOWS = [300, 3600, None]
+
+        # Simulated latency for the mock provider: [mean, stdev] seconds
+        # per tier, drawn log-normally. "realistic" follows the Gemini
+        # timings in data/evaluation_reports; "fast" keeps the same shape
+        # at a fraction of the cost for quick offline benchmark runs.
+        self.MOCK_LATENCY_PROFILE = "none"
+        self.MOCK_LATENCY_PROFILES = {
+            "none": None,
+            "fast": {
+                "simple": [0.01, 0.003],
+                "medium": [0.05, 0.015],
+                "advanced": [0.15, 0.05]
+            },
+            "realistic": {
+                "simple": [0.6, 0.2],
+                "medium": [9.0, 3.0],
+                "advanced": [25.0, 8.0]
+            },
+        }
+
+        # Benchmarks (evaluation/benchmark.py): a configuration regresses
+        # when p95 latency or throughput is this much worse than baseline
+        self.BENCHMARK_REGRESSION_TOLERANCE = 0.10
+        # p95 differences below this many seconds are treated as noise
+        self.BENCHMARK_NOISE_FLOOR = 0.001
+
+        # Synthetic workloads (evaluation/workload.py): share of queries
+        # per tier, log-normal [median, sigma] query length in characters,
+        # and how often a query carries its own tier's cue keywords (or,
+        # to mislead the classifier, the complex keywords)
+        self.WORKLOAD_TIER_MIX = {
+            "simple": 0.4,
+            "medium": 0.4,
+            "advanced": 0.2
+        }
+        self.WORKLOAD_LENGTHS = {
+            "simple": [30, 0.3],
+            "medium": [90, 0.4],
+            "advanced": [180, 0.4]
+        }
+        self.WORKLOAD_KEYWORD_RATE = 0.8
+        self.WORKLOAD_CROSS_KEYWORD_RATE = 0.05
+        # Distinct queries drawn from with Zipfian popularity (0 for no
+        # repetition) and the share emitted as near-duplicate variants
+        self.WORKLOAD_UNIQUE_QUERIES = 10000
+        self.WORKLOAD_ZIPF_EXPONENT = 1.1
+        self.WORKLOAD_NEAR_DUPLICATE_RATE = 0.1
+
+        # Seconds to wait after each call per provider and tier during
+        # evaluation, to stay under the API rate limits
+        self.EVALUATION_RATE_LIMIT_WAIT = {"gemini": {"advanced": 30}}
+
+        # Streamed answers are held back until this many characters have
+        # arrived so the opening can be validated before anything is sent
+        self.STREAM_VALIDATE_CHARS = 64
+
+        # Request profiling (router/profiling.py), off unless set here or
+        # with ROUTER_PROFILE=1 in the environment; when off the router's
+        # entry points are not wrapped at all. Every PROFILE_EVERY
+        # requests a .pstats file and a collapsed-stack (flamegraph) file
+        # are written to PROFILE_DIR; stacks are sampled every
+        # PROFILE_SAMPLE_INTERVAL seconds.
+        self.PROFILE_ENABLED = os.getenv("ROUTER_PROFILE", "0") not in (
+            "", "0"
+        )
+        self.PROFILE_EVERY = 100
+        self.PROFILE_DIR = os.path.join("data", "profiles")
+        self.PROFILE_SAMPLE_INTERVAL = 0.005
+
+        # Conversation sessions (router/session.py): token budget for the
+        # context sent with each turn (running summary plus recent turns)
+        # and for the summary itself; past the budget the oldest turns are
+        # folded into the summary. Each stored turn is clipped to
+        # SESSION_TURN_TOKENS. "extractive" summaries keep the opening of
+        # each folded turn, "model" asks the simple tier to update it.
+        self.SESSION_CONTEXT_TOKENS = 1500
+        self.SESSION_SUMMARY_TOKENS = 300
+        self.SESSION_TURN_TOKENS = 500
+        self.SESSION_SUMMARIZER = "extractive"
+        # Sessions held by the HTTP service, and idle seconds before one
+        # is dropped
+        self.SESSION_MAX = 1000
+        self.SESSION_TTL = 3600
+
+        # Request scheduler (router/scheduler.py): worker threads per
+        # tier, how the priority classes share a tier's workers when all
+        # are busy, default deadline in seconds per class (None for no
+        # deadline) and queued requests per tier before the lowest
+        # priority is shed
+        self.SCHEDULER_TIER_WORKERS = {
+            "simple": 4,
+            "medium": 2,
+            "advanced": 2
+        }
+        self.SCHEDULER_PRIORITY_WEIGHTS = {
+            "interactive": 8,
+            "batch": 2,
+            "prefetch": 1
+        }
+        self.SCHEDULER_DEADLINES = {
+            "interactive": 60,
+            "batch": None,
+            "prefetch": 600
+        }
+        self.SCHEDULER_MAX_QUEUED = 256
+
+        # HTTP service (server.py): worker threads, queued connections
+        # beyond which new requests get 503, and seconds to drain on stop.
+        # SERVER_REQUEST_TIMEOUT caps how long /route and /route_batch wait
+        # for answers (and is the deadline of requests without one); past
+        # it they answer 504 and /route/stream ends with an error event
+        self.SERVER_HOST = "127.0.0.1"
+        self.SERVER_PORT = 8000
+        self.SERVER_WORKERS = 8
+        self.SERVER_QUEUE_SIZE = 64
+        self.SERVER_DRAIN_TIMEOUT = 30
+        self.SERVER_MAX_BATCH = 100
+        self.SERVER_REQUEST_TIMEOUT = 300
+
         self.CACHE_ENABLED = True
         self.FALLBACK_ENABLED = True
         self.MAX_RETRIES = 2
@@ -48,5 +264,19 @@ class Config:
             "i'm unable to",
             "i cannot provide",
             "i don't understand",
-            "i can't answer"
+            "i can't answer",
+            "i can't assist",
+            "i cannot assist",
+            "i am unable to"
         ]
+
+        # Response validation (router/validation.py): answers with fewer
+        # non-blank characters than this are invalid, and answers up to
+        # VALIDATOR_REFUSAL_MAX_CHARS long with a sentence that starts with
+        # one of INVALID_PHRASES are treated as refusals
+        self.VALIDATOR_MIN_CHARS = 5
+        self.VALIDATOR_REFUSAL_MAX_CHARS = 200
+        # Extra scorers run after the built-in checks:
+        # name -> {"function": "module:callable", "min_score": 0.5}; the
+        # callable takes the response text and returns a score
+        self.VALIDATOR_SCORERS = {}
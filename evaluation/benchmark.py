@@ -0,0 +1,366 @@
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from evaluation.workload import iter_queries
+from router.cache import Cache
+from router.query_router import RuleRouter
+from router.rules import hold_thresholds
+from models.cassette import ReplayModel, open_cassette
+from models.mock_model import MockModel
+from config import Config
+
+# Two-sided 95% Student t critical values by degrees of freedom
+T_CRITICAL_95 = {
+    1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447,
+    7: 2.365, 8: 2.306, 9: 2.262, 10: 2.228, 12: 2.179, 15: 2.131,
+    20: 2.086, 30: 2.042
+}
+
+
+def t_critical(df):
+    if df > 30:
+        return 1.96
+    return T_CRITICAL_95[max(k for k in T_CRITICAL_95 if k <= df)]
+
+
+def percentile(sorted_values, p):
+    # Linear interpolation between closest ranks
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * p / 100
+    low = math.floor(position)
+    high = math.ceil(position)
+    fraction = position - low
+    return (
+        sorted_values[low] * (1 - fraction)
+        + sorted_values[high] * fraction
+    )
+
+
+def confidence_interval(values):
+    # 95% CI of the mean across trials
+    mean = statistics.fmean(values)
+    if len(values) < 2:
+        return mean, [mean, mean]
+    half_width = (
+        t_critical(len(values) - 1)
+        * statistics.stdev(values) / math.sqrt(len(values))
+    )
+    return mean, [mean - half_width, mean + half_width]
+
+
+def load_queries(path, limit=None):
+    # Only the texts are kept; every trial replays the same list
+    return [query["text"] for query in iter_queries(path, limit)]
+
+
+class BenchmarkSuite:
+    # Routing vs single-tier baselines against MockModel with a synthetic
+    # latency profile, or against model calls replayed from a cassette
+    # (recorded responses, errors and latencies). Every configuration gets
+    # untimed warm-up trials, then repeated timed trials; latencies use
+    # perf_counter and only cover the request itself.
+    CONFIGURATIONS = [
+        "routing_cold",
+        "routing_warm",
+        "simple_only",
+        "medium_only",
+        "advanced_only"
+    ]
+
+    def __init__(self, queries, latency_profile="fast", trials=5, warmup=1,
+                 concurrency=(1,), configurations=None, seed=0,
+                 cassette=None, replay_speed=1.0):
+        self.queries = list(queries)
+        self.latency_profile = "replay" if cassette else latency_profile
+        self.cassette = cassette
+        self.replay_speed = replay_speed
+        self.trials = trials
+        self.warmup = warmup
+        self.concurrency = list(concurrency)
+        self.configurations = configurations or self.CONFIGURATIONS
+        self.seed = seed
+
+    def _make_router(self, trial):
+        # Fresh in-memory cache per router so cold runs really start empty
+        # and no trial pays for rewriting a cache file on every answer.
+        # Benchmark traffic stays out of the tuner
+        router = RuleRouter(
+            model_provider="mock",
+            cache=Cache(persist=False),
+            tuning=False
+        )
+        if self.cassette:
+            # Recordings are looked up by tier and prompt, so calls made
+            # against any provider's pool replay on the mock one
+            provider = ReplayModel(
+                open_cassette(self.cassette),
+                self.replay_speed
+            )
+        else:
+            provider = MockModel(
+                latency_profile=self.latency_profile,
+                seed=self.seed + trial
+            )
+        router.model.providers["mock"] = provider
+        return router
+
+    def _request_fn(self, configuration, router):
+        if configuration.startswith("routing"):
+            return lambda query: router.route_query_and_return_response(
+                query,
+                use_cache=True
+            )
+        level = configuration.split("_")[0]
+        return lambda query: router.model.generate(query, level)
+
+    def _run_trial(self, configuration, concurrency, trial):
+        router = self._make_router(trial)
+        request = self._request_fn(configuration, router)
+        if configuration == "routing_warm":
+            for query in self.queries:
+                request(query)
+
+        def timed(query):
+            start = time.perf_counter()
+            try:
+                request(query)
+                failed = False
+            except Exception:
+                failed = True
+            return time.perf_counter() - start, failed
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(timed, self.queries))
+        wall_time = time.perf_counter() - start
+
+        return {
+            "latencies": [latency for latency, _ in outcomes],
+            "errors": sum(failed for _, failed in outcomes),
+            "throughput": len(outcomes) / wall_time if wall_time else 0.0
+        }
+
+    def _run_configuration(self, configuration, concurrency):
+        trial_number = 0
+        for _ in range(self.warmup):
+            self._run_trial(configuration, concurrency, trial_number)
+            trial_number += 1
+
+        latencies = []
+        trial_means = []
+        throughputs = []
+        errors = 0
+        for _ in range(self.trials):
+            trial = self._run_trial(configuration, concurrency, trial_number)
+            trial_number += 1
+            latencies.extend(trial["latencies"])
+            trial_means.append(statistics.fmean(trial["latencies"]))
+            throughputs.append(trial["throughput"])
+            errors += trial["errors"]
+
+        latencies.sort()
+        mean_latency, mean_latency_ci = confidence_interval(trial_means)
+        throughput, throughput_ci = confidence_interval(throughputs)
+        return {
+            "configuration": configuration,
+            "concurrency": concurrency,
+            "requests": len(latencies),
+            "errors": errors,
+            "mean_latency": mean_latency,
+            "mean_latency_ci": mean_latency_ci,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "throughput": throughput,
+            "throughput_ci": throughput_ci
+        }
+
+    def run(self):
+        results = []
+        # Every configuration is measured against the same classifier
+        with hold_thresholds():
+            for concurrency in self.concurrency:
+                for configuration in self.configurations:
+                    print(f"Benchmarking {configuration} "
+                          f"(concurrency {concurrency})...")
+                    results.append(
+                        self._run_configuration(configuration, concurrency)
+                    )
+
+        return {
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "latency_profile": self.latency_profile,
+            "queries": len(self.queries),
+            "trials": self.trials,
+            "warmup": self.warmup,
+            "seed": self.seed,
+            "results": results
+        }
+
+
+def compare(report, baseline, tolerance=None):
+    # Regressions against the baseline run of the same configuration:
+    # p95 latency up by more than tolerance (and by more than the noise
+    # floor), or throughput down by more than tolerance even at the top of
+    # this run's confidence interval
+    config = Config()
+    if tolerance is None:
+        tolerance = config.BENCHMARK_REGRESSION_TOLERANCE
+    noise_floor = config.BENCHMARK_NOISE_FLOOR
+    baseline_results = {
+        (r["configuration"], r["concurrency"]): r
+        for r in baseline["results"]
+    }
+
+    regressions = []
+    for result in report["results"]:
+        key = (result["configuration"], result["concurrency"])
+        base = baseline_results.get(key)
+        if base is None:
+            continue
+
+        checks = [
+            (
+                "p95",
+                result["p95"] > base["p95"] * (1 + tolerance)
+                and result["p95"] - base["p95"] > noise_floor
+            ),
+            (
+                "throughput",
+                result["throughput_ci"][1]
+                < base["throughput"] * (1 - tolerance)
+            )
+        ]
+        for metric, regressed in checks:
+            if regressed:
+                regressions.append({
+                    "configuration": key[0],
+                    "concurrency": key[1],
+                    "metric": metric,
+                    "baseline": base[metric],
+                    "current": result[metric],
+                    # None when the baseline was 0: no ratio to show
+                    "change": (
+                        result[metric] / base[metric] - 1
+                        if base[metric] else None
+                    )
+                })
+    return regressions
+
+
+def print_report(report):
+    print("="*78)
+    print(f"BENCHMARK ({report['latency_profile']} profile, "
+          f"{report['queries']} queries x {report['trials']} trials)")
+    print("="*78)
+    print(f"{'configuration':<15}{'conc':>5}{'mean (95% CI)':>24}"
+          f"{'p50':>8}{'p95':>8}{'p99':>8}{'req/s':>10}")
+    for r in report["results"]:
+        low, high = r["mean_latency_ci"]
+        print(f"{r['configuration']:<15}{r['concurrency']:>5}"
+              f"{r['mean_latency']:>9.4f} [{low:.4f},{high:.4f}]"
+              f"{r['p50']:>8.4f}{r['p95']:>8.4f}{r['p99']:>8.4f}"
+              f"{r['throughput']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark routing against single-tier baselines"
+    )
+    parser.add_argument(
+        "--queries",
+        default=os.path.join("data", "test_queries.json"),
+        help="labeled queries: test_queries.json or a JSONL workload"
+    )
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument(
+        "--profile",
+        default="fast",
+        choices=[p for p, v in Config().MOCK_LATENCY_PROFILES.items() if v]
+    )
+    parser.add_argument(
+        "--cassette",
+        default=None,
+        help="replay recorded model calls instead of the mock profile"
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=1.0,
+        help="replayed latency is divided by this (0: no waiting)"
+    )
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1])
+    parser.add_argument(
+        "--configurations",
+        nargs="+",
+        choices=BenchmarkSuite.CONFIGURATIONS,
+        default=None
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--baseline",
+        default=os.path.join("data", "benchmarks", "baseline.json")
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store this run as the new baseline"
+    )
+    args = parser.parse_args()
+
+    suite = BenchmarkSuite(
+        load_queries(args.queries, args.limit),
+        latency_profile=args.profile,
+        trials=args.trials,
+        warmup=args.warmup,
+        concurrency=args.concurrency,
+        configurations=args.configurations,
+        seed=args.seed,
+        cassette=args.cassette,
+        replay_speed=args.replay_speed
+    )
+    report = suite.run()
+    print_report(report)
+
+    report_dir = os.path.join("data", "benchmarks")
+    os.makedirs(report_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    report_file = os.path.join(report_dir, f"benchmark_{timestamp}.json")
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to: {report_file}")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f))
+        for r in regressions:
+            change = (
+                f" ({r['change']:+.1%})" if r['change'] is not None else ""
+            )
+            print(f"REGRESSION {r['configuration']} "
+                  f"(concurrency {r['concurrency']}) {r['metric']}: "
+                  f"{r['baseline']:.4f} -> {r['current']:.4f}{change}")
+        if not regressions:
+            print(f"No regressions against {args.baseline}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to: {args.baseline}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,128 +1,218 @@
+import csv
+import itertools
 import time
 import json
 import os
 from datetime import datetime
 
+from evaluation.metrics import ResultColumns
+from evaluation.workload import iter_queries
+from router.cache import Cache
+from router.query_router import RuleRouter
+from router.rules import hold_thresholds
+from config import Config
+
+DETAIL_COLUMNS = [
+    "id", "query", "true_label", "predicted", "served", "latency", "cost",
+    "cached", "response_length"
+]
+
 
 class Evaluator:
-    def __init__(self):
-        self.test_queries_file = os.path.join("data", "test_queries.json")
-        self.test_queries = self._load_test_queries()
-
-    def _load_test_queries(self):
-        if os.path.exists(self.test_queries_file):
-            with open(self.test_queries_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
-
-    def _get_test_set(self):
-        return self.test_queries.get("queries")
-
-    def _calculate_accuracy(self, queries, results):
-        correct = 0
-        for i, query_data in enumerate(queries):
-            true_label = query_data["true_label"]
-            predicted_label = results[i]["complexity"]
-            if true_label == predicted_label:
-                correct += 1
-        return (correct / len(queries)) * 100
-
-    def test_system(self, router):
-        queries = self._get_test_set()
-        results = []
+    def __init__(self, test_queries_file=None):
+        self.config = Config()
+        # The hand-labeled JSON file or a generated JSONL workload; both
+        # are read as a stream on every run
+        self.test_queries_file = test_queries_file or os.path.join(
+            "data", "test_queries.json"
+        )
+        self.report_dir = os.path.join("data", "evaluation_reports")
 
-        print("Testing Routing System...")
-        start_time = time.time()
+    def _iter_test_set(self):
+        if not os.path.exists(self.test_queries_file):
+            return iter(())
+        return iter_queries(self.test_queries_file)
 
-        for query_data in queries:
-            query = query_data["text"]
-            query_start = time.time()
-            response = router.route_query_and_return_response(
-                query,
-                use_cache=True
-                )
-            
-            query_time = time.time() - query_start
-            
-            results.append({
-                "query": query[:50] + "...",
-                "response": response["response"][:50] + "...",
-                "complexity": response["complexity"],
-                "time": query_time
-            })
-            
-            # Sleep for advanced model to avoid rate limits
-            if response["complexity"] == "advanced":
-                print("Waiting 30 seconds for advanced model rate limit...")
-                time.sleep(30)
-
-        total_time = time.time() - start_time
-
-        accuracy = self._calculate_accuracy(queries, results)
+    def preview_queries(self, limit=100):
+        return list(itertools.islice(self._iter_test_set(), limit))
+
+    def _rate_limit_wait(self, router, level):
+        if router.model.cassette_mode == "replay":
+            return 0
+        waits = self.config.EVALUATION_RATE_LIMIT_WAIT.get(
+            router.model_provider, {}
+        )
+        return waits.get(level, 0)
+
+    def _run(self, router, label, request, details_file=None):
+        # request(query) -> (complexity, served level, response, cached).
+        # Results go into NumPy columns as the queries stream past and,
+        # with details_file, one CSV row per query; nothing per query is
+        # held as Python objects.
+        columns = ResultColumns(self.config.MODEL_LEVELS)
+        query_cost = [0.0]
+
+        def record_cost(model_level, backend, latency, usage, failed):
+            # Every model call made for the query, fallbacks included
+            query_cost[0] += (
+                usage.total_tokens
+                * backend.cost_per_million_tokens / 1_000_000
+            )
 
+        router.model.add_listener(record_cost)
+        details = None
+        if details_file:
+            details = open(details_file, 'w', encoding='utf-8', newline='')
+            writer = csv.writer(details)
+            writer.writerow(DETAIL_COLUMNS)
+
+        try:
+            for i, query_data in enumerate(self._iter_test_set()):
+                query = query_data["text"]
+                true_label = query_data.get("true_label")
+                query_cost[0] = 0.0
+                query_start = time.perf_counter()
+                complexity, served, response, cached = request(query)
+                query_time = time.perf_counter() - query_start
+
+                columns.append(
+                    true_label,
+                    complexity,
+                    served,
+                    query_time,
+                    query_cost[0],
+                    cached
+                )
+                if details:
+                    writer.writerow([
+                        query_data.get("id", i),
+                        query,
+                        true_label,
+                        complexity,
+                        served,
+                        f"{query_time:.6f}",
+                        f"{query_cost[0]:.8f}",
+                        int(cached),
+                        len(response or "")
+                    ])
+
+                # Sleep for the rate-limited tier that answered (none for a
+                # cached answer); the wait isn't part of the measured time
+                wait = 0 if cached else self._rate_limit_wait(router, served)
+                if wait:
+                    print(f"Waiting {wait} seconds for {served} model "
+                          "rate limit...")
+                    time.sleep(wait)
+        finally:
+            router.model.listeners.remove(record_cost)
+            if details:
+                details.close()
+
+        metrics = columns.metrics()
+        count = len(columns)
+        total_time = metrics["total_latency"]
         return {
-            "test_type": "Routing System",
-            "queries_tested": len(queries),
+            "test_type": label,
+            "queries_tested": count,
             "total_time": total_time,
-            "average_time": total_time / len(queries),
-            "details": results,
-            "accuracy": accuracy
+            "average_time": total_time / count if count else 0.0,
+            "accuracy": (
+                metrics["accuracy"] * 100 if metrics["labeled"] else None
+            ),
+            "metrics": metrics,
+            "details_file": (
+                os.path.basename(details_file) if details_file else None
+            )
         }
 
-    def test_single_model(self, router, model_level):
-        queries = self._get_test_set()
-        results = []
+    def test_system(self, router, details_file=None):
+        print("Testing Routing System...")
+
+        def request(query):
+            response = router.route_query_and_return_response(
+                query,
+                use_cache=True
+            )
+            served = (
+                router.model.level_of(response["model_name"])
+                or response["complexity"]
+            )
+            return (
+                response["complexity"],
+                served,
+                response["response"],
+                response["cached"]
+            )
+
+        return self._run(router, "Routing System", request, details_file)
 
+    def test_single_model(self, router, model_level, details_file=None):
         print(f"Testing {model_level.title()} Model...")
-        start_time = time.time()
 
-        for query_data in queries:
-            query = query_data["text"]
-            query_start = time.time()
+        def request(query):
             response = router.model.generate(query, model_level)
-            query_time = time.time() - query_start
-            
-            results.append({
-                "query": query[:50] + "...",
-                "response": response[:50] + "...",
-                "complexity": model_level,
-                "time": query_time
-            })
-            
-            # Sleep for advanced model to avoid rate limits
-            if model_level == "advanced":
-                print("Waiting 30 seconds for advanced model rate limit...")
-                time.sleep(30)
-
-        total_time = time.time() - start_time
+            return model_level, model_level, response, False
 
-        return {
-            "test_type": f"{model_level.title()} Model",
-            "queries_tested": len(queries),
-            "total_time": total_time,
-            "average_time": total_time / len(queries),
-            "details": results,
-            "accuracy": None  # Not applicable
-        }
+        result = self._run(
+            router,
+            f"{model_level.title()} Model",
+            request,
+            details_file
+        )
+        result["accuracy"] = None  # Not applicable
+        return result
+
+    def _evaluation_router(self, router):
+        # Same provider (and provider instances) as router, but its own
+        # registry and no tuner, so evaluation traffic never trains the
+        # classifier it is measuring. The cache starts empty and stays in
+        # memory: test queries never reach the shared cache file, repeats
+        # within the run still hit, and no file is rewritten per query.
+        evaluation_router = RuleRouter(
+            router.model_provider,
+            cache=Cache(persist=False),
+            tuning=False
+        )
+        evaluation_router.model.providers.update(router.model.providers)
+        return evaluation_router
 
     def evaluate_system(self, router):
         print("="*60)
         print("EVALUATION START")
         print("="*60)
 
+        with hold_thresholds():
+            self._evaluate(self._evaluation_router(router))
+
+        print("="*60)
+        print("EVALUATION COMPLETE")
+        print("="*60)
+
+    def _evaluate(self, router):
+
+        # Summary JSON plus one CSV of per-query rows for each test
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        os.makedirs(self.report_dir, exist_ok=True)
+
+        def details_file(test):
+            return os.path.join(
+                self.report_dir,
+                f"evaluation_{timestamp}_{test}.csv"
+            )
+
         all_results = []
 
-        all_results.append(self.test_system(router))
+        all_results.append(
+            self.test_system(router, details_file("routing"))
+        )
 
         for level in ["simple", "medium", "advanced"]:
-            all_results.append(self.test_single_model(router, level))
+            all_results.append(
+                self.test_single_model(router, level, details_file(level))
+            )
 
         self._print_results(all_results)
-        self._save_results(all_results)
-
-        print("="*60)
-        print("EVALUATION COMPLETE")
-        print("="*60)
+        self._save_results(all_results, timestamp)
 
     def _print_results(self, results):
         print("RESULTS SUMMARY")
@@ -139,38 +229,58 @@ class Evaluator:
             )
             print(f"  Accuracy: {accuracy_text}")
 
+            metrics = result["metrics"]
+            if metrics["labeled"]:
+                print(
+                    f"  Over-provisioned: {metrics['over_provisioning']:.1%}"
+                    f"  Under-provisioned: "
+                    f"{metrics['under_provisioning']:.1%}"
+                )
+                for level, scores in metrics["per_tier"].items():
+                    print(
+                        f"  {level}: precision={scores['precision']:.2f} "
+                        f"recall={scores['recall']:.2f} "
+                        f"f1={scores['f1']:.2f} "
+                        f"support={scores['support']}"
+                    )
+            print(f"  Cost: ${metrics['total_cost']:.4f}")
+
         routing_avg = results[0]["average_time"]
         advanced_avg = results[3]["average_time"]
 
-        savings = ((advanced_avg - routing_avg) / advanced_avg) * 100
-        print(
-            f"Routing is {savings:.1f}% faster than using the Advanced "
-            "model for all queries"
-        )
+        if advanced_avg:
+            savings = ((advanced_avg - routing_avg) / advanced_avg) * 100
+            print(
+                f"Routing is {savings:.1f}% faster than using the Advanced "
+                "model for all queries"
+            )
 
-    def _save_results(self, results):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        report_dir = os.path.join("data", "evaluation_reports")
-        os.makedirs(report_dir, exist_ok=True)
+    def _save_results(self, results, timestamp=None):
+        timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+        os.makedirs(self.report_dir, exist_ok=True)
 
-        report_file = os.path.join(report_dir, f"evaluation_{timestamp}.json")
+        report_file = os.path.join(
+            self.report_dir,
+            f"evaluation_{timestamp}.json"
+        )
 
-        with open(report_file, 'w') as f:
-            # dump(content, file path, space=2, keep non-ASCII chars)
+        # Only the summary: per-query rows are in the CSV details files
+        with open(report_file, 'w', encoding='utf-8') as f:
             json.dump({
                 "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "queries_file": self.test_queries_file,
                 "results": results
-            }, f, indent=2, ensure_ascii=False)
+            }, f, ensure_ascii=False, separators=(",", ":"))
 
         print(f"Results saved to: {report_file}")
 
     def start_timer(self):
-        self.start_time = time.time()
+        self.start_time = time.perf_counter()
 
     def stop_timer(self):
         if self.start_time is None:
             return 0.0
 
-        elapsed = time.time() - self.start_time
+        elapsed = time.perf_counter() - self.start_time
         self.start_time = None
         return elapsed
@@ -0,0 +1,154 @@
+import numpy as np
+
+from config import Config
+
+
+class ResultColumns:
+    # Per-query evaluation results as NumPy columns. Tiers are stored as
+    # their index in levels (-1 when unknown), so a million queries take a
+    # few tens of megabytes and the metrics below need no Python loops.
+
+    def __init__(self, levels=None, capacity=1024):
+        self.levels = list(levels or Config().MODEL_LEVELS)
+        self.codes = {level: i for i, level in enumerate(self.levels)}
+        self.size = 0
+        self.true_label = np.empty(capacity, dtype=np.int8)
+        self.predicted = np.empty(capacity, dtype=np.int8)
+        self.served = np.empty(capacity, dtype=np.int8)
+        self.latency = np.empty(capacity, dtype=np.float64)
+        self.cost = np.empty(capacity, dtype=np.float64)
+        self.cached = np.empty(capacity, dtype=bool)
+
+    def _grow(self):
+        capacity = len(self.latency) * 2
+        for name in ("true_label", "predicted", "served", "latency",
+                     "cost", "cached"):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def append(self, true_label, predicted, served, latency, cost=0.0,
+               cached=False):
+        if self.size == len(self.latency):
+            self._grow()
+        i = self.size
+        self.true_label[i] = self.codes.get(true_label, -1)
+        self.predicted[i] = self.codes.get(predicted, -1)
+        self.served[i] = self.codes.get(served, -1)
+        self.latency[i] = latency
+        self.cost[i] = cost
+        self.cached[i] = cached
+        self.size += 1
+
+    def __len__(self):
+        return self.size
+
+    def metrics(self):
+        n = self.size
+        return compute_metrics(
+            self.true_label[:n],
+            self.predicted[:n],
+            self.latency[:n],
+            self.cost[:n],
+            self.levels,
+            served=self.served[:n],
+            cached=self.cached[:n]
+        )
+
+
+def _ratio(numerator, denominator):
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return np.divide(
+        numerator,
+        denominator,
+        out=np.zeros_like(numerator),
+        where=denominator > 0
+    )
+
+
+def compute_metrics(true_label, predicted, latency, cost, levels,
+                    served=None, cached=None):
+    """Routing metrics over columns of tier codes (index into levels,
+    -1 for unknown), per-query latency in seconds and cost in dollars.
+
+    Tiers are ordered cheapest first, so routing above the true tier is
+    over-provisioning and routing below it under-provisioning. Queries
+    without a known true label only count towards latency and cost."""
+    k = len(levels)
+    true_label = np.asarray(true_label)
+    predicted = np.asarray(predicted)
+    latency = np.asarray(latency, dtype=np.float64)
+    cost = np.asarray(cost, dtype=np.float64)
+
+    labeled = (true_label >= 0) & (predicted >= 0)
+    t = true_label[labeled].astype(np.int64)
+    p = predicted[labeled].astype(np.int64)
+    confusion = np.bincount(t * k + p, minlength=k * k).reshape(k, k)
+
+    hits = np.diag(confusion)
+    support = confusion.sum(axis=1)
+    precision = _ratio(hits, confusion.sum(axis=0))
+    recall = _ratio(hits, support)
+    f1 = _ratio(2 * precision * recall, precision + recall)
+
+    labeled_count = int(labeled.sum())
+    correct = t == p
+    over = p > t
+    under = p < t
+    labeled_latency = latency[labeled]
+    labeled_cost = cost[labeled]
+
+    result = {
+        "levels": list(levels),
+        "queries": int(len(latency)),
+        "labeled": labeled_count,
+        # rows: true tier, columns: routed tier
+        "confusion_matrix": confusion.tolist(),
+        "accuracy": float(_ratio(hits.sum(), labeled_count)),
+        "per_tier": {
+            level: {
+                "precision": float(precision[i]),
+                "recall": float(recall[i]),
+                "f1": float(f1[i]),
+                "support": int(support[i])
+            }
+            for i, level in enumerate(levels)
+        },
+        "macro_f1": float(f1.mean()) if k else 0.0,
+        "over_provisioning": float(_ratio(over.sum(), labeled_count)),
+        "under_provisioning": float(_ratio(under.sum(), labeled_count)),
+        # Share of time and money spent on correctly routed queries, and
+        # what went on queries routed above their tier
+        "latency_weighted_accuracy": float(_ratio(
+            labeled_latency[correct].sum(), labeled_latency.sum()
+        )),
+        "cost_weighted_accuracy": float(_ratio(
+            labeled_cost[correct].sum(), labeled_cost.sum()
+        )),
+        "over_provisioned_latency": float(labeled_latency[over].sum()),
+        "over_provisioned_cost": float(labeled_cost[over].sum()),
+        "total_latency": float(latency.sum()),
+        "total_cost": float(cost.sum())
+    }
+
+    if len(latency):
+        p50, p95, p99 = np.percentile(latency, [50, 95, 99])
+        result.update({
+            "latency_p50": float(p50),
+            "latency_p95": float(p95),
+            "latency_p99": float(p99)
+        })
+
+    if served is not None:
+        served = np.asarray(served)
+        # Fallbacks: answered by a higher tier than the one routed to
+        result["upgrade_rate"] = float(_ratio(
+            ((served > predicted) & (predicted >= 0)).sum(), len(served)
+        ))
+    if cached is not None:
+        result["cache_hit_rate"] = float(_ratio(
+            np.count_nonzero(cached), len(cached)
+        ))
+    return result
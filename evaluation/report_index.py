@@ -0,0 +1,90 @@
+import csv
+import itertools
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class CsvReport:
+    # Per-query rows stay on disk; read_rows pages through them
+    name: str
+    columns: List[str]
+    rows: int
+
+
+class ReportIndex:
+    # Lists evaluation reports newest first, re-statting every file on
+    # refresh so a report rewritten in place shows up. Parsed reports are
+    # kept in a small LRU keyed by (name, mtime, size), taken from a stat
+    # of the file at load time.
+
+    def __init__(self, reports_dir=None, max_loaded=8):
+        self.reports_dir = reports_dir or os.path.join(
+            "data", "evaluation_reports"
+        )
+        self.max_loaded = max_loaded
+        self.reports = []
+        self.loaded = OrderedDict()
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        reports = []
+        try:
+            with os.scandir(self.reports_dir) as it:
+                for entry in it:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        reports.append(
+                            (entry.name, stat.st_mtime, stat.st_size)
+                        )
+        except FileNotFoundError:
+            pass
+        reports.sort(key=lambda report: report[1], reverse=True)
+
+        with self._lock:
+            self.reports = reports
+
+    def search(self, text=None, page=0, page_size=20):
+        with self._lock:
+            reports = self.reports
+            if text:
+                text = text.lower()
+                reports = [r for r in reports if text in r[0].lower()]
+            start = page * page_size
+            return reports[start:start + page_size], len(reports)
+
+    def load(self, name):
+        path = os.path.join(self.reports_dir, name)
+        stat = os.stat(path)
+        key = (name, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if key in self.loaded:
+                self.loaded.move_to_end(key)
+                return self.loaded[key]
+
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            if name.lower().endswith(".json"):
+                content = json.load(f)
+            elif name.lower().endswith(".csv"):
+                reader = csv.reader(f)
+                columns = next(reader, [])
+                content = CsvReport(name, columns, sum(1 for _ in reader))
+            else:
+                content = f.read()
+
+        with self._lock:
+            self.loaded[key] = content
+            while len(self.loaded) > self.max_loaded:
+                self.loaded.popitem(last=False)
+        return content
+
+    def read_rows(self, name, start, count):
+        """Rows [start, start + count) of a CSV report as dicts."""
+        path = os.path.join(self.reports_dir, name)
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            return list(itertools.islice(reader, start, start + count))
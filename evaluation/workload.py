@@ -0,0 +1,359 @@
+import argparse
+import gzip
+import itertools
+import json
+import math
+import os
+import random
+from collections import Counter
+
+from config import Config
+
+TOPICS = [
+    "photosynthesis", "the water cycle", "black holes", "inflation",
+    "the French Revolution", "machine learning", "vaccines", "blockchain",
+    "climate change", "quantum computing", "the immune system",
+    "supply chains", "renewable energy", "the Roman Empire", "plate tectonics",
+    "neural networks", "democracy", "antibiotics", "the stock market",
+    "social media", "urbanization", "the printing press", "DNA replication",
+    "cloud computing", "the Cold War", "ocean currents", "encryption",
+    "globalization", "volcanoes", "remote work", "the Renaissance",
+    "electric vehicles", "gene editing", "operating systems",
+    "the Industrial Revolution", "coral reefs", "interest rates",
+    "open source software", "the human brain", "space exploration",
+    "nuclear energy", "public health", "artificial intelligence",
+    "the internet", "biodiversity", "universal basic income",
+    "relational databases", "the Silk Road", "solar panels", "migration"
+]
+
+ASPECTS = [
+    "impact", "long-term consequences", "ethical implications",
+    "economic effects", "trade-offs", "historical causes", "risks",
+    "main arguments", "limitations", "social effects"
+]
+
+FACTS = [
+    "the capital of Japan", "the boiling point of water",
+    "the largest planet", "the speed of light", "the tallest mountain",
+    "the chemical symbol for gold", "the longest river",
+    "the smallest prime number", "the author of Hamlet",
+    "the currency of Brazil", "the freezing point of water",
+    "the first element", "the largest ocean", "the color of the sky"
+]
+
+# Cue words each tier is phrased around. Medium queries have no cue list
+# of their own: the rules send anything unremarkable to the medium tier.
+SIMPLE_STEMS = [
+    "What is {fact}?", "Who discovered {topic}?", "When did {topic} start?",
+    "Where did {topic} begin?", "Define {topic}.", "Name {fact}.",
+    "Which country is known for {topic}?", "Tell me {fact}."
+]
+SIMPLE_PLAIN_STEMS = [
+    "How many moons does Mars have?", "Is {fact} well known?",
+    "How old is {topic}?", "How long has {topic} existed?"
+]
+MEDIUM_STEMS = [
+    "Explain {topic} in simple terms", "Describe how {topic} works",
+    "Summarize the history of {topic}", "How does {topic} affect {topic2}",
+    "Why does {topic} matter", "Outline the main ideas behind {topic}"
+]
+ADVANCED_STEMS = [
+    "{keyword} the {aspect} of {topic} on {topic2}",
+    "{keyword} the {aspect} of {topic}",
+    "{keyword} competing views on {topic} and {topic2}"
+]
+ADVANCED_PLAIN_STEMS = [
+    "Design a long-term strategy for {topic} that accounts for {topic2}",
+    "Propose a framework for measuring the {aspect} of {topic}",
+    "Build a step-by-step argument about the {aspect} of {topic}"
+]
+CLAUSES = {
+    "simple": ["exactly", "today", "in short"],
+    "medium": [
+        "with an example", "for a beginner", "in a few paragraphs",
+        "and why it is important", "using an everyday analogy",
+        "in the context of {topic2}"
+    ],
+    "advanced": [
+        "considering the {aspect} of {topic2}",
+        "with reference to both historical and current evidence",
+        "and weigh the strongest objections",
+        "across developed and developing countries",
+        "over the next twenty years",
+        "from economic, social and political perspectives"
+    ]
+}
+
+NEAR_DUPLICATE_PREFIXES = ["Quick question: ", "Please ", "Hey, ", "So, "]
+
+
+def iter_queries(path, limit=None):
+    """Yield labeled query dicts from a workload file. JSONL (optionally
+    gzipped) is read line by line; the legacy {"queries": [...]} JSON
+    file is small and is loaded whole."""
+    if path.endswith(".json"):
+        with open(path, 'r', encoding='utf-8') as f:
+            queries = iter(json.load(f).get("queries", []))
+    else:
+        queries = _iter_jsonl(path)
+    return itertools.islice(queries, limit)
+
+
+def _iter_jsonl(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class WorkloadGenerator:
+    # Builds labeled queries from tier templates. Each query's label is
+    # the tier it was generated for; lengths follow a per-tier log-normal
+    # distribution and keyword_rate controls how often a query carries
+    # its tier's cue words (cross_keyword_rate: another tier's cue words,
+    # to exercise misleading keywords).
+    #
+    # With unique_queries set, queries are drawn from a fixed pool of that
+    # many distinct queries (split between the tiers by the mix) with
+    # Zipfian popularity within each tier, so repeated queries behave like
+    # real traffic against the cache while the emitted tier mix still
+    # follows tier_mix. A share of the draws is emitted as a near-duplicate
+    # variant of the pooled query instead.
+
+    def __init__(self, tier_mix=None, lengths=None, keyword_rate=None,
+                 cross_keyword_rate=None, unique_queries=None,
+                 zipf_exponent=None, near_duplicate_rate=None, seed=None):
+        config = Config()
+        self.tier_mix = tier_mix or config.WORKLOAD_TIER_MIX
+        self.lengths = lengths or config.WORKLOAD_LENGTHS
+        self.keyword_rate = (
+            config.WORKLOAD_KEYWORD_RATE
+            if keyword_rate is None else keyword_rate
+        )
+        self.cross_keyword_rate = (
+            config.WORKLOAD_CROSS_KEYWORD_RATE
+            if cross_keyword_rate is None else cross_keyword_rate
+        )
+        self.unique_queries = (
+            config.WORKLOAD_UNIQUE_QUERIES
+            if unique_queries is None else unique_queries
+        )
+        self.zipf_exponent = (
+            config.WORKLOAD_ZIPF_EXPONENT
+            if zipf_exponent is None else zipf_exponent
+        )
+        self.near_duplicate_rate = (
+            config.WORKLOAD_NEAR_DUPLICATE_RATE
+            if near_duplicate_rate is None else near_duplicate_rate
+        )
+        self.complex_keywords = config.COMPLEX_KEYWORDS
+        self.rng = random.Random(seed)
+
+        self.tiers = list(self.tier_mix)
+        self.tier_weights = list(itertools.accumulate(
+            self.tier_mix[tier] for tier in self.tiers
+        ))
+
+    def _fill(self, template):
+        topic, topic2 = self.rng.sample(TOPICS, 2)
+        return template.format(
+            topic=topic,
+            topic2=topic2,
+            fact=self.rng.choice(FACTS),
+            aspect=self.rng.choice(ASPECTS),
+            keyword=self.rng.choice(self.complex_keywords).capitalize()
+        )
+
+    def _target_length(self, tier):
+        median, sigma = self.lengths[tier]
+        return int(self.rng.lognormvariate(math.log(median), sigma))
+
+    def make_query(self, tier):
+        with_keywords = self.rng.random() < self.keyword_rate
+        if tier == "simple":
+            stems = SIMPLE_STEMS if with_keywords else SIMPLE_PLAIN_STEMS
+        elif tier == "medium":
+            stems = MEDIUM_STEMS
+        else:
+            stems = ADVANCED_STEMS if with_keywords else ADVANCED_PLAIN_STEMS
+        text = self._fill(self.rng.choice(stems))
+
+        # Questions keep their question mark at the end
+        ending = ""
+        if text[-1] in "?.":
+            text, ending = text[:-1], text[-1]
+        if tier != "advanced" and self.rng.random() < self.cross_keyword_rate:
+            text = (
+                f"{self.rng.choice(self.complex_keywords).capitalize()} "
+                f"this: {text}"
+            )
+
+        # Pad towards the drawn length, each clause used at most once
+        target = self._target_length(tier)
+        clauses = self.rng.sample(CLAUSES[tier], len(CLAUSES[tier]))
+        while clauses and len(text) < target:
+            text += f", {self._fill(clauses.pop())}"
+        return text + ending
+
+    def near_duplicate(self, text):
+        operation = self.rng.choice(
+            ["case", "punctuation", "whitespace", "prefix", "typo"]
+        )
+        if operation == "case":
+            text = text.lower() if self.rng.random() < 0.5 else text.upper()
+        elif operation == "punctuation":
+            text = text.rstrip("?.!") if text[-1] in "?.!" else text + "?"
+        elif operation == "whitespace":
+            text = "  " + text.replace(" ", "  ", 1) + " "
+        elif operation == "prefix":
+            text = self.rng.choice(NEAR_DUPLICATE_PREFIXES) + text
+        else:
+            # Swap two neighbouring letters inside the text
+            letters = [i for i in range(len(text) - 1)
+                       if text[i].isalpha() and text[i + 1].isalpha()]
+            if letters:
+                i = self.rng.choice(letters)
+                text = text[:i] + text[i + 1] + text[i] + text[i + 2:]
+        return text, operation
+
+    def _pick_tier(self):
+        return self.rng.choices(self.tiers, cum_weights=self.tier_weights)[0]
+
+    def generate(self, count, batch_size=10000):
+        """Yield count labeled query dicts."""
+        if not self.unique_queries:
+            for i in range(count):
+                tier = self._pick_tier()
+                yield {
+                    "id": i,
+                    "text": self.make_query(tier),
+                    "true_label": tier
+                }
+            return
+
+        # One pool per tier, sized by the mix. Each draw picks the tier
+        # from the mix first and then a query by Zipfian rank within that
+        # tier's pool, so repetition doesn't skew the emitted mix.
+        total_weight = self.tier_weights[-1]
+        pools = {}
+        first_id = 0
+        for tier in self.tiers:
+            size = max(1, round(
+                self.unique_queries * self.tier_mix[tier] / total_weight
+            ))
+            pools[tier] = (
+                first_id,
+                [self.make_query(tier) for _ in range(size)],
+                list(itertools.accumulate(
+                    1 / rank ** self.zipf_exponent
+                    for rank in range(1, size + 1)
+                ))
+            )
+            first_id += size
+
+        for start in range(0, count, batch_size):
+            tiers = self.rng.choices(
+                self.tiers,
+                cum_weights=self.tier_weights,
+                k=min(batch_size, count - start)
+            )
+            # Ranks are drawn per tier in bulk and handed out in order
+            ranks = {}
+            for tier, drawn in Counter(tiers).items():
+                _, pool, popularity = pools[tier]
+                ranks[tier] = iter(self.rng.choices(
+                    range(len(pool)),
+                    cum_weights=popularity,
+                    k=drawn
+                ))
+
+            for offset, tier in enumerate(tiers):
+                first, pool, _ = pools[tier]
+                rank = next(ranks[tier])
+                text = pool[rank]
+                record = {
+                    "id": start + offset,
+                    "text": text,
+                    "true_label": tier,
+                    "query_id": first + rank
+                }
+                if self.rng.random() < self.near_duplicate_rate:
+                    record["text"], record["variant"] = (
+                        self.near_duplicate(text)
+                    )
+                yield record
+
+    def write(self, path, count, progress_every=100000):
+        # Written to a temporary file line by line and moved into place,
+        # so a partial run never leaves a truncated workload behind
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        opener = gzip.open if path.endswith(".gz") else open
+        temp_path = path + ".tmp"
+
+        with opener(temp_path, 'wt', encoding='utf-8') as f:
+            for record in self.generate(count):
+                f.write(json.dumps(
+                    record,
+                    ensure_ascii=False,
+                    separators=(",", ":")
+                ))
+                f.write("\n")
+                written = record["id"] + 1
+                if progress_every and written % progress_every == 0:
+                    print(f"  {written}/{count} queries written")
+        os.replace(temp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a labeled synthetic query workload (JSONL)"
+    )
+    parser.add_argument("count", type=int)
+    parser.add_argument(
+        "--output",
+        default=os.path.join("data", "workloads", "workload.jsonl"),
+        help="output file; a .gz suffix writes it gzipped"
+    )
+    parser.add_argument(
+        "--mix",
+        nargs=3,
+        type=float,
+        metavar=("SIMPLE", "MEDIUM", "ADVANCED"),
+        default=None,
+        help="relative share of each tier"
+    )
+    parser.add_argument("--keyword-rate", type=float, default=None)
+    parser.add_argument("--cross-keyword-rate", type=float, default=None)
+    parser.add_argument(
+        "--unique",
+        type=int,
+        default=None,
+        help="distinct queries to draw from (0: every query is new)"
+    )
+    parser.add_argument("--zipf", type=float, default=None)
+    parser.add_argument("--near-duplicates", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    generator = WorkloadGenerator(
+        tier_mix=(
+            dict(zip(["simple", "medium", "advanced"], args.mix))
+            if args.mix else None
+        ),
+        keyword_rate=args.keyword_rate,
+        cross_keyword_rate=args.cross_keyword_rate,
+        unique_queries=args.unique,
+        zipf_exponent=args.zipf,
+        near_duplicate_rate=args.near_duplicates,
+        seed=args.seed
+    )
+    print(f"Generating {args.count} queries...")
+    generator.write(args.output, args.count)
+    print(f"Workload saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
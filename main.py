@@ -1,8 +1,10 @@
+import argparse
 import os
 import sys
-from router.query_router import router
+from router.query_router import RuleRouter, router
 from models.gemini_models import GeminiModels
 from evaluation.evaluator import Evaluator
+from router.usage import print_summary
 from config import Config
 
 sys.path.insert(
@@ -14,9 +16,9 @@ sys.path.insert(
 
 
 class DynamicRoutingApp:
-    def __init__(self):
+    def __init__(self, query_router=None):
         self.config = Config()
-        self.router = router
+        self.router = query_router or router
         self.evaluator = Evaluator()
         self.running = True
 
@@ -29,8 +31,12 @@ class DynamicRoutingApp:
         print("="*50)
 
         print("type 'exit' to Quit application")
-        print("type 'evaluate' to run evaluation")
+        print("type 'evaluate' to run evaluation "
+              "('evaluate <file>' for a generated workload)")
         print("type 'list' to show all available LLMs")
+        print("type 'backends' to show backend pool health")
+        print("type 'usage' to show token/latency usage "
+              "('usage export' to save a report)")
 
         print("="*50)
 
@@ -50,9 +56,39 @@ class DynamicRoutingApp:
         print("response: ", result["response"])
         print("-"*50)
 
+    def print_backends(self):
+        for level, backends in self.router.model.stats().items():
+            print(f"{level}:")
+            for backend in backends:
+                latency = backend["latency_ewma"]
+                latency_text = (
+                    f"{latency:.3f}s" if latency is not None else "n/a"
+                )
+                print(
+                    f"  {backend['name']} ({backend['provider']}) "
+                    f"latency={latency_text} "
+                    f"error_rate={backend['error_rate']:.2f} "
+                    f"calls={backend['calls']} "
+                    f"breaker={backend['breaker']}"
+                )
+
+    def print_usage(self):
+        for window in self.router.usage.windows:
+            label = f"last {window}s" if window else "all buffered"
+            print(f"Window: {label}")
+            print_summary(self.router.usage.summary(window))
+
     def handle_command(self, command: str):
-        if command == "evaluate":
-            self.evaluator.evaluate_system(self.router)
+        # "evaluate <file>" only when the file exists, so queries that
+        # start with "evaluate" still get routed
+        queries_file = command[len("evaluate "):].strip()
+        if command == "evaluate" or (
+                command.startswith("evaluate ")
+                and os.path.isfile(queries_file)):
+            evaluator = (
+                Evaluator(queries_file) if queries_file else self.evaluator
+            )
+            evaluator.evaluate_system(self.router)
             self.running = False
             print("Exiting application")
             print("="*50)
@@ -65,29 +101,64 @@ class DynamicRoutingApp:
         elif command == "list":
             GeminiModels().Print_all_available_Gemini_models()
 
+        elif command == "backends":
+            self.print_backends()
+
+        elif command == "usage":
+            self.print_usage()
+
+        elif command == "usage export":
+            report_file = self.router.usage.export()
+            print(f"Usage report saved to: {report_file}")
+
         else:
             self.process_query(command)
 
     def run(self):
         self.print_header()
         while self.running:
-            query = input("Query> ").strip()
+            try:
+                query = input("Query> ").strip()
+            except (EOFError, KeyboardInterrupt):
+                print()
+                break
             if query:
                 self.handle_command(query)
 
 
 def main():
-    # app = DynamicRoutingApp()
-    # app.run()
-    from models.router_model import RouterModel
-    model = RouterModel()
-    response = model.classify_difficulty(
-        """
-            what is 2+2
-        """)
-    print(f"Response: {response}")
+    parser = argparse.ArgumentParser(
+        description="Route queries interactively, or run one command"
+    )
+    parser.add_argument(
+        "command",
+        nargs="*",
+        help="a query or command (evaluate [file], list, backends) to run "
+             "once instead of starting the prompt"
+    )
+    parser.add_argument(
+        "--provider",
+        default=None,
+        help="model provider (default: Config.MODEL_PROVIDER)"
+    )
+    args = parser.parse_args()
 
+    app = DynamicRoutingApp(
+        RuleRouter(model_provider=args.provider) if args.provider else None
+    )
+    command = " ".join(args.command)
+    if command in ("usage", "usage export"):
+        # Usage is held in memory by the process that served the requests;
+        # a fresh process has none to show
+        parser.error(
+            f"'{command}' reports this process's usage: run it at the "
+            "prompt, or read /metrics from a running server.py"
+        )
+    if command:
+        app.handle_command(command)
+    else:
+        app.run()
 
-if __name__ == "__main__":
 
+if __name__ == "__main__":
     main()
@@ -1,7 +1,47 @@
+import threading
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional
+
+# Rough chars-per-token ratio for providers that report no usage
+CHARS_PER_TOKEN = 4
+
+# Usage of the last call made on this thread; providers set it inside
+# generate() and callers take it right after on the same thread
+_last_usage = threading.local()
+
+
+@dataclass
+class Usage:
+    input_tokens: int = 0
+    output_tokens: int = 0
+    estimated: bool = False
+
+    @property
+    def total_tokens(self):
+        return self.input_tokens + self.output_tokens
 
 
 class BaseModel(ABC):
     @abstractmethod
     def generate(self, prompt: str, model_level: str):
         pass
+
+    def generate_stream(self, prompt: str, model_level: str, **kwargs):
+        # Default: the whole response as a single chunk
+        yield self.generate(prompt, model_level, **kwargs)
+
+    def _record_usage(self, input_tokens, output_tokens):
+        _last_usage.value = Usage(input_tokens or 0, output_tokens or 0)
+
+    def take_usage(self, prompt: str, response: Optional[str]) -> Usage:
+        usage = getattr(_last_usage, "value", None)
+        _last_usage.value = None
+        if usage is not None:
+            return usage
+
+        return Usage(
+            len(prompt) // CHARS_PER_TOKEN,
+            len(response or "") // CHARS_PER_TOKEN,
+            estimated=True
+        )
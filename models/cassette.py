@@ -0,0 +1,271 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from .base import BaseModel, _last_usage
+
+
+class RecordedError(Exception):
+    # A provider error replayed from a cassette
+    pass
+
+
+class CassetteMiss(Exception):
+    pass
+
+
+def _hash(*parts):
+    return hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class Cassette:
+    # Provider calls saved one per line as
+    #   <call key> <prompt key>\t<JSON record>
+    # The call key hashes model, tier and prompt; the prompt key only tier
+    # and prompt, so a replay can answer from another backend of the same
+    # tier (or from a recording made against another provider's pool).
+    # Prompts themselves aren't stored. Opening a cassette for replay reads
+    # just the keys and byte offsets; records are read when first served.
+    #
+    # Record: {"model", "level", "latency", "response" or "error",
+    #          "usage": [input, output] or null}; streamed calls keep
+    #          "chunks": [[seconds since the call started, text], ...]
+    #          instead of "response".
+
+    def __init__(self, path):
+        self.path = path
+        self.calls = defaultdict(list)
+        self.prompts = defaultdict(list)
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self._reader = None
+        self._writer = None
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.path):
+            return
+        offset = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                keys, _, _ = line.partition(b"\t")
+                call_key, _, prompt_key = keys.decode("ascii").partition(" ")
+                self.calls[call_key].append(offset)
+                self.prompts[prompt_key].append(offset)
+                offset += len(line)
+
+    def record(self, model_name, model_level, prompt, entry):
+        entry = {"model": model_name, "level": model_level, **entry}
+        call_key = _hash(model_name or '', model_level, prompt)
+        prompt_key = _hash(model_level, prompt)
+        line = (
+            f"{call_key} {prompt_key}\t"
+            + json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+            + "\n"
+        ).encode("utf-8")
+        with self._lock:
+            if self._writer is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._writer = open(self.path, 'ab')
+            # Indexed as it is written, so this process can replay what it
+            # has just recorded
+            offset = self._writer.tell()
+            self._writer.write(line)
+            self._writer.flush()
+            self.calls[call_key].append(offset)
+            self.prompts[prompt_key].append(offset)
+            self.recorded += 1
+
+    def lookup(self, model_name, model_level, prompt, served):
+        """The next recording for this call, falling back to recordings of
+        the same prompt on another backend of the tier; None if there are
+        none. served counts the calls already answered per key, so the
+        n-th call for a prompt gets its n-th recording (and the last one
+        after that)."""
+        call_key = _hash(model_name or '', model_level, prompt)
+        prompt_key = _hash(model_level, prompt)
+        with self._lock:
+            if call_key in self.calls:
+                key, offsets = call_key, self.calls[call_key]
+            elif prompt_key in self.prompts:
+                key, offsets = prompt_key, self.prompts[prompt_key]
+            else:
+                self.misses += 1
+                return None
+            offset = offsets[min(served[key], len(offsets) - 1)]
+            served[key] += 1
+            self.replayed += 1
+
+            if self._reader is None:
+                self._reader = open(self.path, 'rb')
+            self._reader.seek(offset)
+            line = self._reader.readline()
+        return json.loads(line.partition(b"\t")[2])
+
+    def stats(self):
+        with self._lock:
+            return {
+                "recorded": self.recorded,
+                "replayed": self.replayed,
+                "misses": self.misses,
+                "calls": sum(len(o) for o in self.calls.values())
+            }
+
+    def close(self):
+        with self._lock:
+            for f in (self._reader, self._writer):
+                if f is not None:
+                    f.close()
+            self._reader = None
+            self._writer = None
+
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+
+def open_cassette(path):
+    # One Cassette per file in the process, so every registry recording
+    # to it appends through the same handle
+    path = os.path.abspath(path)
+    with _cassettes_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+
+class RecordingModel(BaseModel):
+    # Passes every call through to provider and saves what came back (or
+    # the error it raised), how long it took and the reported token usage
+
+    def __init__(self, provider, cassette):
+        self.provider = provider
+        self.cassette = cassette
+
+    def _usage(self):
+        # Left by the provider for the registry's take_usage(); only read
+        usage = getattr(_last_usage, "value", None)
+        if usage is None:
+            return None
+        return [usage.input_tokens, usage.output_tokens]
+
+    def generate(self, prompt: str, model_level: str, model_name=None,
+                 **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.provider.generate(
+                prompt,
+                model_level,
+                model_name=model_name,
+                **kwargs
+            )
+        except Exception as e:
+            self.cassette.record(model_name, model_level, prompt, {
+                "latency": time.perf_counter() - start,
+                "error": f"{type(e).__name__}: {e}",
+                "usage": self._usage()
+            })
+            raise
+
+        self.cassette.record(model_name, model_level, prompt, {
+            "latency": time.perf_counter() - start,
+            "response": response,
+            "usage": self._usage()
+        })
+        return response
+
+    def generate_stream(self, prompt: str, model_level: str,
+                        model_name=None, **kwargs):
+        chunks = []
+        error = None
+        start = time.perf_counter()
+        try:
+            for chunk in self.provider.generate_stream(
+                prompt,
+                model_level,
+                model_name=model_name,
+                **kwargs
+            ):
+                chunks.append([time.perf_counter() - start, chunk])
+                yield chunk
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            # A stream the caller stopped reading is recorded as far as it
+            # got
+            entry = {
+                "latency": time.perf_counter() - start,
+                "chunks": chunks,
+                "usage": self._usage()
+            }
+            if error:
+                entry["error"] = error
+            self.cassette.record(model_name, model_level, prompt, entry)
+
+
+class ReplayModel(BaseModel):
+    # Serves calls from a cassette instead of a provider: the recorded
+    # response, or the recorded error raised as RecordedError, after the
+    # recorded latency divided by speed (0: no waiting). A call with no
+    # recording raises CassetteMiss. Each ReplayModel replays the cassette
+    # from its first recording.
+
+    def __init__(self, cassette, speed=1.0):
+        self.cassette = cassette
+        self.speed = speed
+        self.served = defaultdict(int)
+
+    def _wait(self, seconds):
+        if self.speed and seconds > 0:
+            time.sleep(seconds / self.speed)
+
+    def _lookup(self, prompt, model_level, model_name):
+        entry = self.cassette.lookup(
+            model_name,
+            model_level,
+            prompt,
+            self.served
+        )
+        if entry is None:
+            raise CassetteMiss(
+                f"No recorded {model_level} call for prompt "
+                f"{prompt[:60]!r}"
+            )
+        if entry.get("usage"):
+            self._record_usage(*entry["usage"])
+        return entry
+
+    def generate(self, prompt: str, model_level: str, model_name=None,
+                 **kwargs):
+        entry = self._lookup(prompt, model_level, model_name)
+        self._wait(entry["latency"])
+        if "error" in entry:
+            raise RecordedError(entry["error"])
+        if "chunks" in entry:
+            return "".join(text for _, text in entry["chunks"])
+        return entry["response"]
+
+    def generate_stream(self, prompt: str, model_level: str,
+                        model_name=None, **kwargs):
+        entry = self._lookup(prompt, model_level, model_name)
+        chunks = entry.get("chunks")
+        if chunks is None:
+            chunks = []
+            if "error" not in entry:
+                chunks = [[entry["latency"], entry["response"]]]
+
+        elapsed = 0.0
+        for at, text in chunks:
+            self._wait(at - elapsed)
+            elapsed = at
+            yield text
+        self._wait(entry["latency"] - elapsed)
+        if "error" in entry:
+            raise RecordedError(entry["error"])
@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import deque
+
+from config import Config
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # closed -> open when too many of the recent calls failed or were slow;
+    # open -> half_open after open_seconds; half_open lets a few trial
+    # calls through and closes again on success or re-opens on failure.
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str):
+        config = Config()
+        self.name = name
+        self.min_calls = config.BREAKER_MIN_CALLS
+        self.failure_rate = config.BREAKER_FAILURE_RATE
+        self.slow_call_seconds = config.BREAKER_SLOW_CALL_SECONDS
+        self.open_seconds = config.BREAKER_OPEN_SECONDS
+        self.half_open_calls = config.BREAKER_HALF_OPEN_CALLS
+
+        self.window = deque(maxlen=config.BREAKER_WINDOW)
+        self._state = self.CLOSED
+        self.opened_at = 0.0
+        self.trials_in_flight = 0
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if (
+            self._state == self.OPEN
+            and time.time() - self.opened_at >= self.open_seconds
+        ):
+            self._state = self.HALF_OPEN
+            self.trials_in_flight = 0
+        return self._state
+
+    def available(self) -> bool:
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN:
+                return self.trials_in_flight < self.half_open_calls
+            return False
+
+    def before_call(self):
+        with self._lock:
+            state = self._current_state()
+            if state == self.OPEN or (
+                state == self.HALF_OPEN
+                and self.trials_in_flight >= self.half_open_calls
+            ):
+                raise CircuitOpenError(f"Circuit open for {self.name}")
+            if state == self.HALF_OPEN:
+                self.trials_in_flight += 1
+
+    def record(self, latency: float, failed: bool):
+        # Slow calls count against the breaker the same as errors
+        bad = failed or latency >= self.slow_call_seconds
+
+        with self._lock:
+            state = self._current_state()
+            if state == self.HALF_OPEN:
+                self.trials_in_flight = max(0, self.trials_in_flight - 1)
+                if bad:
+                    self._open()
+                else:
+                    self._state = self.CLOSED
+                    self.window.clear()
+                return
+
+            self.window.append(bad)
+            if state == self.CLOSED and len(self.window) >= self.min_calls:
+                if sum(self.window) / len(self.window) >= self.failure_rate:
+                    self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self.opened_at = time.time()
+        self.times_opened += 1
+        self.window.clear()
+
+    def to_dict(self):
+        with self._lock:
+            state = self._current_state()
+            failures = sum(self.window)
+            return {
+                "state": state,
+                "recent_calls": len(self.window),
+                "recent_failures": failures,
+                "times_opened": self.times_opened,
+                "retry_in": (
+                    max(0.0, self.open_seconds
+                        - (time.time() - self.opened_at))
+                    if state == self.OPEN else 0.0
+                )
+            }
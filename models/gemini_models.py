@@ -44,16 +44,46 @@ class GeminiModels(BaseModel):
     def _get_model_info(self, model_level: str):
         return self.models[model_level]
 
-    def generate(self, prompt: str, model_level: str):
-        model_info = self._get_model_info(model_level)
+    def generate(self, prompt: str, model_level: str, model_name=None):
+        # model_name lets the registry target a specific pool backend
+        if model_name is None:
+            model_name = self._get_model_info(model_level).name
 
         response = self.client.models.generate_content(
-            model=model_info.name,
+            model=model_name,
             contents=prompt
         )
 
+        usage = response.usage_metadata
+        if usage is not None:
+            self._record_usage(
+                usage.prompt_token_count,
+                usage.candidates_token_count
+            )
+
         return response.text
 
+    def generate_stream(self, prompt: str, model_level: str,
+                        model_name=None):
+        if model_name is None:
+            model_name = self._get_model_info(model_level).name
+
+        usage = None
+        for chunk in self.client.models.generate_content_stream(
+            model=model_name,
+            contents=prompt
+        ):
+            # Usage totals arrive with the final chunk
+            usage = chunk.usage_metadata or usage
+            if chunk.text:
+                yield chunk.text
+
+        if usage is not None:
+            self._record_usage(
+                usage.prompt_token_count,
+                usage.candidates_token_count
+            )
+
     def Print_all_available_Gemini_models(self):
         models = self.client.models.list()
         for model in models:
@@ -0,0 +1,38 @@
+import json
+import urllib.request
+from .base import BaseModel
+
+from config import Config
+
+
+# Stand-in backend served from a local HTTP endpoint. Speaks the Ollama
+# /api/generate shape: POST {"model", "prompt", "stream": false} and read
+# "response" from the JSON reply.
+class LocalModel(BaseModel):
+    def __init__(self, endpoint=None, timeout=None):
+        config = Config()
+        self.endpoint = endpoint or config.LOCAL_MODEL_ENDPOINT
+        self.timeout = timeout or config.LOCAL_MODEL_TIMEOUT
+
+    def generate(self, prompt: str, model_level: str, model_name=None):
+        payload = json.dumps({
+            "model": model_name or model_level,
+            "prompt": prompt,
+            "stream": False
+        }).encode("utf-8")
+
+        request = urllib.request.Request(
+            self.endpoint,
+            data=payload,
+            headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as reply:
+            body = json.loads(reply.read().decode("utf-8"))
+
+        if "eval_count" in body:
+            self._record_usage(
+                body.get("prompt_eval_count"),
+                body.get("eval_count")
+            )
+
+        return body["response"]
@@ -1,15 +1,42 @@
+import math
+import random
+import threading
+import time
 from .base import BaseModel
 
+from config import Config
+
 
 class MockModel(BaseModel):
-    def __init__(self):
+    def __init__(self, latency_profile=None, seed=None):
         self.models = {
             "simple": "mock-simple",
             "medium": "mock-medium",
             "advanced": "mock-advanced"
         }
+        # Profile name from Config.MOCK_LATENCY_PROFILES; each tier maps to
+        # [mean, stdev] seconds of simulated latency
+        config = Config()
+        profile_name = latency_profile or config.MOCK_LATENCY_PROFILE
+        self.latency_profile = config.MOCK_LATENCY_PROFILES[profile_name]
+        self.random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def _simulate_latency(self, level):
+        if not self.latency_profile or level not in self.latency_profile:
+            return
+
+        mean, stdev = self.latency_profile[level]
+        # Log-normal with the given mean/stdev: never negative and with a
+        # long right tail, like real API latency
+        sigma = math.sqrt(math.log(1 + (stdev / mean) ** 2))
+        mu = math.log(mean) - sigma ** 2 / 2
+        with self._random_lock:
+            delay = self.random.lognormvariate(mu, sigma)
+        time.sleep(delay)
 
-    def generate(self, prompt: str, level: str = "simple"):
+    def generate(self, prompt: str, level: str = "simple", model_name=None):
+        self._simulate_latency(level)
         text = prompt[:30] + "..."
         return {
             "simple": f"Simple mock response for: {text}",
@@ -0,0 +1,272 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+from .base import BaseModel
+from .cassette import RecordingModel, ReplayModel, open_cassette
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+
+from config import Config
+
+
+@dataclass
+class Backend:
+    name: str
+    provider: str
+    cost_per_million_tokens: float = 0.0
+    latency_ewma: Optional[float] = None
+    error_rate: float = 0.0
+    calls: int = 0
+    errors: int = 0
+    last_used: float = 0.0
+
+    def record(self, latency: float, failed: bool, alpha: float):
+        self.calls += 1
+        self.last_used = time.time()
+        if failed:
+            self.errors += 1
+        else:
+            # Failed calls don't tell us how fast the backend answers
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma = (
+                    alpha * latency + (1 - alpha) * self.latency_ewma
+                )
+        self.error_rate = (
+            alpha * float(failed) + (1 - alpha) * self.error_rate
+        )
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "provider": self.provider,
+            "cost_per_million_tokens": self.cost_per_million_tokens,
+            "latency_ewma": self.latency_ewma,
+            "error_rate": round(self.error_rate, 4),
+            "calls": self.calls,
+            "errors": self.errors
+        }
+
+
+class ModelRegistry(BaseModel):
+    # Maps each tier to an ordered pool of backends and sends every call
+    # to the fastest healthy one. Providers are created lazily and shared
+    # between backends of the same provider.
+
+    def __init__(self, pools, providers=None):
+        config = Config()
+        self.alpha = config.REGISTRY_EWMA_ALPHA
+        self.max_error_rate = config.REGISTRY_MAX_ERROR_RATE
+        self.probe_interval = config.REGISTRY_PROBE_INTERVAL
+        # "record" wraps every provider to save its calls to the cassette,
+        # "replay" serves them back in place of any provider
+        self.cassette_mode = config.MODEL_CASSETTE_MODE
+        if self.cassette_mode not in (None, "record", "replay"):
+            raise ValueError(
+                f"Unknown MODEL_CASSETTE_MODE: {self.cassette_mode!r} "
+                f"(expected 'record' or 'replay')"
+            )
+        self.cassette = None
+        if self.cassette_mode:
+            self.cassette = open_cassette(config.MODEL_CASSETTE)
+        self.cassette_speed = config.MODEL_CASSETTE_SPEED
+
+        self.providers = dict(providers or {})
+        self.pools = {
+            level: [Backend(**spec) for spec in specs]
+            for level, specs in pools.items()
+        }
+        # One breaker per model, shared if a model sits in several tiers
+        self.breakers = {
+            backend.name: CircuitBreaker(backend.name)
+            for pool in self.pools.values()
+            for backend in pool
+        }
+        # Called as fn(model_level, backend, latency, usage, failed) after
+        # every provider call
+        self.listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def level_of(self, model_name: str) -> Optional[str]:
+        for level, pool in self.pools.items():
+            if any(backend.name == model_name for backend in pool):
+                return level
+        return None
+
+    def _get_provider(self, name: str) -> BaseModel:
+        with self._lock:
+            if name not in self.providers:
+                self.providers[name] = self._create_provider(name)
+            return self.providers[name]
+
+    def _create_provider(self, name: str) -> BaseModel:
+        if self.cassette_mode == "replay":
+            return ReplayModel(self.cassette, self.cassette_speed)
+        provider = self._create_live_provider(name)
+        if self.cassette_mode == "record":
+            return RecordingModel(provider, self.cassette)
+        return provider
+
+    def _create_live_provider(self, name: str) -> BaseModel:
+        if name == "gemini":
+            from .gemini_models import GeminiModels
+            return GeminiModels()
+        elif name == "mock":
+            from .mock_model import MockModel
+            return MockModel()
+        elif name == "local":
+            from .local_model import LocalModel
+            return LocalModel()
+        raise ValueError(f"Unknown backend provider: {name}")
+
+    def select(self, model_level: str) -> Backend:
+        pool = self.pools.get(model_level)
+        if not pool:
+            raise ValueError(f"No backends configured for {model_level}")
+
+        now = time.time()
+        with self._lock:
+            # Backends behind an open breaker are skipped outright
+            available = [
+                b for b in pool if self.breakers[b.name].available()
+            ]
+            if not available:
+                raise CircuitOpenError(
+                    f"All {model_level} backends are unavailable"
+                )
+
+            # Re-probe backends we haven't heard from in a while so a
+            # recovered (or newly faster) backend gets a chance again
+            for backend in available:
+                if (
+                    backend.calls
+                    and now - backend.last_used > self.probe_interval
+                ):
+                    backend.last_used = now
+                    return backend
+
+            healthy = [
+                b for b in available if b.error_rate < self.max_error_rate
+            ] or available
+
+            # Untried backends sort first so each one gets measured;
+            # cost breaks ties and min() keeps pool order after that
+            return min(
+                healthy,
+                key=lambda b: (
+                    b.latency_ewma or 0.0,
+                    b.cost_per_million_tokens
+                )
+            )
+
+    def generate_with_backend(self, prompt: str, model_level: str,
+                              listener=None):
+        # listener, like the registered ones, is called after the call but
+        # hears about this call only
+        backend = self.select(model_level)
+        provider = self._get_provider(backend.provider)
+        self.breakers[backend.name].before_call()
+
+        start = time.perf_counter()
+        try:
+            response = provider.generate(
+                prompt,
+                model_level,
+                model_name=backend.name
+            )
+        except Exception:
+            latency = time.perf_counter() - start
+            self._record(backend, latency, True)
+            self._notify(
+                model_level,
+                backend,
+                latency,
+                provider.take_usage(prompt, None),
+                True,
+                listener
+            )
+            raise
+
+        latency = time.perf_counter() - start
+        self._record(backend, latency, False)
+        self._notify(
+            model_level,
+            backend,
+            latency,
+            provider.take_usage(prompt, response),
+            False,
+            listener
+        )
+        return response, backend.name
+
+    def generate_stream_with_backend(self, prompt: str, model_level: str,
+                                     listener=None):
+        # Yields (chunk, backend name); stats are recorded when the stream
+        # ends, including when the caller stops reading early
+        backend = self.select(model_level)
+        provider = self._get_provider(backend.provider)
+        self.breakers[backend.name].before_call()
+
+        parts = []
+        failed = False
+        start = time.perf_counter()
+        try:
+            for chunk in provider.generate_stream(
+                prompt,
+                model_level,
+                model_name=backend.name
+            ):
+                parts.append(chunk)
+                yield chunk, backend.name
+        except Exception:
+            failed = True
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            response = None if failed else "".join(parts)
+            self._record(backend, latency, failed)
+            self._notify(
+                model_level,
+                backend,
+                latency,
+                provider.take_usage(prompt, response),
+                failed,
+                listener
+            )
+
+    def _record(self, backend: Backend, latency: float, failed: bool):
+        with self._lock:
+            backend.record(latency, failed, self.alpha)
+        self.breakers[backend.name].record(latency, failed)
+
+    def _notify(self, model_level, backend, latency, usage, failed,
+                listener=None):
+        extra = [listener] if listener else []
+        for notify in self.listeners + extra:
+            notify(model_level, backend, latency, usage, failed)
+
+    def generate(self, prompt: str, model_level: str):
+        response, _ = self.generate_with_backend(prompt, model_level)
+        return response
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                level: [backend.to_dict() for backend in pool]
+                for level, pool in self.pools.items()
+            }
+
+        for pool in stats.values():
+            for backend in pool:
+                backend["breaker"] = self.breakers[backend["name"]].state
+        return stats
+
+    def health(self):
+        return {
+            name: breaker.to_dict()
+            for name, breaker in self.breakers.items()
+        }
@@ -1,35 +1,45 @@
 import time
 import json
 import os
+import threading
 from datetime import datetime
 from typing import Optional, Dict, Any
 from config import Config
 
 
 class Cache:
-    def __init__(self):
+    def __init__(self, cache_file=None, persist=True):
+        # persist=False keeps the cache in memory only: nothing is read
+        # from or written to cache_file
         config = Config()
         self.enabled = config.CACHE_ENABLED
-        self.cache_dir = os.path.join("data", "cache")
-        self.cache_file = os.path.join(self.cache_dir, "query_cache.json")
+        self.persist = persist
+        if cache_file is None:
+            cache_file = os.path.join("data", "cache", "query_cache.json")
+        self.cache_dir = os.path.dirname(cache_file)
+        self.cache_file = cache_file
         self.memory_cache = {}
+        # Serialises writers: the file is rewritten from memory_cache,
+        # which must not change while it is being dumped
+        self._lock = threading.Lock()
 
-        self._ensure_cache_dir()
-        self._load_from_file()
+        if persist:
+            self._ensure_cache_dir()
+            self._load_from_file()
 
     def _ensure_cache_dir(self):
-        if not os.path.exists(self.cache_dir):
+        if self.cache_dir and not os.path.exists(self.cache_dir):
             os.makedirs(self.cache_dir)
 
     def _load_from_file(self):
-        if not self.enabled:
+        if not self.enabled or not os.path.exists(self.cache_file):
             return
 
         with open(self.cache_file, 'r', encoding='utf-8') as f:
             self.memory_cache = json.load(f)
 
     def _save_to_file(self):
-        if not self.enabled:
+        if not self.enabled or not self.persist:
             return
 
         with open(self.cache_file, 'w', encoding='utf-8') as f:
@@ -55,7 +65,14 @@ class Cache:
         if not self.enabled:
             return
 
-        self.memory_cache[query] = {
+        with self._lock:
+            self.memory_cache[query] = self._make_record(
+                query, response, model, complexity
+            )
+            self._save_to_file()
+
+    def _make_record(self, query, response, model, complexity):
+        return {
             "query": query,
             "response": response,
             "model": model,
@@ -65,9 +82,21 @@ class Cache:
             "response_length": len(response)
         }
 
-        self._save_to_file()
+    def delete_many(self, queries):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            for query in queries:
+                self.memory_cache.pop(query, None)
+            self._save_to_file()
 
     def clear(self):
-        self.memory_cache = {}
-        if self.enabled and os.path.exists(self.cache_file):
-            os.remove(self.cache_file)
+        with self._lock:
+            self.memory_cache = {}
+            if (
+                self.enabled
+                and self.persist
+                and os.path.exists(self.cache_file)
+            ):
+                os.remove(self.cache_file)
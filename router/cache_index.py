@@ -0,0 +1,270 @@
+import bisect
+import codecs
+import json
+import os
+import threading
+from dataclasses import dataclass
+
+
+@dataclass
+class CacheIndexEntry:
+    # Everything needed to list and filter an entry; the response itself
+    # stays on disk at [offset, offset + length) of the cache file
+    query: str
+    model: str
+    complexity: str
+    timestamp: float
+    response_length: int
+    offset: int
+    length: int
+
+
+def iter_json_object(path, chunk_size=1 << 20):
+    """Yield (key, value, byte_offset, byte_length) for each member of
+    the top-level JSON object in path, reading it chunk by chunk."""
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+
+    with open(path, 'rb') as f:
+        buffer = ""
+        buffer_offset = 0
+        eof = False
+
+        def read_more():
+            nonlocal buffer, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer += text_decoder.decode(chunk, final=eof)
+
+        def skip_whitespace(i):
+            while True:
+                while i < len(buffer) and buffer[i].isspace():
+                    i += 1
+                if i < len(buffer) or eof:
+                    return i
+                read_more()
+
+        read_more()
+        i = skip_whitespace(0)
+        if i >= len(buffer) or buffer[i] != "{":
+            return
+        i += 1
+
+        while True:
+            i = skip_whitespace(i)
+            if i >= len(buffer) or buffer[i] == "}":
+                return
+            if buffer[i] == ",":
+                i = skip_whitespace(i + 1)
+
+            # Decode "key": value, reading more if the member is cut off
+            while True:
+                try:
+                    key, end = decoder.raw_decode(buffer, i)
+                    colon = skip_whitespace(end)
+                    if buffer[colon] != ":":
+                        raise ValueError(f"Expected ':' at {colon}")
+                    start = skip_whitespace(colon + 1)
+                    value, end = decoder.raw_decode(buffer, start)
+                    break
+                except (json.JSONDecodeError, IndexError):
+                    if eof:
+                        raise
+                    read_more()
+
+            value_offset = buffer_offset + len(buffer[:start].encode("utf-8"))
+            value_length = len(buffer[start:end].encode("utf-8"))
+            yield key, value, value_offset, value_length
+
+            # Drop what has been consumed so the buffer stays chunk-sized
+            buffer_offset = value_offset + value_length
+            buffer = buffer[end:]
+            i = 0
+
+
+class _IndexedEntries:
+    # One build of the index: the entries in file order and the lookups
+    # over them
+
+    def __init__(self):
+        self.entries = []
+        self.by_model = {}
+        self.by_complexity = {}
+        # Entry positions sorted by timestamp, for date ranges; re-sorted
+        # lazily after new entries arrive
+        self.timestamps = []
+        self.by_time = []
+        self.time_sorted = True
+        self.lowered_queries = []
+
+    def add(self, batch):
+        for entry in batch:
+            position = len(self.entries)
+            self.entries.append(entry)
+            self.lowered_queries.append(entry.query.lower())
+            self.by_model.setdefault(entry.model, []).append(position)
+            self.by_complexity.setdefault(
+                entry.complexity, []
+            ).append(position)
+            self.by_time.append(position)
+        self.time_sorted = False
+
+    def sort_by_time(self):
+        if self.time_sorted:
+            return
+        self.by_time.sort(key=lambda p: self.entries[p].timestamp)
+        self.timestamps = [self.entries[p].timestamp for p in self.by_time]
+        self.time_sorted = True
+
+
+class CacheIndex:
+    # In-memory index over query_cache.json for paging and filtering
+    # without holding the responses. Built by a background thread, so
+    # callers can page through what has loaded so far; rebuilt whenever
+    # the file's mtime or size changes. A rebuild goes into a new index
+    # that replaces the current one once complete, so the cache keeps
+    # listing while the file is rewritten under it (Cache.set rewrites it
+    # on every query). Changes made during a build are picked up by the
+    # first refresh after it.
+
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file or os.path.join(
+            "data", "cache", "query_cache.json"
+        )
+        self.index = _IndexedEntries()
+        self.signature = None
+        self.loading = False
+        self.error = None
+        self._lock = threading.Lock()
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.cache_file)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime, stat.st_size)
+
+    def refresh(self):
+        signature = self._signature()
+        with self._lock:
+            if signature == self.signature or self.loading:
+                return
+            self.signature = signature
+            if signature is None:
+                self.index = _IndexedEntries()
+                self.error = None
+                return
+            building = _IndexedEntries()
+            # Nothing to show yet: list the first build as it loads
+            if not self.index.entries:
+                self.index = building
+            self.loading = True
+
+        threading.Thread(
+            target=self._load,
+            args=(building,),
+            daemon=True
+        ).start()
+
+    def _load(self, building):
+        batch = []
+        try:
+            for query, record, offset, length in iter_json_object(
+                    self.cache_file):
+                batch.append(CacheIndexEntry(
+                    query=query,
+                    model=record.get("model", "unknown"),
+                    complexity=record.get("complexity", "unknown"),
+                    timestamp=record.get("timestamp", 0),
+                    response_length=record.get(
+                        "response_length",
+                        len(record.get("response", ""))
+                    ),
+                    offset=offset,
+                    length=length
+                ))
+                if len(batch) >= 5000:
+                    with self._lock:
+                        building.add(batch)
+                    batch = []
+            with self._lock:
+                building.add(batch)
+                self.index = building
+                self.error = None
+        except Exception as e:
+            # Keep listing the last complete index. A file rewritten while
+            # it was read is no error: the next refresh reads it again
+            with self._lock:
+                if self._signature() == self.signature:
+                    self.error = str(e)
+        finally:
+            with self._lock:
+                self.loading = False
+
+    def status(self):
+        with self._lock:
+            return {
+                "entries": len(self.index.entries),
+                "loading": self.loading,
+                "error": self.error
+            }
+
+    def models(self):
+        with self._lock:
+            return sorted(self.index.by_model)
+
+    def complexities(self):
+        with self._lock:
+            return sorted(self.index.by_complexity)
+
+    def search(self, text=None, model=None, complexity=None,
+               since=None, until=None, page=0, page_size=50):
+        # Newest first; returns (entries on this page, total matches)
+        with self._lock:
+            index = self.index
+            index.sort_by_time()
+            low = 0
+            high = len(index.timestamps)
+            if since is not None:
+                low = bisect.bisect_left(index.timestamps, since)
+            if until is not None:
+                high = bisect.bisect_right(index.timestamps, until)
+            positions = index.by_time[low:high]
+            positions.reverse()
+
+            for key, lookup in ((model, index.by_model),
+                                (complexity, index.by_complexity)):
+                if key is not None:
+                    allowed = set(lookup.get(key, ()))
+                    positions = [p for p in positions if p in allowed]
+
+            if text:
+                text = text.lower()
+                positions = [
+                    p for p in positions if text in index.lowered_queries[p]
+                ]
+
+            start = page * page_size
+            page_entries = [
+                index.entries[p] for p in positions[start:start + page_size]
+            ]
+            return page_entries, len(positions)
+
+    def load_record(self, entry):
+        # The file may have been rewritten since entry was indexed
+        with open(self.cache_file, 'rb') as f:
+            f.seek(entry.offset)
+            data = f.read(entry.length)
+        try:
+            record = json.loads(data.decode("utf-8"))
+        except ValueError:
+            record = None
+        if (
+                not isinstance(record, dict)
+                or record.get("query", entry.query) != entry.query
+        ):
+            raise ValueError(
+                "The cache file changed since this entry was indexed; "
+                "it will show once re-indexing finishes"
+            )
+        return record
@@ -0,0 +1,290 @@
+import argparse
+import atexit
+import cProfile
+import functools
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from config import Config
+
+
+def _frame_label(code):
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(
+        ";", ","
+    )
+
+
+class RequestProfiler:
+    # Profiles whole requests through the router. Each request runs under
+    # its own cProfile (every call, exact counts) while a sampler thread
+    # takes the stack of every thread in a request each PROFILE_SAMPLE_
+    # INTERVAL seconds, for flamegraphs that include time spent waiting on
+    # models. Every PROFILE_EVERY requests the window is written to
+    # PROFILE_DIR as <name>.pstats and <name>.collapsed, one
+    # "frame;frame;frame count" line per stack (flamegraph.pl, speedscope).
+    #
+    # Nothing here is touched unless profiling is enabled: RuleRouter only
+    # wraps its entry points when PROFILE_ENABLED is set.
+
+    def __init__(self, output_dir=None, every=None, sample_interval=None):
+        config = Config()
+        self.output_dir = output_dir or config.PROFILE_DIR
+        self.every = every or config.PROFILE_EVERY
+        self.sample_interval = (
+            sample_interval or config.PROFILE_SAMPLE_INTERVAL
+        )
+
+        self.stats = None
+        self.stacks = Counter()
+        self.requests = 0
+        # Requests another thread's cProfile kept from being traced
+        # (one profiler at a time on Python 3.12+); they are still sampled
+        self.untraced = 0
+        self.written = []
+        # Thread id -> frame the request entered the router in
+        self.active = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._busy = threading.Event()
+        self._sampler = None
+
+    def wrap(self, fn):
+        @functools.wraps(fn)
+        def profiled(*args, **kwargs):
+            with self.request():
+                return fn(*args, **kwargs)
+        return profiled
+
+    def wrap_stream(self, fn):
+        # Each resume of the stream is profiled on its own, on the thread
+        # that resumes it, so what the consumer does between chunks (socket
+        # writes) isn't request time. The request is counted once, when
+        # the stream is exhausted or closed.
+        @functools.wraps(fn)
+        def profiled(*args, **kwargs):
+            stream = fn(*args, **kwargs)
+            traced = True
+            nested = False
+            try:
+                while True:
+                    with self.request(counted=False) as step:
+                        try:
+                            item = next(stream)
+                        except StopIteration:
+                            break
+                    traced = traced and step.profile is not False
+                    nested = nested or step.profile is None
+                    yield item
+            finally:
+                with self.request(counted=False) as step:
+                    stream.close()
+                # Inside another request the stream is part of that one
+                if not nested and step.profile is not None:
+                    self._count(traced and step.profile is not False)
+        return profiled
+
+    def request(self, counted=True):
+        return _ProfiledRequest(self, counted)
+
+    def _begin(self, frame):
+        # Nested entry points (the scheduler calling the router) belong
+        # to the request that is already open on this thread
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        if depth:
+            return None
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            profile = None
+        with self._lock:
+            self.active[threading.get_ident()] = frame
+            self._busy.set()
+            if self._sampler is None:
+                self._sampler = threading.Thread(
+                    target=self._sample,
+                    name="profiler-sampler",
+                    daemon=True
+                )
+                self._sampler.start()
+        return profile or False
+
+    def _end(self, profile, counted=True):
+        self._local.depth -= 1
+        if profile is None:
+            return
+        if profile:
+            profile.disable()
+
+        with self._lock:
+            del self.active[threading.get_ident()]
+            if not self.active:
+                self._busy.clear()
+            if profile:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+            if counted:
+                self._count_locked(bool(profile))
+
+    def _count(self, traced):
+        with self._lock:
+            self._count_locked(traced)
+
+    def _count_locked(self, traced):
+        self.requests += 1
+        if not traced:
+            self.untraced += 1
+        if self.requests >= self.every:
+            self._write()
+
+    def _sample(self):
+        while True:
+            self._busy.wait()
+            time.sleep(self.sample_interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, entry in self.active.items():
+                    frame = frames.get(thread_id)
+                    stack = []
+                    while frame is not None and frame is not entry:
+                        stack.append(_frame_label(frame.f_code))
+                        frame = frame.f_back
+                    if frame is None:
+                        # Between entering the router and the request
+                        # being registered
+                        continue
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def flush(self):
+        """Write out the current window, even if it is not full."""
+        with self._lock:
+            if self.requests:
+                self._write()
+
+    def _write(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = os.path.join(
+            self.output_dir,
+            f"profile_{datetime.now():%Y%m%d_%H%M%S}_"
+            f"{len(self.written) + 1:04d}_{self.requests}req"
+        )
+        if self.stats is not None:
+            self.stats.dump_stats(name + ".pstats")
+        with open(name + ".collapsed", 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        untraced = (
+            f" ({self.untraced} sampled only)" if self.untraced else ""
+        )
+        print(f"Profile of {self.requests} requests{untraced} saved to: "
+              f"{name}.*")
+
+        self.written.append(name)
+        self.stats = None
+        self.stacks = Counter()
+        self.requests = 0
+        self.untraced = 0
+
+
+class _ProfiledRequest:
+    # counted=False profiles one step of a request without counting it
+    def __init__(self, profiler, counted=True):
+        self.profiler = profiler
+        self.counted = counted
+        self.profile = None
+
+    def __enter__(self):
+        # The caller's frame is where the stack samples start
+        self.profile = self.profiler._begin(sys._getframe(1))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler._end(self.profile, self.counted)
+        return False
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler():
+    # One profiler per process, shared by every router in it
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = RequestProfiler()
+            atexit.register(_profiler.flush)
+        return _profiler
+
+
+def _function_times(path):
+    stats = pstats.Stats(path)
+    total = stats.total_tt or 1.0
+    functions = {}
+    for (filename, line, name), entry in stats.stats.items():
+        _, calls, tottime, _, _ = entry
+        label = f"{name} ({os.path.basename(filename)}:{line})"
+        functions[label] = {
+            "calls": calls,
+            "per_call": tottime / calls if calls else 0.0,
+            "share": tottime / total
+        }
+    return functions, stats.total_tt
+
+
+def diff_profiles(before_path, after_path, top=20):
+    """Rows of (function, before, after) for the functions whose share of
+    the profile's own time changed most. Shares and time per call don't
+    depend on how many requests each profile covers."""
+    before, _ = _function_times(before_path)
+    after, _ = _function_times(after_path)
+    empty = {"calls": 0, "per_call": 0.0, "share": 0.0}
+    rows = [
+        (label, before.get(label, empty), after.get(label, empty))
+        for label in set(before) | set(after)
+    ]
+    rows.sort(key=lambda row: abs(row[2]["share"] - row[1]["share"]),
+              reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare two router profiles (.pstats files)"
+    )
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    for path in (args.before, args.after):
+        if not os.path.exists(path):
+            print(f"No profile at {path}")
+            return
+
+    _, before_total = _function_times(args.before)
+    _, after_total = _function_times(args.after)
+    print(f"Profiled time: {before_total:.3f}s -> {after_total:.3f}s")
+    print(f"{'share':>15}  {'per call (ms)':>19}  {'calls':>15}  function")
+    for label, before, after in diff_profiles(
+            args.before, args.after, args.top):
+        print(
+            f"{before['share']:6.1%} -> {after['share']:6.1%}  "
+            f"{before['per_call'] * 1000:8.3f} -> "
+            f"{after['per_call'] * 1000:8.3f}  "
+            f"{before['calls']:6d} -> {after['calls']:6d}  {label}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,262 @@
-from router.rules import classify_query
+import time
+from typing import Optional
+from router.rules import classify_query, classify_in_session
 from router.cache import Cache
-from models.gemini_models import GeminiModels
-from models.mock_model import MockModel
+from router.session import Session, extractive_summary
+from router.profiling import get_profiler
+from router.tuner import RoutingTuner, load_thresholds
+from router.usage import RequestUsage, UsageTracker
+from router.validation import ResponseValidator
+from models.registry import ModelRegistry
 from models.router_model import RouterModel
+from models.base import CHARS_PER_TOKEN
 from config import Config
 
 
 class RuleRouter:
+    UPGRADE_MAP = {
+        "simple": "medium",
+        "medium": "advanced"
+    }
 
-    def __init__(self):
+    def __init__(self, model_provider=None, cache=None, tuning=True):
+        # tuning=False keeps this router's traffic away from the tuner
+        # (evaluations, benchmarks)
         self.config = Config()
-        self.cache = Cache()
+        # Routers for different providers can share one Cache so they
+        # don't overwrite each other's cache file
+        self.cache = cache or Cache()
 
-        # Select model provider based on config
-        if self.config.MODEL_PROVIDER == "gemini":
-            self.model = GeminiModels()
-        elif self.config.MODEL_PROVIDER == "mock":
-            self.model = MockModel()
+        # Select model provider based on config; each tier maps to a pool
+        # of backends and the registry picks one per request
+        self.model_provider = model_provider or self.config.MODEL_PROVIDER
+        if self.model_provider in self.config.MODEL_POOLS:
+            self.model = ModelRegistry(
+                self.config.MODEL_POOLS[self.model_provider]
+            )
         else:
             raise ValueError(
                 "Unknown model provider: ",
-                self.config.MODEL_PROVIDER
+                self.model_provider
+            )
+
+        self.validator = ResponseValidator(self.config)
+        self.usage = UsageTracker()
+
+        # Saved thresholds apply even with the tuner off, so ones fitted
+        # offline (python -m router.tuner --apply) take effect
+        load_thresholds()
+        self.tuner = None
+        if self.config.TUNER_ENABLED and tuning and self._live_models():
+            self.tuner = RoutingTuner()
+
+        if self.config.PROFILE_ENABLED:
+            profiler = get_profiler()
+            self.route_query_and_return_response = profiler.wrap(
+                self.route_query_and_return_response
+            )
+            self.route_query_stream = profiler.wrap_stream(
+                self.route_query_stream
             )
 
-    def route_query_and_return_response(self, query, use_cache=True):
-        cached_result = self._check_cache(query, use_cache)
+    def route_query_and_return_response(self, query, use_cache=True,
+                                        model_level=None, session=None,
+                                        complexity=None, record_turn=True):
+        # model_level starts the call on another tier than the classified
+        # one (the scheduler downgrades under overload); fallback still
+        # upgrades from there, but not back up to the classified tier a
+        # downgrade came from: if that tier's answer is invalid it is
+        # returned as is. complexity is the classification when the caller
+        # has already made it. With a session the model is sent the query
+        # in the conversation's context, a follow-up's answer is cached
+        # under that context and the turn is added to the session, unless
+        # record_turn is False and the caller adds it with add_turn (the
+        # session is then only read here). Usage gets one entry per
+        # request, whatever it took to answer.
+        lookup_start = time.perf_counter()
+        key = self.cache_key(query, session)
+        cached_result = self._check_cache(key, use_cache)
         if cached_result:
+            self._record_request(
+                cached_result["complexity"],
+                True,
+                lookup_start
+            )
+            cached_result["query"] = query
+            if record_turn:
+                self.add_turn(session, cached_result)
             return cached_result
 
-        complexity = classify_query(query)
-        model_level = complexity
+        complexity = complexity or self.classify(query, session)
+        model_level = model_level or complexity
+        fallback_below = None
+        if self._is_below(model_level, complexity):
+            fallback_below = complexity
+        prompt = session.prompt_for(query) if session else query
         # send the model level based on complexity and return the model used
         # in case of fallback
-        response, model = self._get_response_with_fallback(
-            query,
-            model_level,
-            complexity
+        start = time.perf_counter()
+        calls = RequestUsage()
+        try:
+            response, model = self._get_response_with_fallback(
+                prompt,
+                model_level,
+                fallback_below,
+                calls
+            )
+        except Exception:
+            # Every tier failed: a stale cached answer beats an error
+            stale_result = self._check_stale_cache(key, use_cache)
+            if stale_result:
+                self._record_request(
+                    stale_result["complexity"],
+                    True,
+                    lookup_start,
+                    calls
+                )
+                stale_result["query"] = query
+                if record_turn:
+                    self.add_turn(session, stale_result)
+                return stale_result
+            self._record_request(complexity, False, lookup_start, calls)
+            raise
+        self._record_request(
+            self.model.level_of(model) or complexity,
+            False,
+            lookup_start,
+            calls
         )
 
+        # The tuner learns from standalone queries only, and from the tier
+        # the call started on
+        if prompt == query:
+            self._observe(
+                query,
+                model_level,
+                model,
+                time.perf_counter() - start,
+                response
+            )
+
         self._cache_response(
-            query,
+            key,
             response,
             model,
             complexity,
             use_cache
         )
 
-        return {
+        result = {
             "query": query,
             "response": response,
             "complexity": complexity,
             "model_name": model,
             "cached": False
         }
+        if record_turn:
+            self.add_turn(session, result)
+        return result
+
+    def _live_models(self):
+        # Mock and replayed answers say nothing about how the real models
+        # would have done, so they must not tune the classifier
+        if self.model.cassette_mode == "replay":
+            return False
+        return not any(
+            backend.provider == "mock"
+            for pool in self.model.pools.values()
+            for backend in pool
+        )
+
+    def classify(self, query, session=None):
+        if session is None:
+            return classify_query(query)
+        return classify_in_session(query, session.features())
+
+    def cache_key(self, query, session=None):
+        return session.cache_key(query) if session else query
+
+    def new_session(self, session_id=None):
+        summarizer = None
+        if self.config.SESSION_SUMMARIZER == "model":
+            summarizer = self._summarize_with_model
+        return Session(session_id, summarizer)
+
+    def _summarize_with_model(self, summary, turns, max_tokens):
+        # The simple tier rewrites the summary with the folded turns; the
+        # extractive summary stands in when it can't
+        transcript = "\n".join(turn.text() for turn in turns)
+        prompt = (
+            f"Update this conversation summary in at most {max_tokens} "
+            "tokens, keeping names, facts and decisions.\n\n"
+            f"Summary so far:\n{summary or '(empty)'}\n\n"
+            f"New turns:\n{transcript}\n\nUpdated summary:"
+        )
+        try:
+            text, _ = self.generate_on_tier(prompt, "simple", "Summary")
+        except Exception as e:
+            print(f"Session summary failed, using extractive: {e}")
+            text = None
+        if not self._is_response_valid(text):
+            return extractive_summary(summary, turns, max_tokens)
+        return text.strip()[:max_tokens * CHARS_PER_TOKEN]
+
+    def add_turn(self, session, result):
+        # A routed result as the session's next turn
+        if session is None:
+            return
+        tier = (
+            self.model.level_of(result["model_name"])
+            or result["complexity"]
+        )
+        session.add_turn(result["query"], result["response"], tier)
+
+    def _record_request(self, tier, cached, start, calls=None,
+                        route_method=None):
+        calls = calls or RequestUsage()
+        self.usage.record(
+            tier,
+            route_method or self.config.ROUTE_METHOD,
+            cached,
+            time.perf_counter() - start,
+            calls.input_tokens,
+            calls.output_tokens,
+            calls.cost
+        )
+
+    def generate_on_tier(self, prompt, model_level, route_method="Direct"):
+        # One call straight to a tier, without the cache, routing or
+        # fallback: (response, model name)
+        start = time.perf_counter()
+        calls = RequestUsage()
+        try:
+            return self.model.generate_with_backend(
+                prompt,
+                model_level,
+                listener=calls
+            )
+        finally:
+            self._record_request(
+                model_level,
+                False,
+                start,
+                calls,
+                route_method
+            )
+
+    def _observe(self, query: str, complexity: str, model_name: str,
+                 latency: float, response: str):
+        if self.tuner is None:
+            return
+
+        final_level = self.model.level_of(model_name) or complexity
+        self.tuner.observe(
+            query,
+            complexity,
+            final_level,
+            latency,
+            len(response or "")
+        )
 
     def _check_cache(self, query: str, use_cache: bool):
         if not use_cache or not self.cache.enabled:
@@ -70,6 +274,13 @@ class RuleRouter:
             }
         return None
 
+    def _check_stale_cache(self, query: str, use_cache: bool):
+        stale_result = self._check_cache(query, use_cache)
+        if stale_result:
+            print("All tiers unavailable, serving cached answer")
+            stale_result["stale"] = True
+        return stale_result
+
     def _cache_response(self, query: str, response: str, model_name: str,
                         complexity: str, use_cache: bool):
         if use_cache and self.cache.enabled:
@@ -80,62 +291,203 @@ class RuleRouter:
                 complexity=complexity
             )
 
-    def _get_response_with_fallback(self, query: str, model_level: str,
-                                    complexity: str, retries: int = 0):
-        response = self.model.generate(query, model_level)
+    def route_query_stream(self, query, use_cache=True, session=None):
+        # Yields {"event": "start" | "chunk" | "end", ...} dicts. The text
+        # comes from the same fallback chain as the non-streamed route
+        # (see _fallback_chain); if every tier fails before any of it went
+        # out, a stale cached answer is streamed instead.
+        lookup_start = time.perf_counter()
+        key = self.cache_key(query, session)
+        cached_result = self._check_cache(key, use_cache)
+        if cached_result:
+            self._record_request(
+                cached_result["complexity"],
+                True,
+                lookup_start
+            )
+            cached_result["query"] = query
+            self.add_turn(session, cached_result)
+            yield {
+                "event": "start",
+                "complexity": cached_result["complexity"],
+                "cached": True
+            }
+            yield {"event": "chunk", "text": cached_result["response"]}
+            yield {
+                "event": "end",
+                "model_name": cached_result["model_name"],
+                "cached": True
+            }
+            return
 
-        # Check if response is valid
-        if self._is_response_valid(response):
-            # If valid, return response and model name
-            return response, self._get_model_name(model_level)
+        complexity = self.classify(query, session)
+        prompt = session.prompt_for(query) if session else query
+        yield {"event": "start", "complexity": complexity, "cached": False}
 
-        # If not valid, check if fallback is enabled and retries are left
-        elif (
-            self.config.FALLBACK_ENABLED
-            and retries < self.config.MAX_RETRIES
-        ):
-            return self._try_fallback(query, model_level, complexity, retries)
+        start = time.perf_counter()
+        calls = RequestUsage()
+        chain = self._fallback_chain(prompt, complexity, on_call=calls,
+                                     stream=True)
+        # One usage entry for the whole request, however many tiers it took
+        served_tier, from_cache = complexity, False
+        sent = False
+        try:
+            while True:
+                try:
+                    text = next(chain)
+                except StopIteration as done:
+                    response, model = done.value
+                    break
+                sent = True
+                yield {"event": "chunk", "text": text}
+            served_tier = self.model.level_of(model) or complexity
+        except Exception:
+            stale_result = (
+                None if sent else self._check_stale_cache(key, use_cache)
+            )
+            if stale_result is None:
+                raise
+            served_tier, from_cache = stale_result["complexity"], True
+            stale_result["query"] = query
+            self.add_turn(session, stale_result)
+            yield {"event": "chunk", "text": stale_result["response"]}
+            yield {
+                "event": "end",
+                "model_name": stale_result["model_name"],
+                "cached": True,
+                "stale": True
+            }
+            return
+        finally:
+            chain.close()
+            self._record_request(served_tier, from_cache, lookup_start, calls)
 
-        # If no fallback, return the (invalid) response and model name
-        return response, self._get_model_name(model_level)
+        if prompt == query:
+            self._observe(
+                query,
+                complexity,
+                model,
+                time.perf_counter() - start,
+                response
+            )
+        self._cache_response(key, response, model, complexity, use_cache)
+        self.add_turn(session, {
+            "query": query,
+            "response": response,
+            "complexity": complexity,
+            "model_name": model
+        })
+        yield {"event": "end", "model_name": model, "cached": False}
 
-    def _is_response_valid(self, response: str):
-        if not response or len(response.strip()) < 5:
-            return False
+    def _is_below(self, level: str, other: str):
+        while level in self.UPGRADE_MAP:
+            level = self.UPGRADE_MAP[level]
+            if level == other:
+                return True
+        return False
 
-        # Check if response starts with any invalid phrases
-        for phrase in self.config.INVALID_PHRASES:
-            if response.startswith(phrase):
-                return False
+    def _next_level(self, model_level: str,
+                    fallback_below: Optional[str] = None):
+        # The tier fallback upgrades to, or None
+        next_level = self.UPGRADE_MAP.get(model_level)
+        if next_level == fallback_below:
+            return None
+        return next_level
 
-        return True
+    def _get_response_with_fallback(self, prompt: str, model_level: str,
+                                    fallback_below: Optional[str] = None,
+                                    on_call=None):
+        # Not streamed, the chain yields nothing: the answer is what it
+        # returns
+        chain = self._fallback_chain(prompt, model_level, fallback_below,
+                                     on_call)
+        try:
+            next(chain)
+        except StopIteration as done:
+            return done.value
 
-    def _try_fallback(self, query: str, current_level: str,
-                      complexity: str, retries: int):
-        upgrade_map = {
-            "simple": "medium",
-            "medium": "advanced"
-        }
+    def _fallback_chain(self, prompt: str, model_level: str,
+                        fallback_below: Optional[str] = None, on_call=None,
+                        stream: bool = False):
+        # The fallback behind both routes. Tries model_level, then each
+        # tier above it (never up to fallback_below): past a provider error
+        # or open breaker straight away, past an invalid answer while
+        # MAX_RETRIES allows. With no tier left an error is raised and an
+        # invalid answer returned as the best there is. Returns
+        # (response, model name). With stream the text is yielded as it
+        # arrives, held back until the validator has passed the opening
+        # (after STREAM_VALIDATE_CHARS) so an invalid one can still fall
+        # back unseen; a refusal is caught as soon as it appears.
+        retries = 0
+        while True:
+            next_level = self._next_level(model_level, fallback_below)
+            can_upgrade = self.config.FALLBACK_ENABLED and next_level
+            can_retry = can_upgrade and retries < self.config.MAX_RETRIES
+            checker = self.validator.stream() if stream else None
+            parts = []
+            sent = False
+            invalid = False
+            model = None
+            chunks = None
+            try:
+                if stream:
+                    chunks = self.model.generate_stream_with_backend(
+                        prompt,
+                        model_level,
+                        listener=on_call
+                    )
+                else:
+                    # The whole answer as one chunk, judged once complete
+                    chunks = iter([self.model.generate_with_backend(
+                        prompt,
+                        model_level,
+                        listener=on_call
+                    )])
+                for chunk, model in chunks:
+                    parts.append(chunk)
+                    if sent:
+                        yield chunk
+                        continue
 
-        next_level = upgrade_map.get(current_level)
-        if not next_level:
-            raise Exception(f"No fallback available for {current_level} model")
+                    opening_valid = checker.feed(chunk) if stream else None
+                    if opening_valid is None:
+                        continue
+                    if not opening_valid and can_retry:
+                        invalid = True
+                        break
+                    sent = True
+                    yield "".join(parts)
+            except Exception as e:
+                # Once text has gone out there is no clean way to switch
+                # tiers mid-answer
+                if sent or not can_upgrade:
+                    raise
+                print(f"{model_level} model unavailable: {e}")
+                invalid = True
+            finally:
+                if stream and chunks is not None:
+                    chunks.close()
 
-        print(f"Upgrading from {current_level} to {next_level} model...")
-        return self._get_response_with_fallback(
-            query,
-            next_level,
-            complexity,
-            retries + 1
-        )
+            response = "".join(parts)
+            if not invalid and not sent:
+                invalid = can_retry and not self._is_response_valid(response)
+                if not invalid and stream and response:
+                    yield response
+            if not invalid:
+                return response, model
+
+            print(f"Upgrading from {model_level} to {next_level} model...")
+            model_level = next_level
+            retries += 1
+
+    def _is_response_valid(self, response: str):
+        return self.validator.is_valid(response)
 
-    def _get_model_name(self, model_level: str):
-        model_names = {
-            "simple": self.config.SIMPLE_MODEL,
-            "medium": self.config.MEDIUM_MODEL,
-            "advanced": self.config.ADVANCED_MODEL
+    def health(self):
+        return {
+            "breakers": self.model.health(),
+            "backends": self.model.stats()
         }
-        return model_names.get(model_level, self.config.SIMPLE_MODEL)
 
 
 class LLMِsRouter:
@@ -155,8 +507,8 @@ if __name__ == "__main__":
     print(result)
 
 
-router = RuleRouter()
-if Config().ROUTE_METHOD == "Rule-Based":
-    router = RuleRouter()
-elif Config().ROUTE_METHOD == "LLM-as-a-Router":
+# Built once per process; importers share this instance
+if Config().ROUTE_METHOD == "LLM-as-a-Router":
     router = LLMِsRouter()
+else:
+    router = RuleRouter()
@@ -1,19 +1,98 @@
+import contextlib
 import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List
 from config import Config
 
 
+@dataclass
+class RoutingThresholds:
+    max_simple_length: int
+    max_medium_length: int
+    # A query counts as complex when the weights of the complex keywords
+    # it contains add up to complex_threshold or more
+    complex_keyword_weights: Dict[str, float] = field(default_factory=dict)
+    simple_keywords: List[str] = field(default_factory=list)
+    complex_threshold: float = 1.0
+
+    @classmethod
+    def from_config(cls, config=None):
+        config = config or Config()
+        return cls(
+            max_simple_length=config.MAX_SIMPLE_LENGTH,
+            max_medium_length=config.MAX_MEDIUM_LENGTH,
+            complex_keyword_weights={
+                keyword: 1.0 for keyword in config.COMPLEX_KEYWORDS
+            },
+            simple_keywords=list(config.SIMPLE_KEYWORDS)
+        )
+
+    def to_dict(self):
+        return {
+            "max_simple_length": self.max_simple_length,
+            "max_medium_length": self.max_medium_length,
+            "complex_keyword_weights": self.complex_keyword_weights,
+            "simple_keywords": self.simple_keywords,
+            "complex_threshold": self.complex_threshold
+        }
+
+
+_thresholds = None
+_thresholds_lock = threading.Lock()
+# Open hold_thresholds() blocks, and the update waiting for them to end
+_holds = 0
+_pending = None
+
+
+def get_thresholds():
+    global _thresholds
+    with _thresholds_lock:
+        if _thresholds is None:
+            _thresholds = RoutingThresholds.from_config()
+        return _thresholds
+
+
+def set_thresholds(thresholds):
+    # Swapped as a whole so a classification never sees half an update
+    global _thresholds, _pending
+    with _thresholds_lock:
+        if _holds:
+            _pending = thresholds
+        else:
+            _thresholds = thresholds
+
+
+@contextlib.contextmanager
+def hold_thresholds():
+    """Keep the classifier fixed for the duration of the block (an
+    evaluation or benchmark run); updates made meanwhile, such as a tuner
+    refit, take effect when the last hold ends."""
+    global _thresholds, _holds, _pending
+    get_thresholds()
+    with _thresholds_lock:
+        _holds += 1
+    try:
+        yield
+    finally:
+        with _thresholds_lock:
+            _holds -= 1
+            if not _holds and _pending is not None:
+                _thresholds, _pending = _pending, None
+
+
 def classify_query(query):
-    config = Config()
+    thresholds = get_thresholds()
     query_length = len(query)
 
-    if query_length <= config.MAX_SIMPLE_LENGTH:
+    if query_length <= thresholds.max_simple_length:
         if is_simple_factual(query):
             return "simple"
 
-    if query_length <= config.MAX_MEDIUM_LENGTH:
-        if has_complex_keywords(query):
+    if query_length <= thresholds.max_medium_length:
+        if has_complex_keywords(query, thresholds):
             return "advanced"
-        elif has_simple_keywords(query):
+        elif has_simple_keywords(query, thresholds):
             return "medium"
         else:
             return "medium"
@@ -21,18 +100,92 @@ def classify_query(query):
     return "advanced"
 
 
+def extract_features(query):
+    thresholds = get_thresholds()
+    query_lower = query.lower()
+    return {
+        "length": len(query),
+        "simple_factual": is_simple_factual(query),
+        "complex_keywords": [
+            keyword for keyword in thresholds.complex_keyword_weights
+            if keyword in query_lower
+        ]
+    }
+
+
 def is_simple_factual(query):
     simple_pattern = r'^(what|when|where|who|how|is|are|can|do|does)\s+'
     return re.match(simple_pattern, query.lower()) is not None
 
 
-def has_complex_keywords(query):
-    config = Config()
+def complex_keyword_score(query, thresholds=None):
+    thresholds = thresholds or get_thresholds()
     query_lower = query.lower()
-    return any(keyword in query_lower for keyword in config.COMPLEX_KEYWORDS)
+    return sum(
+        weight
+        for keyword, weight in thresholds.complex_keyword_weights.items()
+        if keyword in query_lower
+    )
 
 
-def has_simple_keywords(query):
-    config = Config()
+def has_complex_keywords(query, thresholds=None):
+    thresholds = thresholds or get_thresholds()
+    return (
+        complex_keyword_score(query, thresholds)
+        >= thresholds.complex_threshold
+    )
+
+
+def has_simple_keywords(query, thresholds=None):
+    thresholds = thresholds or get_thresholds()
     query_lower = query.lower()
-    return any(keyword in query_lower for keyword in config.SIMPLE_KEYWORDS)
+    return any(
+        keyword in query_lower for keyword in thresholds.simple_keywords
+    )
+
+
+FOLLOW_UP_PATTERN = re.compile(
+    r"^(and|but|so|also|then|why|how come|what about|how about|"
+    r"tell me more|more|explain|elaborate|expand|continue|go on|"
+    r"it|its|that|this|those|these|they|them|he|she)\b",
+    re.IGNORECASE
+)
+REFERENCE_PATTERN = re.compile(
+    r"\b(it|that|this|those|these|they|them|above|previous|earlier|"
+    r"you said|your answer)\b",
+    re.IGNORECASE
+)
+
+
+def is_follow_up(query, thresholds=None):
+    # Short turns that lean on the conversation: "why?", "and in Java?",
+    # "explain that in more detail"
+    thresholds = thresholds or get_thresholds()
+    query = query.strip()
+    if len(query) > thresholds.max_medium_length:
+        return False
+    return (
+        FOLLOW_UP_PATTERN.match(query) is not None
+        or (
+            len(query) <= thresholds.max_simple_length
+            and REFERENCE_PATTERN.search(query) is not None
+        )
+    )
+
+
+def classify_in_session(query, features=None):
+    # The latest turn is classified on its own; a follow-up is then kept
+    # at least at the tier that answered the previous turn, since
+    # "why?" after an advanced answer is not a simple question
+    complexity = classify_query(query)
+    last_tier = (features or {}).get("last_tier")
+    if not last_tier or not is_follow_up(query):
+        return complexity
+
+    levels = Config().MODEL_LEVELS
+    if (
+        last_tier in levels
+        and levels.index(last_tier) > levels.index(complexity)
+    ):
+        return last_tier
+    return complexity
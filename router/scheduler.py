@@ -0,0 +1,397 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from config import Config
+
+# Highest priority first
+PRIORITIES = ["interactive", "batch", "prefetch"]
+
+
+class SchedulerOverloaded(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+@dataclass
+class ScheduledRequest:
+    # run(level) does the work on the tier the request is finally served on
+    run: Callable[[str], Any]
+    tier: str
+    priority: str
+    deadline: Optional[float]
+    downgradable: bool
+    future: Future = field(default_factory=Future)
+    submitted: float = field(default_factory=time.monotonic)
+    downgraded_from: Optional[str] = None
+
+
+class PriorityStats:
+    def __init__(self, recent=1000):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.evicted = 0
+        self.downgraded = 0
+        self.retried = 0
+        self.waits = deque(maxlen=recent)
+
+    def to_dict(self):
+        waits = sorted(self.waits)
+
+        def wait_percentile(p):
+            if not waits:
+                return None
+            return waits[min(len(waits) - 1, int(len(waits) * p / 100))]
+
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "evicted": self.evicted,
+            "downgraded": self.downgraded,
+            "retried": self.retried,
+            "wait_p50": wait_percentile(50),
+            "wait_p95": wait_percentile(95)
+        }
+
+
+class TierQueue:
+    # One queue per priority class for a tier. Workers pick the next class
+    # by stride scheduling: each pick advances that class's pass by
+    # 1 / weight and the non-empty class with the lowest pass goes next,
+    # so busy classes share the tier's workers in proportion to weight.
+
+    def __init__(self, tier, workers, weights, service_time):
+        self.tier = tier
+        self.workers = workers
+        self.weights = weights
+        self.queues = {priority: deque() for priority in PRIORITIES}
+        self.passes = {priority: 0.0 for priority in PRIORITIES}
+        self.virtual_time = 0.0
+        self.running = 0
+        self.service_time = service_time
+
+    def __len__(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def push(self, request):
+        queue = self.queues[request.priority]
+        if not queue:
+            # A class that was idle doesn't get to bank credit
+            self.passes[request.priority] = max(
+                self.passes[request.priority],
+                self.virtual_time
+            )
+        queue.append(request)
+
+    def pop(self):
+        ready = [p for p in PRIORITIES if self.queues[p]]
+        if not ready:
+            return None
+        priority = min(ready, key=lambda p: self.passes[p])
+        self.virtual_time = self.passes[priority]
+        self.passes[priority] += 1 / self.weights[priority]
+        return self.queues[priority].popleft()
+
+    def ahead_of(self, priority):
+        # Requests that would usually be served before a new one
+        rank = PRIORITIES.index(priority)
+        return sum(len(self.queues[p]) for p in PRIORITIES[:rank + 1])
+
+    def expected_finish(self, priority):
+        # Rough seconds until a request queued now would be answered
+        waiting = self.ahead_of(priority) + max(
+            0,
+            self.running - self.workers + 1
+        )
+        return (waiting / self.workers + 1) * self.service_time
+
+
+class RequestScheduler:
+    # Sits between callers and a router. Each model tier gets its own
+    # worker pool and queue, so a flood of advanced calls can't hold up
+    # simple ones, and within a tier the priority classes share workers by
+    # weight. A request whose deadline its tier can't meet is moved to a
+    # cheaper tier that can (the router's fallback then stops short of the
+    # tier it was moved from); one whose deadline has passed by the time a
+    # worker reaches it is dropped.
+    DOWNGRADE_MAP = {
+        "advanced": "medium",
+        "medium": "simple"
+    }
+
+    def __init__(self, router):
+        config = Config()
+        self.router = router
+        self.weights = config.SCHEDULER_PRIORITY_WEIGHTS
+        self.default_deadlines = config.SCHEDULER_DEADLINES
+        self.max_queued = config.SCHEDULER_MAX_QUEUED
+        self.alpha = config.REGISTRY_EWMA_ALPHA
+
+        self.tiers = {
+            tier: TierQueue(
+                tier,
+                workers,
+                self.weights,
+                config.TUNER_LATENCY_PRIORS.get(tier, 1.0)
+            )
+            for tier, workers in config.SCHEDULER_TIER_WORKERS.items()
+        }
+        self.stats_by_priority = {p: PriorityStats() for p in PRIORITIES}
+        self.closing = False
+        self._lock = threading.Lock()
+        self._work_ready = {
+            tier: threading.Condition(self._lock) for tier in self.tiers
+        }
+
+        self.threads = []
+        for tier, tier_queue in self.tiers.items():
+            for i in range(tier_queue.workers):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(tier,),
+                    name=f"scheduler-{tier}-{i}",
+                    daemon=True
+                )
+                thread.start()
+                self.threads.append(thread)
+
+    def route(self, query, priority="interactive", deadline=None,
+              use_cache=True, session=None):
+        """Future for router.route_query_and_return_response(query).
+        Cache hits are answered straight away instead of queueing."""
+        key = self.router.cache_key(query, session)
+        if use_cache and self.router.cache.get(key) is not None:
+            future = Future()
+            try:
+                future.set_result(self.router.route_query_and_return_response(
+                    query,
+                    use_cache=use_cache,
+                    session=session
+                ))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        # Classified once: the tier it queues on is the one the router
+        # caps a downgrade's fallback at
+        complexity = self.router.classify(query, session)
+        return self.submit(
+            lambda level: self.router.route_query_and_return_response(
+                query,
+                use_cache=use_cache,
+                model_level=level,
+                session=session,
+                complexity=complexity
+            ),
+            complexity,
+            priority,
+            deadline
+        )
+
+    def submit(self, run, tier, priority="interactive", deadline=None,
+               downgradable=True):
+        """Queue run(level) on tier. deadline is in seconds from now and
+        defaults to the priority class's SCHEDULER_DEADLINES entry."""
+        if priority not in self.stats_by_priority:
+            raise ValueError(f"Unknown priority: {priority}")
+        if tier not in self.tiers:
+            raise ValueError(f"Unknown tier: {tier}")
+        if deadline is None:
+            deadline = self.default_deadlines.get(priority)
+
+        now = time.monotonic()
+        request = ScheduledRequest(
+            run=run,
+            tier=tier,
+            priority=priority,
+            deadline=now + deadline if deadline is not None else None,
+            downgradable=downgradable
+        )
+
+        with self._lock:
+            stats = self.stats_by_priority[priority]
+            stats.submitted += 1
+            if self.closing:
+                stats.rejected += 1
+                raise SchedulerOverloaded("Scheduler is shutting down")
+
+            if request.deadline is not None and downgradable:
+                self._maybe_downgrade(request, now)
+
+            tier_queue = self.tiers[request.tier]
+            evicted = None
+            if len(tier_queue) >= self.max_queued:
+                evicted = self._evict_below(tier_queue, priority)
+                if evicted is None:
+                    stats.rejected += 1
+                    raise SchedulerOverloaded(
+                        f"{request.tier} queue is full"
+                    )
+
+            tier_queue.push(request)
+            self._work_ready[request.tier].notify()
+            if request.downgraded_from is not None:
+                stats.downgraded += 1
+
+        # Futures are resolved outside the lock: their callbacks may
+        # submit again
+        if evicted is not None:
+            evicted.future.set_exception(SchedulerOverloaded(
+                f"Evicted from the {evicted.tier} queue by {priority} "
+                "traffic"
+            ))
+        return request.future
+
+    def _maybe_downgrade(self, request, now):
+        # Only when the request's own tier is expected to miss the
+        # deadline, and to the first cheaper tier expected to make it
+        budget = request.deadline - now
+        tier = request.tier
+        if self.tiers[tier].expected_finish(request.priority) <= budget:
+            return
+        while tier in self.DOWNGRADE_MAP:
+            tier = self.DOWNGRADE_MAP[tier]
+            if tier not in self.tiers:
+                return
+            if self.tiers[tier].expected_finish(request.priority) <= budget:
+                request.downgraded_from = request.tier
+                request.tier = tier
+                return
+
+    def _evict_below(self, tier_queue, priority):
+        # Make room by shedding the newest request of the lowest class
+        # that ranks below the incoming one
+        rank = PRIORITIES.index(priority)
+        for lower in reversed(PRIORITIES[rank + 1:]):
+            queue = tier_queue.queues[lower]
+            if queue:
+                self.stats_by_priority[lower].evicted += 1
+                return queue.pop()
+        return None
+
+    def _work(self, tier):
+        tier_queue = self.tiers[tier]
+        while True:
+            with self._lock:
+                request = tier_queue.pop()
+                while request is None:
+                    if self.closing:
+                        return
+                    self._work_ready[tier].wait()
+                    request = tier_queue.pop()
+
+                stats = self.stats_by_priority[request.priority]
+                now = time.monotonic()
+                expired = (
+                    request.deadline is not None and now > request.deadline
+                )
+                if expired:
+                    stats.dropped += 1
+                else:
+                    stats.waits.append(now - request.submitted)
+                    tier_queue.running += 1
+
+            if expired:
+                request.future.set_exception(DeadlineExceeded(
+                    f"Deadline passed after {now - request.submitted:.1f}s "
+                    f"in the {tier} queue"
+                ))
+                continue
+
+            # A retried request's future is already running
+            if (
+                not request.future.running()
+                and not request.future.set_running_or_notify_cancel()
+            ):
+                with self._lock:
+                    tier_queue.running -= 1
+                continue
+
+            start = time.monotonic()
+            error = None
+            try:
+                result = request.run(tier)
+            except Exception as e:
+                error = e
+            service_time = time.monotonic() - start
+
+            retried = error is not None and self._retry_undowngraded(request)
+            if not retried:
+                if error is not None:
+                    request.future.set_exception(error)
+                else:
+                    request.future.set_result(result)
+
+            with self._lock:
+                tier_queue.running -= 1
+                tier_queue.service_time += self.alpha * (
+                    service_time - tier_queue.service_time
+                )
+                if retried:
+                    stats.retried += 1
+                elif error is not None:
+                    stats.failed += 1
+                else:
+                    stats.completed += 1
+
+    def _retry_undowngraded(self, request):
+        # A downgraded request that failed on the cheaper tier (its
+        # fallback stops short of the tier it came from) gets another go
+        # on that tier's own workers, ahead of the queue limit since it was
+        # already admitted. Not once the scheduler is closing: that tier's
+        # workers may have finished.
+        with self._lock:
+            if request.downgraded_from is None or self.closing:
+                return False
+            request.tier = request.downgraded_from
+            request.downgraded_from = None
+            self.tiers[request.tier].push(request)
+            self._work_ready[request.tier].notify()
+            return True
+
+    def shutdown(self, timeout=None):
+        # Queued requests are still served; new ones are refused
+        with self._lock:
+            self.closing = True
+            for condition in self._work_ready.values():
+                condition.notify_all()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for thread in self.threads:
+            remaining = (
+                max(0.0, deadline - time.monotonic())
+                if deadline is not None else None
+            )
+            thread.join(remaining)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tiers": {
+                    tier: {
+                        "workers": tier_queue.workers,
+                        "running": tier_queue.running,
+                        "queued": {
+                            p: len(q) for p, q in tier_queue.queues.items()
+                        },
+                        "service_time_ewma": tier_queue.service_time
+                    }
+                    for tier, tier_queue in self.tiers.items()
+                },
+                "priorities": {
+                    priority: stats.to_dict()
+                    for priority, stats in self.stats_by_priority.items()
+                },
+                "closing": self.closing
+            }
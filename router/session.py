@@ -0,0 +1,258 @@
+import hashlib
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+
+from models.base import CHARS_PER_TOKEN
+from router.rules import is_follow_up
+from config import Config
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _clip(text, max_chars):
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 1].rstrip() + "…"
+
+
+def _first_sentence(text, max_chars):
+    match = re.match(r"(.+?[.!?])(\s|$)", " ".join(text.split()))
+    return _clip(match.group(1) if match else text, max_chars)
+
+
+def extractive_summary(summary, turns, max_tokens):
+    """Fold turns into summary by keeping the opening of each question
+    and answer; the oldest lines go first once over max_tokens."""
+    lines = summary.splitlines() if summary else []
+    for turn in turns:
+        lines.append(
+            f"- Q: {_first_sentence(turn.query, 120)} "
+            f"A: {_first_sentence(turn.response, 200)}"
+        )
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)[:max_tokens * CHARS_PER_TOKEN]
+
+
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+TURNS_HEADER = "Recent turns:\n"
+# Appended to a follow-up's cache key with the fingerprint of its context
+CONTEXT_KEY_MARKER = "\n[context "
+
+
+def is_context_key(key):
+    return CONTEXT_KEY_MARKER in key
+
+
+@dataclass
+class Turn:
+    query: str
+    response: str
+    tier: str
+    tokens: int
+
+    def text(self):
+        return f"User: {self.query}\nAssistant: {self.response}"
+
+
+class Session:
+    # Conversation state for one user: a running summary plus the most
+    # recent turns, kept under SESSION_CONTEXT_TOKENS. Each turn is
+    # stored clipped to SESSION_TURN_TOKENS, and once the total is over
+    # budget the oldest turns are folded into the summary, so the context
+    # sent with a turn stays bounded however long the conversation runs.
+
+    def __init__(self, session_id=None, summarizer=None):
+        config = Config()
+        self.id = session_id or uuid.uuid4().hex
+        self.context_tokens = config.SESSION_CONTEXT_TOKENS
+        self.summary_tokens = config.SESSION_SUMMARY_TOKENS
+        self.turn_chars = config.SESSION_TURN_TOKENS * CHARS_PER_TOKEN
+        self.levels = config.MODEL_LEVELS
+        # summarizer(summary, turns, max_tokens) -> new summary
+        self.summarizer = summarizer or extractive_summary
+
+        self.summary = ""
+        self.turns = deque()
+        # Turns taken out of turns whose summary is still being written;
+        # still part of the context until it is
+        self.folding = []
+        self.tokens = 0
+        self.turn_count = 0
+        self.last_tier = None
+        self.highest_tier = None
+        self.last_used = time.time()
+        self._context = None
+        self._lock = threading.Lock()
+        # One summary update at a time, outside _lock: the summarizer may
+        # be a model call
+        self._summary_lock = threading.Lock()
+
+    def add_turn(self, query, response, tier):
+        with self._lock:
+            turn = Turn(
+                query=_clip(query, self.turn_chars),
+                response=_clip(response or "", self.turn_chars),
+                tier=tier,
+                tokens=0
+            )
+            turn.tokens = estimate_tokens(turn.text())
+            self.turns.append(turn)
+            self.tokens += turn.tokens
+            self.turn_count += 1
+            self.last_tier = tier
+            if self.highest_tier is None or (
+                    self._rank(tier) > self._rank(self.highest_tier)):
+                self.highest_tier = tier
+            self.last_used = time.time()
+            folded = self._compact()
+            self._context = None
+        if folded:
+            self._summarize(folded)
+
+    def _rank(self, tier):
+        return self.levels.index(tier) if tier in self.levels else -1
+
+    def _compact(self):
+        # Take the oldest turns out until the rest fit next to a full-size
+        # summary (the newest turn is always kept); returns them to be
+        # folded into the summary
+        if self._total_tokens() <= self.context_tokens:
+            return []
+
+        room = (
+            self.context_tokens
+            - self.summary_tokens
+            - estimate_tokens(SUMMARY_HEADER + TURNS_HEADER)
+        )
+        folded = []
+        while len(self.turns) > 1 and self.tokens > room:
+            turn = self.turns.popleft()
+            self.tokens -= turn.tokens
+            folded.append(turn)
+        self.folding.extend(folded)
+        return folded
+
+    def _summarize(self, folded):
+        with self._summary_lock:
+            with self._lock:
+                summary = self.summary
+            summary = self.summarizer(summary, folded, self.summary_tokens)
+            with self._lock:
+                self.summary = summary
+                del self.folding[:len(folded)]
+                self._context = None
+
+    def _total_tokens(self):
+        # As rendered by context(), headers included
+        total = self.tokens
+        if self.summary:
+            total += estimate_tokens(SUMMARY_HEADER + self.summary)
+        if self.turns:
+            total += estimate_tokens(TURNS_HEADER)
+        return total
+
+    def context(self):
+        """The conversation so far as prompt text ("" before any turn)."""
+        with self._lock:
+            if self._context is None:
+                parts = []
+                if self.summary:
+                    parts.append(SUMMARY_HEADER + self.summary)
+                if self.turns:
+                    parts.append(TURNS_HEADER + "\n".join(
+                        turn.text()
+                        for turn in (*self.folding, *self.turns)
+                    ))
+                self._context = "\n\n".join(parts)
+            return self._context
+
+    def prompt_for(self, query):
+        context = self.context()
+        if not context:
+            return query
+        return (
+            f"{context}\n\n"
+            "Answer the user's latest message, using the conversation "
+            f"above where it is relevant.\nUser: {query}"
+        )
+
+    def fingerprint(self):
+        # Identifies the context the next turn would be answered in
+        context = self.context()
+        if not context:
+            return ""
+        return hashlib.sha1(context.encode("utf-8")).hexdigest()[:16]
+
+    def cache_key(self, query):
+        # Standalone questions share the plain query's cache entry at any
+        # point in the conversation; follow-ups ("why?", "and in Java?")
+        # are only reused in the exact same context
+        if not is_follow_up(query):
+            return query
+        fingerprint = self.fingerprint()
+        if not fingerprint:
+            return query
+        return f"{query}{CONTEXT_KEY_MARKER}{fingerprint}]"
+
+    def features(self):
+        with self._lock:
+            return {
+                "turns": self.turn_count,
+                "last_tier": self.last_tier,
+                "highest_tier": self.highest_tier
+            }
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "id": self.id,
+                "turns": self.turn_count,
+                "kept_turns": len(self.turns),
+                "context_tokens": self._total_tokens(),
+                "summary": self.summary,
+                "last_tier": self.last_tier
+            }
+
+
+class SessionStore:
+    # Sessions by id for callers that can't hold the Session object
+    # themselves (the HTTP service); least recently used ones are dropped
+    # past SESSION_MAX, and idle ones after SESSION_TTL seconds
+
+    def __init__(self, new_session=None):
+        config = Config()
+        self.max_sessions = config.SESSION_MAX
+        self.ttl = config.SESSION_TTL
+        self.new_session = new_session or Session
+        self.sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id=None):
+        now = time.time()
+        with self._lock:
+            while self.sessions:
+                oldest = next(iter(self.sessions.values()))
+                if now - oldest.last_used <= self.ttl:
+                    break
+                self.sessions.popitem(last=False)
+
+            session = self.sessions.get(session_id) if session_id else None
+            if session is None:
+                session = self.new_session(session_id)
+                self.sessions[session.id] = session
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            self.sessions.move_to_end(session.id)
+            session.last_used = now
+            return session
+
+    def __len__(self):
+        return len(self.sessions)
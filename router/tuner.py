@@ -0,0 +1,470 @@
+import argparse
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from router.rules import (
+    RoutingThresholds,
+    extract_features,
+    get_thresholds,
+    set_thresholds
+)
+from router.session import is_context_key
+from config import Config
+
+
+class RoutingTuner:
+    # Logs one observation per routed query and periodically re-fits the
+    # classifier thresholds so the expected latency is as low as possible
+    # while the first tier tried still answers validly often enough.
+
+    def __init__(self):
+        config = Config()
+        self.levels = config.MODEL_LEVELS
+        self.validity_target = config.TUNER_VALIDITY_TARGET
+        self.refit_every = config.TUNER_REFIT_EVERY
+        self.min_observations = config.TUNER_MIN_OBSERVATIONS
+        self.latency_priors = config.TUNER_LATENCY_PRIORS
+        self.prior_strength = config.TUNER_PRIOR_STRENGTH
+        self.long_response_length = config.TUNER_LONG_RESPONSE_LENGTH
+        self.model_levels = self._build_model_levels(config)
+        # Cache entries answered by these say nothing about real models
+        self.mock_models = {
+            backend["name"]
+            for pools in config.MODEL_POOLS.values()
+            for backends in pools.values()
+            for backend in backends
+            if backend["provider"] == "mock"
+        }
+
+        self.tuning_dir = os.path.join("data", "tuning")
+        self.log_file = os.path.join(self.tuning_dir, "observations.jsonl")
+        self.rotated_log_file = os.path.join(
+            self.tuning_dir,
+            "observations.1.jsonl"
+        )
+        self.thresholds_file = os.path.join(
+            self.tuning_dir,
+            "thresholds.json"
+        )
+
+        self.history = deque(maxlen=config.TUNER_HISTORY)
+        self.log_limit = config.TUNER_HISTORY
+        self.flush_every = config.TUNER_LOG_FLUSH_EVERY
+        self.since_refit = 0
+        self._refitting = False
+        self._lock = threading.Lock()
+        # Observations not yet in the log, and the lines the log holds
+        # (None until it is first counted)
+        self._pending = []
+        self._log_lines = None
+        self._log_lock = threading.Lock()
+
+        self._ensure_tuning_dir()
+        atexit.register(self.flush)
+
+    def _ensure_tuning_dir(self):
+        if not os.path.exists(self.tuning_dir):
+            os.makedirs(self.tuning_dir)
+
+    def _build_model_levels(self, config):
+        # model name -> tier, used to tell which tier answered a cache entry
+        model_levels = {
+            config.SIMPLE_MODEL: "simple",
+            config.MEDIUM_MODEL: "medium",
+            config.ADVANCED_MODEL: "advanced"
+        }
+        for pools in config.MODEL_POOLS.values():
+            for level, backends in pools.items():
+                for backend in backends:
+                    model_levels.setdefault(backend["name"], level)
+        return model_levels
+
+    def load(self):
+        return load_thresholds(self.thresholds_file)
+
+    def apply(self, thresholds):
+        set_thresholds(thresholds)
+        with open(self.thresholds_file, 'w', encoding='utf-8') as f:
+            json.dump(thresholds.to_dict(), f, indent=2, ensure_ascii=False)
+
+    def observe(self, query, complexity, final_level, latency,
+                response_length):
+        observation = {
+            "features": extract_features(query),
+            "tier": complexity,
+            "final_tier": final_level,
+            "fallback": final_level != complexity,
+            "latency": latency,
+            "response_length": response_length,
+            "timestamp": time.time()
+        }
+
+        batch = None
+        with self._lock:
+            self.history.append(observation)
+            self._pending.append(observation)
+            if len(self._pending) >= self.flush_every:
+                batch, self._pending = self._pending, []
+
+            self.since_refit += 1
+            refit = not (
+                self.since_refit < self.refit_every
+                or len(self.history) < self.min_observations
+                or self._refitting
+            )
+            if refit:
+                self.since_refit = 0
+                self._refitting = True
+                observations = list(self.history)
+
+        if batch:
+            self._write_log(batch)
+        if not refit:
+            return
+
+        # Re-fit off the request path; the new thresholds are swapped in
+        # whole once ready
+        threading.Thread(
+            target=self._refit_and_apply,
+            args=(observations,),
+            daemon=True
+        ).start()
+
+    def _refit_and_apply(self, observations):
+        try:
+            self.apply(self.refit(observations))
+        finally:
+            with self._lock:
+                self._refitting = False
+
+    def flush(self):
+        """Append the buffered observations to the log."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._write_log(batch)
+
+    def _write_log(self, batch):
+        with self._log_lock:
+            if self._log_lines is None:
+                self._log_lines = self._count_lines(self.log_file)
+            if self._log_lines >= self.log_limit:
+                os.replace(self.log_file, self.rotated_log_file)
+                self._log_lines = 0
+
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                for observation in batch:
+                    f.write(json.dumps(observation, ensure_ascii=False))
+                    f.write("\n")
+            self._log_lines += len(batch)
+
+    def _count_lines(self, path):
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'r', encoding='utf-8') as f:
+            return sum(1 for line in f if line.strip())
+
+    def load_log(self):
+        # The newest TUNER_HISTORY observations, across the rotated log
+        # and the current one
+        self.flush()
+        observations = deque(maxlen=self.log_limit)
+        for path in (self.rotated_log_file, self.log_file):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        observations.append(json.loads(line))
+        return list(observations)
+
+    def replay_cache(self, cache_file=None):
+        # Cache entries record the classified tier and the model that
+        # answered, so a fallback shows up as a tier mismatch; latency
+        # isn't stored and falls back to the configured priors
+        cache_file = cache_file or os.path.join(
+            "data", "cache", "query_cache.json"
+        )
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache_data = json.load(f)
+
+        observations = []
+        for query, record in cache_data.items():
+            complexity = record.get("complexity")
+            # Follow-ups were answered in a conversation's context
+            if (
+                complexity not in self.levels
+                or record.get("model") in self.mock_models
+                or is_context_key(query)
+            ):
+                continue
+            final_level = self.model_levels.get(
+                record.get("model"),
+                complexity
+            )
+            observations.append({
+                "features": extract_features(query),
+                "tier": complexity,
+                "final_tier": final_level,
+                "fallback": final_level != complexity,
+                "latency": None,
+                "response_length": record.get(
+                    "response_length",
+                    len(record.get("response", ""))
+                ),
+                "timestamp": record.get("timestamp", 0)
+            })
+        return observations
+
+    def refit(self, observations):
+        current = get_thresholds()
+        if not observations:
+            return current
+
+        latencies = self._tier_latencies(observations)
+        weights = self._fit_keyword_weights(observations, current)
+        validity = self._tier_validity(observations)
+
+        # Collapse identical feature rows so the grid search is cheap
+        rows = Counter()
+        for observation in observations:
+            features = observation["features"]
+            score = sum(
+                weights.get(keyword, 0.0)
+                for keyword in features["complex_keywords"]
+            )
+            rows[(
+                features["length"],
+                features["simple_factual"],
+                score >= current.complex_threshold
+            )] += 1
+
+        best = None
+        lengths = sorted(o["features"]["length"] for o in observations)
+        for max_simple in self._candidates(
+                lengths, current.max_simple_length):
+            for max_medium in self._candidates(
+                    lengths, current.max_medium_length):
+                if max_medium <= max_simple:
+                    continue
+                expected_latency, expected_validity = self._score(
+                    rows, max_simple, max_medium, latencies, validity
+                )
+                meets_target = expected_validity >= self.validity_target
+                # Prefer candidates that meet the validity target, then
+                # the lowest latency; otherwise the most valid
+                key = (
+                    not meets_target,
+                    expected_latency if meets_target else -expected_validity
+                )
+                if best is None or key < best[0]:
+                    best = (key, max_simple, max_medium)
+
+        if best is None:
+            max_simple = current.max_simple_length
+            max_medium = current.max_medium_length
+        else:
+            _, max_simple, max_medium = best
+
+        return RoutingThresholds(
+            max_simple_length=max_simple,
+            max_medium_length=max_medium,
+            complex_keyword_weights=weights,
+            simple_keywords=list(current.simple_keywords),
+            complex_threshold=current.complex_threshold
+        )
+
+    def _candidates(self, lengths, current):
+        # Observed length quantiles, kept within a factor of two of the
+        # current value so one refit can't swing routing too far
+        candidates = {current}
+        for step in range(1, 20):
+            length = lengths[(len(lengths) - 1) * step // 20]
+            if current / 2 <= length <= current * 2:
+                candidates.add(length)
+        return sorted(candidates)
+
+    def _score(self, rows, max_simple, max_medium, latencies, validity):
+        total = 0
+        total_latency = 0.0
+        total_validity = 0.0
+        for (length, simple_factual, is_complex), count in rows.items():
+            if length <= max_simple and simple_factual:
+                level = 0
+            elif length <= max_medium:
+                level = 2 if is_complex else 1
+            else:
+                level = 2
+
+            valid = self._validity_at(validity, level, length)
+            latency = latencies[level]
+            if level + 1 < len(self.levels):
+                # An invalid answer costs a second call one tier up
+                latency += (1 - valid) * latencies[level + 1]
+
+            total += count
+            total_latency += latency * count
+            total_validity += valid * count
+
+        return total_latency / total, total_validity / total
+
+    def _tier_latencies(self, observations):
+        samples = {level: [] for level in self.levels}
+        for observation in observations:
+            if observation["fallback"] or observation["latency"] is None:
+                continue
+            samples[observation["final_tier"]].append(observation["latency"])
+
+        latencies = []
+        for level in self.levels:
+            prior = self.latency_priors[level]
+            values = samples[level]
+            latencies.append(
+                (sum(values) + prior * self.prior_strength)
+                / (len(values) + self.prior_strength)
+            )
+        return latencies
+
+    def _validity_labels(self, observation):
+        # The tier that finally answered (and anything above it) was
+        # valid and the tiers tried before it were not. Below the first
+        # tier tried we only know something if that tier failed too: a
+        # weaker model is assumed not to do better.
+        tried = self.levels.index(observation["tier"])
+        final = self.levels.index(observation["final_tier"])
+        first = 0 if final > tried else tried
+        labels = {}
+        for level in range(first, len(self.levels)):
+            labels[level] = level >= final
+        return labels
+
+    def _bucket(self, length):
+        # Quarter-octave length buckets
+        return int(4 * math.log2(length + 1))
+
+    def _tier_validity(self, observations):
+        counts = {}
+        for observation in observations:
+            bucket = self._bucket(observation["features"]["length"])
+            for level, valid in self._validity_labels(observation).items():
+                for key in ((level, bucket), (level, None)):
+                    seen, hits = counts.get(key, (0, 0))
+                    counts[key] = (seen + 1, hits + int(valid))
+        return counts
+
+    def _validity_at(self, validity, level, length):
+        # Per length bucket rate, shrunk towards the tier-wide rate, which
+        # is itself shrunk towards the validity target
+        k = self.prior_strength
+        seen, hits = validity.get((level, None), (0, 0))
+        tier_rate = (hits + self.validity_target * k) / (seen + k)
+        seen, hits = validity.get((level, self._bucket(length)), (0, 0))
+        return (hits + tier_rate * k) / (seen + k)
+
+    def _fit_keyword_weights(self, observations, current):
+        # Weight = P(medium tier invalid | keyword) / (1 - target), so a
+        # lone keyword sends a query to advanced exactly when answering it
+        # at medium would miss the validity target
+        medium = self.levels.index("medium")
+        allowed_miss = 1 - self.validity_target
+        k = self.prior_strength
+
+        counts = {}
+        for observation in observations:
+            features = observation["features"]
+            if features["length"] > current.max_medium_length:
+                continue
+
+            labels = self._validity_labels(observation)
+            if medium in labels:
+                medium_invalid = not labels[medium]
+            else:
+                # Routed straight to advanced: use a long answer as a
+                # proxy for a question medium couldn't have handled
+                medium_invalid = (
+                    observation["response_length"]
+                    >= self.long_response_length
+                )
+
+            for keyword in features["complex_keywords"]:
+                seen, misses = counts.get(keyword, (0, 0))
+                counts[keyword] = (seen + 1, misses + int(medium_invalid))
+
+        weights = {}
+        for keyword, weight in current.complex_keyword_weights.items():
+            if keyword not in counts:
+                weights[keyword] = weight
+                continue
+            seen, misses = counts[keyword]
+            miss_rate = (misses + allowed_miss * k) / (seen + k)
+            weights[keyword] = round(min(2.0, miss_rate / allowed_miss), 3)
+        return weights
+
+
+def load_thresholds(thresholds_file=None):
+    # Thresholds saved by the tuner, online or with --apply, replace the
+    # configured ones for the whole process; None when there are none
+    thresholds_file = thresholds_file or os.path.join(
+        "data", "tuning", "thresholds.json"
+    )
+    if not os.path.exists(thresholds_file):
+        return None
+
+    with open(thresholds_file, 'r', encoding='utf-8') as f:
+        thresholds = RoutingThresholds(**json.load(f))
+    set_thresholds(thresholds)
+    return thresholds
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-fit routing thresholds from logged or cached data"
+    )
+    parser.add_argument(
+        "source",
+        choices=["log", "cache"],
+        help="tune from the observation log or replay query_cache.json"
+    )
+    parser.add_argument("--cache-file", default=None)
+    parser.add_argument(
+        "--apply",
+        action="store_true",
+        help="save the new thresholds; routers load them when they start, "
+             "whether or not TUNER_ENABLED is set"
+    )
+    args = parser.parse_args()
+
+    tuner = RoutingTuner()
+    tuner.load()
+    if args.source == "cache":
+        observations = tuner.replay_cache(args.cache_file)
+    else:
+        observations = tuner.load_log()
+
+    print(f"Observations: {len(observations)}")
+    before = get_thresholds()
+    thresholds = tuner.refit(observations)
+    print(f"MAX_SIMPLE_LENGTH: {before.max_simple_length} -> "
+          f"{thresholds.max_simple_length}")
+    print(f"MAX_MEDIUM_LENGTH: {before.max_medium_length} -> "
+          f"{thresholds.max_medium_length}")
+    for keyword, weight in thresholds.complex_keyword_weights.items():
+        old_weight = before.complex_keyword_weights.get(keyword)
+        if weight != old_weight:
+            print(f"  {keyword}: {old_weight} -> {weight}")
+
+    if args.apply:
+        if len(observations) < tuner.min_observations:
+            print(f"Not applied: fewer than {tuner.min_observations} "
+                  "observations (TUNER_MIN_OBSERVATIONS)")
+            return
+        tuner.apply(thresholds)
+        print(f"Saved to: {tuner.thresholds_file}")
+
+
+if __name__ == "__main__":
+    main()
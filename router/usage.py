@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import threading
+import time
+from array import array
+from datetime import datetime
+from config import Config
+
+
+class RingBuffer:
+    # Fixed-size columnar store: one typed array per field, overwritten
+    # oldest-first once full
+    COLUMNS = {
+        "timestamp": "d",
+        "duration": "d",
+        "input_tokens": "q",
+        "output_tokens": "q",
+        "cost": "d"
+    }
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.columns = {
+            name: array(typecode, [0]) * capacity
+            for name, typecode in self.COLUMNS.items()
+        }
+        self.next_index = 0
+        self.size = 0
+
+    def append(self, timestamp, duration, input_tokens, output_tokens,
+               cost):
+        i = self.next_index
+        self.columns["timestamp"][i] = timestamp
+        self.columns["duration"][i] = duration
+        self.columns["input_tokens"][i] = input_tokens
+        self.columns["output_tokens"][i] = output_tokens
+        self.columns["cost"][i] = cost
+        self.next_index = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def indexes_since(self, since: float):
+        timestamps = self.columns["timestamp"]
+        return [i for i in range(self.size) if timestamps[i] >= since]
+
+
+class RequestUsage:
+    # Registry listener summing the tokens and cost of every model call
+    # made for one request, fallbacks included
+
+    def __init__(self):
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+
+    def __call__(self, model_level, backend, latency, usage, failed):
+        self.input_tokens += usage.input_tokens
+        self.output_tokens += usage.output_tokens
+        self.cost += (
+            usage.total_tokens * backend.cost_per_million_tokens / 1_000_000
+        )
+
+
+class UsageTracker:
+    # Per-request tokens, duration and cost, kept in one ring buffer per
+    # (tier, routing method, cache status). Held in memory only: the
+    # usage of a process is reported by that process.
+
+    def __init__(self):
+        config = Config()
+        self.capacity = config.USAGE_BUFFER_SIZE
+        self.windows = config.USAGE_WINDOWS
+        self.report_dir = os.path.join("data", "usage_reports")
+        self.buffers = {}
+        self._lock = threading.Lock()
+
+    def record(self, tier, route_method, cached, duration, input_tokens=0,
+               output_tokens=0, cost=0.0):
+        """One entry per request: tier is the one that served it."""
+        key = (tier, route_method, bool(cached))
+        with self._lock:
+            buffer = self.buffers.get(key)
+            if buffer is None:
+                buffer = self.buffers[key] = RingBuffer(self.capacity)
+            buffer.append(
+                time.time(),
+                duration,
+                input_tokens,
+                output_tokens,
+                cost
+            )
+
+    def summary(self, window_seconds=None):
+        since = time.time() - window_seconds if window_seconds else 0.0
+        rows = []
+        with self._lock:
+            for (tier, route_method, cached), buffer in sorted(
+                    self.buffers.items()):
+                indexes = buffer.indexes_since(since)
+                if not indexes:
+                    continue
+                rows.append(self._summarize(
+                    tier,
+                    route_method,
+                    cached,
+                    buffer,
+                    indexes
+                ))
+        return rows
+
+    def _summarize(self, tier, route_method, cached, buffer, indexes):
+        columns = buffer.columns
+        durations = sorted(columns["duration"][i] for i in indexes)
+        count = len(durations)
+        return {
+            "tier": tier,
+            "route_method": route_method,
+            "cached": cached,
+            "calls": count,
+            "input_tokens": sum(columns["input_tokens"][i] for i in indexes),
+            "output_tokens": sum(
+                columns["output_tokens"][i] for i in indexes
+            ),
+            "cost": round(sum(columns["cost"][i] for i in indexes), 6),
+            "mean_duration": round(sum(durations) / count, 4),
+            "p50_duration": round(durations[(count - 1) // 2], 4),
+            "p95_duration": round(durations[(count - 1) * 95 // 100], 4)
+        }
+
+    def report(self):
+        return {
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "windows": {
+                str(window or "all"): self.summary(window)
+                for window in self.windows
+            }
+        }
+
+    def export(self):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        os.makedirs(self.report_dir, exist_ok=True)
+        report_file = os.path.join(self.report_dir, f"usage_{timestamp}.json")
+
+        with open(report_file, 'w', encoding='utf-8') as f:
+            # Compact separators: these reports are for tooling, not reading
+            json.dump(self.report(), f, separators=(",", ":"))
+
+        return report_file
+
+
+def print_summary(rows):
+    if not rows:
+        print("  No calls recorded")
+        return
+
+    print(f"  {'tier':<10}{'method':<18}{'cached':<8}{'calls':>7}"
+          f"{'in_tok':>10}{'out_tok':>10}{'cost':>11}"
+          f"{'p50':>9}{'p95':>9}")
+    for row in rows:
+        print(f"  {row['tier']:<10}{row['route_method']:<18}"
+              f"{str(row['cached']):<8}{row['calls']:>7}"
+              f"{row['input_tokens']:>10}{row['output_tokens']:>10}"
+              f"{row['cost']:>11.6f}"
+              f"{row['p50_duration']:>8.3f}s{row['p95_duration']:>8.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Show an exported usage report"
+    )
+    parser.add_argument("report_file")
+    parser.add_argument(
+        "--window",
+        default=None,
+        help="window in seconds (default: every window in the report)"
+    )
+    args = parser.parse_args()
+
+    with open(args.report_file, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+
+    print(f"Usage report from {report['date']}")
+    for window, rows in report["windows"].items():
+        if args.window and window != args.window:
+            continue
+        print(f"Window: {window}" + ("s" if window != "all" else ""))
+        print_summary(rows)
+
+
+if __name__ == "__main__":
+    main()
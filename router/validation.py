@@ -0,0 +1,342 @@
+import argparse
+import importlib
+import os
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+
+from router.cache_index import iter_json_object
+from config import Config
+
+
+@dataclass
+class ValidationResult:
+    valid: bool
+    # Name of the first check that failed
+    reason: Optional[str] = None
+
+
+@dataclass
+class Check:
+    # fn(text) -> True when the text fails the check. prefix checks can
+    # decide on the opening of a streamed answer.
+    name: str
+    fn: Callable[[str], bool]
+    prefix: bool = False
+    calls: int = 0
+    failures: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "errors": self.errors,
+            "seconds": self.seconds
+        }
+
+
+def _phrase_pattern(phrases):
+    # Case-insensitive, and straight or curly apostrophes both match
+    alternatives = [
+        re.escape(phrase).replace("'", "['’]")
+        for phrase in sorted(phrases, key=len, reverse=True)
+    ]
+    return "(?:" + "|".join(alternatives) + ")"
+
+
+def load_scorer(path):
+    # "package.module:function"
+    module_name, _, attribute = path.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+class ResponseValidator:
+    # Ordered checks, cheapest first; a response is invalid at the first
+    # check that fails. Built-ins:
+    #   too_short      fewer than VALIDATOR_MIN_CHARS non-blank characters
+    #   refusal_prefix starts with one of INVALID_PHRASES
+    #   short_refusal  a sentence starting with one of INVALID_PHRASES
+    #                  (after an optional "Sorry, but") in an answer of at
+    #                  most VALIDATOR_REFUSAL_MAX_CHARS characters; quoted
+    #                  or mid-sentence phrases don't count
+    # followed by the scorers from VALIDATOR_SCORERS and any added with
+    # add_check/add_scorer. Each check keeps its own call counts and time.
+
+    def __init__(self, config=None):
+        config = config or Config()
+        self.min_chars = config.VALIDATOR_MIN_CHARS
+        self.refusal_max_chars = config.VALIDATOR_REFUSAL_MAX_CHARS
+        self.stream_chars = config.STREAM_VALIDATE_CHARS
+
+        phrases = _phrase_pattern(config.INVALID_PHRASES)
+        self.refusal_prefix = re.compile(r"\s*" + phrases, re.IGNORECASE)
+        sentence = (
+            r"\s*(?:(?:i['’]m |i am )?(?:sorry|unfortunately),?\s+"
+            r"(?:but\s+)?)?" + phrases
+        )
+        self.refusal_sentence = re.compile(
+            r"(?:^|[.!?\n])" + sentence,
+            re.IGNORECASE
+        )
+        # For batch sweeps over many responses joined by \0
+        self.refusal_prefix_joined = re.compile(
+            r"(?:^|\0)\s*" + phrases,
+            re.IGNORECASE
+        )
+        self.refusal_sentence_joined = re.compile(
+            r"(?:^|[\0.!?\n])" + sentence,
+            re.IGNORECASE
+        )
+
+        self.checks = [
+            Check("too_short", self._too_short),
+            Check("refusal_prefix", self._refusal_prefix, prefix=True),
+            Check("short_refusal", self._short_refusal)
+        ]
+        self._lock = threading.Lock()
+
+        for name, scorer in config.VALIDATOR_SCORERS.items():
+            self.add_scorer(
+                name,
+                load_scorer(scorer["function"]),
+                scorer.get("min_score", 0.5)
+            )
+
+    def _too_short(self, text):
+        return len(text.strip()) < self.min_chars
+
+    def _refusal_prefix(self, text):
+        return self.refusal_prefix.match(text) is not None
+
+    def _short_refusal(self, text):
+        return (
+            len(text) <= self.refusal_max_chars
+            and self.refusal_sentence.search(text) is not None
+        )
+
+    def add_check(self, name, fn, prefix=False):
+        """fn(text) returns True when the response should be rejected."""
+        self.checks.append(Check(name, fn, prefix))
+
+    def add_scorer(self, name, fn, min_score=0.5):
+        """fn(text) returns a score; below min_score is invalid."""
+        self.add_check(name, lambda text: fn(text) < min_score)
+
+    def _run(self, check, text):
+        start = time.perf_counter()
+        try:
+            failed = bool(check.fn(text))
+            error = False
+        except Exception:
+            # A broken plug-in check must not fail every answer
+            failed = False
+            error = True
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            check.calls += 1
+            check.seconds += elapsed
+            check.failures += failed
+            check.errors += error
+        return failed
+
+    def validate(self, text) -> ValidationResult:
+        text = text or ""
+        for check in self.checks:
+            if self._run(check, text):
+                return ValidationResult(False, check.name)
+        return ValidationResult(True)
+
+    def is_valid(self, text) -> bool:
+        return self.validate(text).valid
+
+    def stream(self):
+        return StreamValidator(self)
+
+    def validate_many(self, texts):
+        """Failure reason (None when valid) for each text, with the
+        built-in checks run as array and whole-batch regex sweeps rather
+        than text by text."""
+        texts = [text or "" for text in texts]
+        n = len(texts)
+        reasons = np.full(n, None, dtype=object)
+        # Texts no check has rejected yet
+        passing = np.ones(n, dtype=bool)
+        if not n:
+            return reasons.tolist()
+
+        start = time.perf_counter()
+        lengths = np.fromiter((len(t) for t in texts), dtype=np.int64,
+                              count=n)
+        stripped = np.fromiter((len(t.strip()) for t in texts),
+                               dtype=np.int64, count=n)
+        self._record_batch("too_short", n, start,
+                           stripped < self.min_chars, reasons, passing)
+
+        # One regex pass over the openings of every remaining answer
+        start = time.perf_counter()
+        candidates = np.flatnonzero(passing)
+        head = max(self.stream_chars, 256)
+        failed = np.zeros(n, dtype=bool)
+        failed[candidates[self._joined_matches(
+            self.refusal_prefix_joined,
+            [texts[i][:head] for i in candidates]
+        )]] = True
+        self._record_batch("refusal_prefix", len(candidates), start,
+                           failed, reasons, passing)
+
+        start = time.perf_counter()
+        candidates = np.flatnonzero(
+            passing & (lengths <= self.refusal_max_chars)
+        )
+        failed = np.zeros(n, dtype=bool)
+        failed[candidates[self._joined_matches(
+            self.refusal_sentence_joined,
+            [texts[i] for i in candidates]
+        )]] = True
+        self._record_batch("short_refusal", len(candidates), start,
+                           failed, reasons, passing)
+
+        # Plug-in checks are arbitrary Python, so they run per text
+        for check in self.checks[3:]:
+            for i in np.flatnonzero(passing):
+                if self._run(check, texts[i]):
+                    reasons[i] = check.name
+                    passing[i] = False
+
+        return reasons.tolist()
+
+    def _joined_matches(self, pattern, texts):
+        # Join with \0, search once, and map match positions back to the
+        # index of the text they fall in
+        if not texts:
+            return np.zeros(0, dtype=np.int64)
+        texts = [t.replace("\0", "\ufffd") for t in texts]
+        starts = np.cumsum([0] + [len(t) + 1 for t in texts[:-1]])
+        positions = [m.end() - 1 for m in pattern.finditer("\0".join(texts))]
+        return np.unique(np.searchsorted(starts, positions, side="right") - 1)
+
+    def _record_batch(self, name, calls, start, failed, reasons, passing):
+        newly_failed = failed & passing
+        reasons[newly_failed] = name
+        passing &= ~newly_failed
+        check = next(c for c in self.checks if c.name == name)
+        with self._lock:
+            check.calls += calls
+            check.failures += int(newly_failed.sum())
+            check.seconds += time.perf_counter() - start
+
+    def stats(self):
+        with self._lock:
+            return {check.name: check.to_dict() for check in self.checks}
+
+
+class StreamValidator:
+    # Fed the chunks of a streamed answer. feed() returns None until it
+    # can decide on the opening: False as soon as a prefix check fails,
+    # True once STREAM_VALIDATE_CHARS have arrived and passed. finish()
+    # runs every check on the whole answer.
+
+    def __init__(self, validator):
+        self.validator = validator
+        self.parts = []
+        self.length = 0
+        self.decision = None
+
+    def feed(self, chunk):
+        self.parts.append(chunk)
+        self.length += len(chunk)
+        if self.decision is not None:
+            return self.decision
+
+        prefix = "".join(self.parts)
+        self.parts = [prefix]
+        for check in self.validator.checks:
+            if check.prefix and self.validator._run(check, prefix):
+                self.decision = False
+                return False
+        if self.length >= self.validator.stream_chars:
+            self.decision = True
+        return self.decision
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    def finish(self) -> ValidationResult:
+        return self.validator.validate(self.text)
+
+
+def audit_cache(cache_file, validator=None, batch_size=10000):
+    """(query, reason) for every cached response that fails validation,
+    streaming the cache file in batches."""
+    validator = validator or ResponseValidator()
+    bad = []
+    queries = []
+    responses = []
+
+    def sweep():
+        for query, reason in zip(queries, validator.validate_many(responses)):
+            if reason is not None:
+                bad.append((query, reason))
+        queries.clear()
+        responses.clear()
+
+    for query, record, _, _ in iter_json_object(cache_file):
+        queries.append(query)
+        responses.append(record.get("response", ""))
+        if len(queries) >= batch_size:
+            sweep()
+    sweep()
+    return bad
+
+
+def main():
+    from router.cache import Cache
+
+    parser = argparse.ArgumentParser(
+        description="Re-validate every cached response"
+    )
+    parser.add_argument(
+        "--cache-file",
+        default=os.path.join("data", "cache", "query_cache.json")
+    )
+    parser.add_argument(
+        "--purge",
+        action="store_true",
+        help="remove the entries that fail validation"
+    )
+    parser.add_argument("--show", type=int, default=10)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.cache_file):
+        print(f"No cache file at {args.cache_file}")
+        return
+
+    start = time.perf_counter()
+    validator = ResponseValidator()
+    bad = audit_cache(args.cache_file, validator)
+    elapsed = time.perf_counter() - start
+
+    checked = validator.stats()["too_short"]["calls"]
+    print(f"Checked {checked} cached responses in {elapsed:.2f}s, "
+          f"{len(bad)} invalid")
+    for reason, count in Counter(reason for _, reason in bad).items():
+        print(f"  {reason}: {count}")
+    for query, reason in bad[:args.show]:
+        print(f"  [{reason}] {query[:70]}")
+
+    if args.purge and bad:
+        Cache(args.cache_file).delete_many(query for query, _ in bad)
+        print(f"Removed {len(bad)} entries from {args.cache_file}")
+
+
+if __name__ == "__main__":
+    main()
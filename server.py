@@ -0,0 +1,535 @@
+import argparse
+import json
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from router.query_router import RuleRouter
+from router.scheduler import (
+    PRIORITIES,
+    DeadlineExceeded,
+    RequestScheduler,
+    SchedulerOverloaded
+)
+from router.session import SessionStore
+from config import Config
+
+
+class RouterRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, self.server.health())
+        elif self.path == "/metrics":
+            self.send_json(200, self.server.metrics())
+        else:
+            self.send_json(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        routes = {
+            "/route": self.handle_route,
+            "/route_batch": self.handle_route_batch,
+            "/route/stream": self.handle_route_stream
+        }
+        handler = routes.get(self.path)
+        if handler is None:
+            self.send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+
+        try:
+            body = self.read_json()
+        except ValueError as e:
+            self.send_json(400, {"error": f"Invalid JSON body: {e}"})
+            return
+
+        try:
+            handler(body)
+        except SchedulerOverloaded as e:
+            self.send_json(503, {"error": str(e)})
+        except DeadlineExceeded as e:
+            self.send_json(504, {"error": str(e)})
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+
+    def read_scheduling(self, body, default_priority):
+        # (priority, deadline seconds), or None after a 400
+        priority = body.get("priority", default_priority)
+        if priority not in PRIORITIES:
+            self.send_json(400, {
+                "error": f"'priority' must be one of {PRIORITIES}"
+            })
+            return None
+        deadline = self.read_deadline(body, priority)
+        if deadline is None:
+            return None
+        return priority, deadline
+
+    def read_deadline(self, body, priority):
+        # Deadline seconds, or None after a 400. It defaults to the
+        # priority class's and is capped at the server's request timeout:
+        # nobody waits on an answer past it
+        deadline = body.get("deadline")
+        if deadline is not None and (
+                isinstance(deadline, bool)
+                or not isinstance(deadline, (int, float))
+                or deadline <= 0):
+            self.send_json(400, {
+                "error": "'deadline' must be a positive number of seconds"
+            })
+            return None
+        if deadline is None:
+            deadline = self.server.scheduler.default_deadlines.get(priority)
+        timeout = self.server.request_timeout
+        return min(deadline or timeout, timeout)
+
+    def read_use_cache(self, body):
+        # (use_cache, ok)
+        use_cache = body.get("use_cache", True)
+        if not isinstance(use_cache, bool):
+            self.send_json(400, {"error": "'use_cache' must be a boolean"})
+            return None, False
+        return use_cache, True
+
+    def read_session(self, body):
+        # (session or None, ok); an unknown session_id starts a new
+        # conversation under that id
+        session_id = body.get("session_id")
+        if session_id is None:
+            return None, True
+        if not isinstance(session_id, str) or not session_id.strip():
+            self.send_json(400, {"error": "'session_id' must be a string"})
+            return None, False
+        return self.server.sessions.get(session_id), True
+
+    def handle_route(self, body):
+        query = body.get("query")
+        if not isinstance(query, str) or not query.strip():
+            self.send_json(400, {"error": "'query' must be a string"})
+            return
+        scheduling = self.read_scheduling(body, "interactive")
+        if scheduling is None:
+            return
+        use_cache, ok = self.read_use_cache(body)
+        if not ok:
+            return
+        session, ok = self.read_session(body)
+        if not ok:
+            return
+
+        priority, deadline = scheduling
+        future = self.server.scheduler.route(
+            query,
+            priority=priority,
+            deadline=deadline,
+            use_cache=use_cache,
+            session=session
+        )
+        try:
+            result = future.result(timeout=deadline)
+        except FutureTimeout:
+            future.cancel()
+            raise DeadlineExceeded(f"No answer within {deadline:g}s")
+        if session is not None:
+            result["session_id"] = session.id
+        self.send_json(200, result)
+
+    def handle_route_batch(self, body):
+        queries = body.get("queries")
+        if not isinstance(queries, list) or not all(
+                isinstance(query, str) for query in queries):
+            self.send_json(400, {"error": "'queries' must be a list"})
+            return
+        if len(queries) > self.server.max_batch:
+            self.send_json(413, {
+                "error": f"At most {self.server.max_batch} queries per batch"
+            })
+            return
+        scheduling = self.read_scheduling(body, "batch")
+        if scheduling is None:
+            return
+        use_cache, ok = self.read_use_cache(body)
+        if not ok:
+            return
+
+        # Each query is scheduled on its own tier at batch priority, so a
+        # batch can't crowd out interactive requests
+        priority, deadline = scheduling
+        end = time.monotonic() + deadline
+        futures = []
+        for query in queries:
+            try:
+                futures.append(self.server.scheduler.route(
+                    query,
+                    priority=priority,
+                    deadline=deadline,
+                    use_cache=use_cache
+                ))
+            except SchedulerOverloaded as e:
+                futures.append(e)
+
+        results = []
+        for query, future in zip(queries, futures):
+            try:
+                if isinstance(future, Exception):
+                    raise future
+                try:
+                    results.append(future.result(
+                        timeout=max(0.0, end - time.monotonic())
+                    ))
+                except FutureTimeout:
+                    future.cancel()
+                    raise DeadlineExceeded(f"No answer within {deadline:g}s")
+            except Exception as e:
+                results.append({
+                    "query": query,
+                    "response": None,
+                    "complexity": None,
+                    "model_name": None,
+                    "cached": False,
+                    "error": str(e)
+                })
+        self.send_json(200, {"results": results})
+
+    def handle_route_stream(self, body):
+        # Streams are not queued by the scheduler: the model is called on
+        # this HTTP worker. The deadline (an interactive one by default)
+        # still holds: past it the stream ends with an error event.
+        query = body.get("query")
+        if not isinstance(query, str) or not query.strip():
+            self.send_json(400, {"error": "'query' must be a string"})
+            return
+        deadline = self.read_deadline(body, "interactive")
+        if deadline is None:
+            return
+        use_cache, ok = self.read_use_cache(body)
+        if not ok:
+            return
+        session, ok = self.read_session(body)
+        if not ok:
+            return
+
+        # Newline-delimited JSON events over chunked transfer encoding
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        events = StreamEvents(self.server.router.route_query_stream(
+            query,
+            use_cache=use_cache,
+            session=session
+        ))
+        end = time.monotonic() + deadline
+        try:
+            for event in events.until(end):
+                if session is not None and event["event"] == "end":
+                    event["session_id"] = session.id
+                self.write_chunk(event)
+        except FutureTimeout:
+            self.write_chunk({
+                "event": "error",
+                "error": f"No answer within {deadline:g}s"
+            })
+        except Exception as e:
+            self.write_chunk({"event": "error", "error": str(e)})
+        finally:
+            events.close()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if not length:
+            return {}
+        body = json.loads(self.rfile.read(length).decode("utf-8"))
+        if not isinstance(body, dict):
+            raise ValueError("expected a JSON object")
+        return body
+
+    def write_chunk(self, event):
+        data = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii"))
+        self.wfile.write(data + b"\r\n")
+        self.wfile.flush()
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class StreamEvents:
+    # Runs a route_query_stream generator on its own thread so the HTTP
+    # worker can stop waiting on it at the deadline, even in the middle of
+    # a slow model call. Closed early, the generator is closed (and its
+    # model stream with it) as soon as it yields again.
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.events = queue.Queue()
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            for event in self.stream:
+                self.events.put(("event", event))
+                if self.closed.is_set():
+                    break
+        except Exception as e:
+            self.events.put(("error", e))
+        finally:
+            self.stream.close()
+            self.events.put(("done", None))
+
+    def until(self, end):
+        # Yields the events; raises FutureTimeout once end (a monotonic
+        # time) passes and whatever the stream raised
+        while True:
+            try:
+                kind, value = self.events.get(
+                    timeout=max(0.0, end - time.monotonic())
+                )
+            except queue.Empty:
+                raise FutureTimeout()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+
+    def close(self):
+        self.closed.set()
+
+
+class RouterServer(HTTPServer):
+    # Accepted connections go into a bounded queue served by a fixed pool
+    # of workers. When the queue is full the connection is answered with
+    # 503 straight away instead of piling up behind slow model calls.
+
+    def __init__(self, router, host=None, port=None, workers=None,
+                 queue_size=None, verbose=False, scheduler=None):
+        config = Config()
+        self.router = router
+        # Model calls run on the scheduler's per-tier workers; the HTTP
+        # workers only wait on them
+        self.scheduler = scheduler or RequestScheduler(router)
+        # Conversations by the session_id clients send with each turn
+        self.sessions = SessionStore(router.new_session)
+        self.worker_count = workers or config.SERVER_WORKERS
+        self.max_batch = config.SERVER_MAX_BATCH
+        self.drain_timeout = config.SERVER_DRAIN_TIMEOUT
+        self.request_timeout = config.SERVER_REQUEST_TIMEOUT
+        self.verbose = verbose
+
+        self.requests = queue.Queue(
+            maxsize=queue_size or config.SERVER_QUEUE_SIZE
+        )
+        self.workers = []
+        self.draining = False
+        self.rejected = 0
+        self.served = 0
+        self.busy = 0
+        self.serving = False
+        self._stats_lock = threading.Lock()
+
+        super().__init__(
+            (
+                host or config.SERVER_HOST,
+                config.SERVER_PORT if port is None else port
+            ),
+            RouterRequestHandler
+        )
+
+    def serve_forever(self, poll_interval=0.5):
+        self.serving = True
+        try:
+            super().serve_forever(poll_interval)
+        finally:
+            self.serving = False
+
+    def start_workers(self):
+        for i in range(self.worker_count):
+            worker = threading.Thread(
+                target=self._work,
+                name=f"router-worker-{i}",
+                daemon=True
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def process_request(self, request, client_address):
+        # Runs on the accept thread: hand off or reject, never block
+        if self.draining:
+            self._reject(request, b"Server is shutting down")
+            return
+        try:
+            self.requests.put_nowait((request, client_address))
+        except queue.Full:
+            self._reject(request, b"Request queue is full")
+
+    def _reject(self, request, message):
+        with self._stats_lock:
+            self.rejected += 1
+        # Off the accept thread: the request has to be read before the
+        # reply, or closing with unread data resets the connection
+        threading.Thread(
+            target=self._send_unavailable,
+            args=(request, message),
+            daemon=True
+        ).start()
+
+    def _send_unavailable(self, request, message):
+        try:
+            request.settimeout(1.0)
+            request.recv(65536)
+            request.sendall(
+                b"HTTP/1.1 503 Service Unavailable\r\n"
+                b"Content-Type: text/plain\r\n"
+                b"Retry-After: 1\r\n"
+                b"Connection: close\r\n"
+                b"Content-Length: " + str(len(message)).encode() + b"\r\n"
+                b"\r\n" + message
+            )
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def _work(self):
+        while True:
+            item = self.requests.get()
+            if item is None:
+                self.requests.task_done()
+                return
+
+            request, client_address = item
+            with self._stats_lock:
+                self.busy += 1
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                with self._stats_lock:
+                    self.busy -= 1
+                    self.served += 1
+                self.requests.task_done()
+
+    def drain(self, timeout=None):
+        # Stop accepting, let queued and in-flight requests finish, then
+        # stop the workers
+        timeout = self.drain_timeout if timeout is None else timeout
+        self.draining = True
+        # shutdown() waits for serve_forever to return, forever if it
+        # never ran
+        if self.serving:
+            self.shutdown()
+
+        deadline = time.time() + timeout
+        for _ in self.workers:
+            remaining = max(0.0, deadline - time.time())
+            try:
+                self.requests.put(None, timeout=remaining)
+            except queue.Full:
+                break
+        for worker in self.workers:
+            worker.join(max(0.0, deadline - time.time()))
+        self.scheduler.shutdown(max(0.0, deadline - time.time()))
+
+        self.server_close()
+
+    def queue_stats(self):
+        with self._stats_lock:
+            return {
+                "queued": self.requests.qsize(),
+                "queue_size": self.requests.maxsize,
+                "workers": self.worker_count,
+                "busy_workers": self.busy,
+                "served": self.served,
+                "rejected": self.rejected,
+                "draining": self.draining
+            }
+
+    def health(self):
+        return {
+            "status": "draining" if self.draining else "ok",
+            "server": self.queue_stats(),
+            **self.router.health()
+        }
+
+    def metrics(self):
+        return {
+            "server": self.queue_stats(),
+            "scheduler": self.scheduler.stats(),
+            "validation": self.router.validator.stats(),
+            "sessions": len(self.sessions),
+            "usage": {
+                str(window or "all"): self.router.usage.summary(window)
+                for window in self.router.usage.windows
+            }
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the router over HTTP")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--queue-size", type=int, default=None)
+    parser.add_argument(
+        "--provider",
+        default=None,
+        help="model provider (default: Config.MODEL_PROVIDER)"
+    )
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = RouterServer(
+        RuleRouter(model_provider=args.provider),
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        verbose=args.verbose
+    )
+    server.start_workers()
+
+    # shutdown() waits for serve_forever, so the drain can't run on the
+    # thread that is serving
+    drainer = threading.Thread(target=server.drain, name="router-drain")
+
+    def stop(signum, frame):
+        if server.draining:
+            return
+        print("Draining requests...")
+        drainer.start()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    host, port = server.server_address[:2]
+    print(f"Serving router on http://{host}:{port}")
+    server.serve_forever()
+
+    # serve_forever has returned; wait for the drain to finish closing the
+    # scheduler and the socket
+    drainer.join()
+    print("Server stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import os
+
+from evaluation.benchmark import BenchmarkSuite, compare
+
+
+def result(p95, throughput, throughput_ci=None, configuration="routing_cold"):
+    return {
+        "configuration": configuration,
+        "concurrency": 1,
+        "p95": p95,
+        "throughput": throughput,
+        "throughput_ci": throughput_ci or [throughput, throughput]
+    }
+
+
+def test_compare_flags_slower_p95_and_lower_throughput():
+    baseline = {"results": [result(0.10, 100.0)]}
+    report = {"results": [result(0.20, 50.0)]}
+
+    regressions = compare(report, baseline, tolerance=0.1)
+
+    assert {r["metric"] for r in regressions} == {"p95", "throughput"}
+    p95 = next(r for r in regressions if r["metric"] == "p95")
+    assert round(p95["change"], 3) == 1.0
+
+
+def test_compare_ignores_changes_within_tolerance_and_noise():
+    baseline = {"results": [result(0.10, 100.0)]}
+    report = {"results": [
+        result(0.105, 95.0, [90.0, 99.0]),
+        result(0.50, 1.0, configuration="simple_only")
+    ]}
+
+    assert compare(report, baseline, tolerance=0.1) == []
+
+
+def test_compare_survives_a_zero_baseline():
+    baseline = {"results": [result(0.0, 0.0)]}
+    report = {"results": [result(0.5, 10.0)]}
+
+    regressions = compare(report, baseline, tolerance=0.1)
+
+    assert [r["metric"] for r in regressions] == ["p95"]
+    assert regressions[0]["change"] is None
+
+
+def test_routing_trials_leave_no_cache_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    suite = BenchmarkSuite(
+        ["What is 2+2?", "What is the capital of France?"],
+        trials=2,
+        warmup=0,
+        configurations=["routing_warm"]
+    )
+
+    report = suite.run()
+
+    assert report["results"][0]["configuration"] == "routing_warm"
+    assert not os.path.exists(os.path.join("data", "cache"))
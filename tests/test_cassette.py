@@ -0,0 +1,101 @@
+import pytest
+
+from models.cassette import (
+    Cassette,
+    CassetteMiss,
+    RecordedError,
+    RecordingModel,
+    ReplayModel
+)
+from models.mock_model import MockModel
+from router.cache import Cache
+from router.query_router import RuleRouter
+
+
+class BrokenModel(MockModel):
+    def generate(self, prompt, level="simple", model_name=None):
+        raise RuntimeError("quota exceeded")
+
+
+def test_recorded_calls_replay_the_same_answers(tmp_path):
+    path = str(tmp_path / "calls.cassette")
+    cassette = Cassette(path)
+    recorder = RecordingModel(MockModel(seed=1), cassette)
+    prompts = ["What is 2+2?", "Explain recursion", "What is 2+2?"]
+    answers = [
+        recorder.generate(prompt, "simple", model_name="mock-simple")
+        for prompt in prompts
+    ]
+    streamed = list(recorder.generate_stream(
+        "Describe a cat",
+        "medium",
+        model_name="mock-medium"
+    ))
+    with pytest.raises(RuntimeError):
+        RecordingModel(BrokenModel(), cassette).generate(
+            "Prove it",
+            "advanced",
+            model_name="mock-advanced"
+        )
+    cassette.close()
+
+    # A fresh process: only the file is shared
+    replayed = Cassette(path)
+    replay = ReplayModel(replayed, speed=0)
+    assert [
+        replay.generate(prompt, "simple", model_name="mock-simple")
+        for prompt in prompts
+    ] == answers
+    assert list(replay.generate_stream(
+        "Describe a cat",
+        "medium",
+        model_name="mock-medium"
+    )) == streamed
+    with pytest.raises(RecordedError, match="quota exceeded"):
+        replay.generate("Prove it", "advanced", model_name="mock-advanced")
+    with pytest.raises(CassetteMiss):
+        replay.generate("Never asked", "simple", model_name="mock-simple")
+
+    assert replayed.stats()["calls"] == 5
+    assert replayed.stats()["misses"] == 1
+
+
+def test_replay_answers_from_another_backend_of_the_tier(tmp_path):
+    path = str(tmp_path / "calls.cassette")
+    cassette = Cassette(path)
+    answer = RecordingModel(MockModel(), cassette).generate(
+        "What is 2+2?",
+        "simple",
+        model_name="gemini-flash"
+    )
+    cassette.close()
+
+    replay = ReplayModel(Cassette(path), speed=0)
+    assert replay.generate(
+        "What is 2+2?",
+        "simple",
+        model_name="mock-simple"
+    ) == answer
+
+
+def test_router_replays_a_recorded_session(tmp_path, monkeypatch):
+    monkeypatch.setenv("MODEL_CASSETTE", str(tmp_path / "router.cassette"))
+    queries = ["What is 2+2?", "Explain the theory of relativity"]
+
+    def route_all():
+        router = RuleRouter(
+            model_provider="mock",
+            cache=Cache(persist=False),
+            tuning=False
+        )
+        return [
+            router.route_query_and_return_response(query)["response"]
+            for query in queries
+        ]
+
+    monkeypatch.setenv("MODEL_CASSETTE_MODE", "record")
+    recorded = route_all()
+    monkeypatch.setenv("MODEL_CASSETTE_MODE", "replay")
+    monkeypatch.setenv("MODEL_CASSETTE_SPEED", "0")
+
+    assert route_all() == recorded
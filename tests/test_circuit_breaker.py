@@ -0,0 +1,95 @@
+import pytest
+
+from models.circuit_breaker import CircuitBreaker, CircuitOpenError
+from router.cache import Cache
+from router.query_router import RuleRouter
+
+
+def mock_router():
+    return RuleRouter(
+        model_provider="mock",
+        cache=Cache(persist=False),
+        tuning=False
+    )
+
+
+def fail(breaker, calls):
+    for _ in range(calls):
+        breaker.before_call()
+        breaker.record(0.01, failed=True)
+
+
+def test_breaker_opens_after_min_calls_of_failures():
+    breaker = CircuitBreaker("mock-simple")
+    fail(breaker, breaker.min_calls - 1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    fail(breaker, 1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.available()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_counts_slow_calls_as_failures():
+    breaker = CircuitBreaker("mock-simple")
+    for _ in range(breaker.min_calls):
+        breaker.before_call()
+        breaker.record(breaker.slow_call_seconds, failed=False)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_breaker_half_open_lets_trial_calls_through():
+    breaker = CircuitBreaker("mock-simple")
+    fail(breaker, breaker.min_calls)
+    breaker.opened_at -= breaker.open_seconds
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    for _ in range(breaker.half_open_calls):
+        breaker.before_call()
+    assert not breaker.available()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_closes_after_a_good_trial():
+    breaker = CircuitBreaker("mock-simple")
+    fail(breaker, breaker.min_calls)
+    breaker.opened_at -= breaker.open_seconds
+
+    breaker.before_call()
+    breaker.record(0.01, failed=False)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.to_dict()["recent_calls"] == 0
+
+
+def test_breaker_reopens_after_a_failed_trial():
+    breaker = CircuitBreaker("mock-simple")
+    fail(breaker, breaker.min_calls)
+    breaker.opened_at -= breaker.open_seconds
+
+    fail(breaker, 1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.times_opened == 2
+
+
+def test_registry_stops_calling_a_failing_mock_backend():
+    router = mock_router()
+    registry = router.model
+    provider = registry._get_provider("mock")
+    calls = []
+
+    def broken(prompt, level, model_name=None):
+        calls.append(model_name)
+        raise RuntimeError("mock outage")
+
+    provider.generate = broken
+    breaker = registry.breakers["mock-simple"]
+    for _ in range(breaker.min_calls):
+        with pytest.raises(RuntimeError):
+            registry.generate_with_backend("What is 2+2?", "simple")
+
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        registry.generate_with_backend("What is 2+2?", "simple")
+    assert len(calls) == breaker.min_calls
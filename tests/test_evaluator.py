@@ -0,0 +1,43 @@
+import json
+import time
+from types import SimpleNamespace
+
+from evaluation import evaluator as evaluator_module
+from evaluation.evaluator import Evaluator
+from router.cache import Cache
+from router.query_router import RuleRouter
+
+
+def test_rate_limit_wait_follows_the_serving_tier(tmp_path, monkeypatch):
+    queries_file = tmp_path / "queries.json"
+    with open(queries_file, "w", encoding="utf-8") as f:
+        json.dump({"queries": [
+            {"id": 1, "text": "What is 2+2?", "true_label": "simple"},
+            {"id": 2, "text": "What is 2+2?", "true_label": "simple"}
+        ]}, f)
+
+    sleeps = []
+    # Only the evaluator's own sleeps are recorded
+    monkeypatch.setattr(evaluator_module, "time", SimpleNamespace(
+        perf_counter=time.perf_counter,
+        sleep=sleeps.append
+    ))
+    evaluator = Evaluator(str(queries_file))
+    evaluator.config.EVALUATION_RATE_LIMIT_WAIT = {
+        "mock": {"simple": 7, "medium": 11, "advanced": 13}
+    }
+    router = RuleRouter(
+        model_provider="mock",
+        cache=Cache(persist=False),
+        tuning=False
+    )
+
+    result = evaluator.test_system(router)
+
+    # The first answer waits on the tier that served it; the repeat is
+    # a cache hit and doesn't wait
+    served = router.model.level_of(
+        router.cache.get("What is 2+2?")["model"]
+    )
+    assert result["queries_tested"] == 2
+    assert sleeps == [{"simple": 7, "medium": 11, "advanced": 13}[served]]
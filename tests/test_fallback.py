@@ -0,0 +1,104 @@
+import pytest
+
+from router.cache import Cache
+from router.query_router import RuleRouter
+
+QUERY = "What is 2+2?"
+
+
+def mock_router():
+    return RuleRouter(
+        model_provider="mock",
+        cache=Cache(persist=False),
+        tuning=False
+    )
+
+
+def patch_tiers(router, answers):
+    # answers: tier -> text, an exception to raise or a function called
+    # for either; other tiers answer as the mock does
+    provider = router.model._get_provider("mock")
+    generate = provider.generate
+
+    def patched(prompt, level, model_name=None):
+        answer = answers.get(level)
+        if callable(answer):
+            answer = answer()
+        if isinstance(answer, Exception):
+            raise answer
+        if answer is not None:
+            return answer
+        return generate(prompt, level, model_name)
+
+    provider.generate = patched
+
+
+def stream_events(router, query=QUERY, **kwargs):
+    return list(router.route_query_stream(query, **kwargs))
+
+
+def streamed_text(events):
+    return "".join(
+        event["text"] for event in events if event["event"] == "chunk"
+    )
+
+
+def test_invalid_answer_falls_back_on_both_routes():
+    for stream in (False, True):
+        router = mock_router()
+        patch_tiers(router, {"simple": ""})
+        if stream:
+            events = stream_events(router, use_cache=False)
+            model = events[-1]["model_name"]
+            text = streamed_text(events)
+        else:
+            result = router.route_query_and_return_response(
+                QUERY,
+                use_cache=False,
+                model_level="simple"
+            )
+            model, text = result["model_name"], result["response"]
+
+        assert router.model.level_of(model) != "simple"
+        assert text
+
+
+def test_refused_stream_opening_is_never_sent():
+    router = mock_router()
+    patch_tiers(router, {"simple": "I cannot help with that. " * 10})
+    events = stream_events(router, use_cache=False)
+
+    assert "cannot" not in streamed_text(events)
+    assert router.model.level_of(events[-1]["model_name"]) != "simple"
+
+
+def test_stream_serves_a_stale_answer_when_every_tier_fails():
+    router = mock_router()
+
+    def outage():
+        # Another request answers the query while this one's calls fail
+        router.cache.set(QUERY, "Four.", "mock-medium", "simple")
+        return RuntimeError("outage")
+
+    patch_tiers(router, {
+        "simple": outage,
+        "medium": RuntimeError("outage"),
+        "advanced": RuntimeError("outage")
+    })
+    events = stream_events(router)
+
+    assert events[-1]["stale"]
+    assert streamed_text(events) == "Four."
+
+
+def test_stream_without_a_stale_answer_raises():
+    router = mock_router()
+    patch_tiers(router, {
+        "simple": RuntimeError("outage"),
+        "medium": RuntimeError("outage"),
+        "advanced": RuntimeError("outage")
+    })
+
+    with pytest.raises(RuntimeError):
+        stream_events(router)
+    assert router.usage.summary()[0]["calls"] == 1
@@ -0,0 +1,55 @@
+import json
+import os
+
+from evaluation.report_index import CsvReport, ReportIndex
+
+
+def write_json(path, content, mtime):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(content, f)
+    os.utime(path, (mtime, mtime))
+
+
+def test_reports_are_listed_newest_first(tmp_path):
+    write_json(tmp_path / "old.json", {}, 1_000_000)
+    write_json(tmp_path / "new.json", {}, 2_000_000)
+    index = ReportIndex(str(tmp_path))
+    index.refresh()
+
+    assert [report[0] for report in index.reports] == [
+        "new.json",
+        "old.json"
+    ]
+    reports, total = index.search("old")
+    assert total == 1
+    assert reports[0][0] == "old.json"
+
+
+def test_report_rewritten_in_place_is_reloaded(tmp_path):
+    path = tmp_path / "evaluation.json"
+    write_json(path, {"accuracy": 0.5}, 1_000_000)
+    index = ReportIndex(str(tmp_path))
+    index.refresh()
+    assert index.load("evaluation.json") == {"accuracy": 0.5}
+
+    # Same directory entries, so the directory mtime doesn't move
+    dir_mtime = os.stat(tmp_path).st_mtime_ns
+    write_json(path, {"accuracy": 0.75}, 1_000_100)
+    os.utime(tmp_path, ns=(dir_mtime, dir_mtime))
+    index.refresh()
+
+    assert index.reports[0][1] == 1_000_100
+    assert index.load("evaluation.json") == {"accuracy": 0.75}
+
+
+def test_csv_reports_are_paged_from_disk(tmp_path):
+    with open(tmp_path / "rows.csv", "w", encoding="utf-8") as f:
+        f.write("query,tier\n")
+        for i in range(5):
+            f.write(f"q{i},simple\n")
+    index = ReportIndex(str(tmp_path))
+
+    report = index.load("rows.csv")
+    assert report == CsvReport("rows.csv", ["query", "tier"], 5)
+    rows = index.read_rows("rows.csv", 3, 10)
+    assert [row["query"] for row in rows] == ["q3", "q4"]
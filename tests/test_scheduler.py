@@ -0,0 +1,212 @@
+import threading
+import time
+
+import pytest
+
+from router.cache import Cache
+from router.query_router import RuleRouter
+from router.scheduler import (
+    DeadlineExceeded,
+    RequestScheduler,
+    SchedulerOverloaded
+)
+
+ADVANCED_QUERY = (
+    "Prove the halting problem is undecidable and analyze the "
+    "implications for compiler optimization"
+)
+
+
+def mock_router():
+    return RuleRouter(
+        model_provider="mock",
+        cache=Cache(persist=False),
+        tuning=False
+    )
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = RequestScheduler(mock_router())
+    release = threading.Event()
+    scheduler.release = release
+    yield scheduler
+    release.set()
+    scheduler.shutdown(timeout=5)
+
+
+def block_workers(scheduler, tier):
+    # Occupy every worker of tier until the test releases them
+    tier_queue = scheduler.tiers[tier]
+    futures = [
+        scheduler.submit(
+            lambda level: scheduler.release.wait(5),
+            tier,
+            downgradable=False
+        )
+        for _ in range(tier_queue.workers)
+    ]
+    while scheduler.stats()["tiers"][tier]["running"] < tier_queue.workers:
+        time.sleep(0.01)
+    return futures
+
+
+def test_scheduler_routes_through_the_mock_model(scheduler):
+    result = scheduler.route("What is 2+2?").result(timeout=5)
+    assert result["model_name"].startswith("mock-")
+    assert scheduler.stats()["priorities"]["interactive"]["completed"] == 1
+
+
+def test_full_queue_evicts_lower_priority_work(scheduler):
+    block_workers(scheduler, "simple")
+    scheduler.max_queued = 2
+    batch = [
+        scheduler.submit(lambda level: level, "simple", priority="batch")
+        for _ in range(2)
+    ]
+
+    # The newest batch request makes room
+    interactive = scheduler.submit(lambda level: level, "simple")
+    with pytest.raises(SchedulerOverloaded):
+        batch[1].result(timeout=1)
+    assert not batch[0].done()
+    assert scheduler.stats()["priorities"]["batch"]["evicted"] == 1
+
+    # Nothing ranks below interactive, so a queue full of it refuses more
+    interactive_too = scheduler.submit(lambda level: level, "simple")
+    with pytest.raises(SchedulerOverloaded):
+        batch[0].result(timeout=1)
+    with pytest.raises(SchedulerOverloaded):
+        scheduler.submit(lambda level: level, "simple")
+    assert scheduler.stats()["priorities"]["interactive"]["rejected"] == 1
+
+    scheduler.release.set()
+    assert interactive.result(timeout=5) == "simple"
+    assert interactive_too.result(timeout=5) == "simple"
+
+
+def test_request_is_downgraded_when_its_tier_would_miss_the_deadline(
+        scheduler):
+    scheduler.tiers["advanced"].service_time = 100.0
+    scheduler.tiers["medium"].service_time = 0.01
+
+    future = scheduler.submit(lambda level: level, "advanced", deadline=10)
+    assert future.result(timeout=5) == "medium"
+    assert scheduler.stats()["priorities"]["interactive"]["downgraded"] == 1
+
+
+def test_downgraded_route_is_served_by_the_cheaper_mock_model(scheduler):
+    query = ADVANCED_QUERY
+    tier = scheduler.router.classify(query, None)
+    cheaper = RequestScheduler.DOWNGRADE_MAP[tier]
+    scheduler.tiers[tier].service_time = 100.0
+    scheduler.tiers[cheaper].service_time = 0.01
+
+    result = scheduler.route(query, deadline=10).result(timeout=5)
+    assert result["complexity"] == tier
+    assert result["model_name"] == f"mock-{cheaper}"
+
+
+def test_request_is_not_downgraded_when_not_downgradable(scheduler):
+    scheduler.tiers["advanced"].service_time = 100.0
+    scheduler.tiers["medium"].service_time = 0.01
+
+    future = scheduler.submit(
+        lambda level: level,
+        "advanced",
+        deadline=10,
+        downgradable=False
+    )
+    assert future.result(timeout=5) == "advanced"
+
+
+def test_expired_request_is_dropped(scheduler):
+    block_workers(scheduler, "simple")
+    ran = []
+    future = scheduler.submit(
+        ran.append,
+        "simple",
+        deadline=0.05,
+        downgradable=False
+    )
+    time.sleep(0.1)
+    scheduler.release.set()
+
+    with pytest.raises(DeadlineExceeded):
+        future.result(timeout=5)
+    assert ran == []
+    assert scheduler.stats()["priorities"]["interactive"]["dropped"] == 1
+
+
+def make_tier_slow(scheduler, tier):
+    cheaper = RequestScheduler.DOWNGRADE_MAP[tier]
+    scheduler.tiers[tier].service_time = 100.0
+    scheduler.tiers[cheaper].service_time = 0.01
+    return cheaper
+
+
+def test_rejected_request_is_not_counted_as_downgraded(scheduler):
+    cheaper = make_tier_slow(scheduler, "advanced")
+    block_workers(scheduler, cheaper)
+    scheduler.max_queued = 1
+    scheduler.submit(lambda level: level, "advanced", deadline=10)
+
+    with pytest.raises(SchedulerOverloaded):
+        scheduler.submit(lambda level: level, "advanced", deadline=10)
+    stats = scheduler.stats()["priorities"]["interactive"]
+    assert stats["downgraded"] == 1
+    assert stats["rejected"] == 1
+
+
+def test_downgraded_request_keeps_an_invalid_cheaper_answer(scheduler):
+    router = scheduler.router
+    tier = router.classify(ADVANCED_QUERY, None)
+    cheaper = make_tier_slow(scheduler, tier)
+    provider = router.model._get_provider("mock")
+    levels = []
+
+    def refuse(prompt, level, model_name=None):
+        levels.append(level)
+        return "I don't know."
+
+    provider.generate = refuse
+    result = scheduler.route(ADVANCED_QUERY, deadline=10).result(timeout=5)
+    assert result["response"] == "I don't know."
+    assert result["model_name"] == f"mock-{cheaper}"
+    assert levels == [cheaper]
+
+
+def test_failed_downgraded_request_is_retried_on_its_own_tier(scheduler):
+    router = scheduler.router
+    tier = router.classify(ADVANCED_QUERY, None)
+    cheaper = make_tier_slow(scheduler, tier)
+    provider = router.model._get_provider("mock")
+    generate = provider.generate
+
+    def cheaper_down(prompt, level, model_name=None):
+        if level == cheaper:
+            raise RuntimeError("mock outage")
+        return generate(prompt, level, model_name=model_name)
+
+    provider.generate = cheaper_down
+    result = scheduler.route(ADVANCED_QUERY, deadline=10).result(timeout=5)
+    assert result["model_name"] == f"mock-{tier}"
+    stats = scheduler.stats()["priorities"]["interactive"]
+    assert stats["retried"] == 1
+    assert stats["completed"] == 1
+
+
+def test_router_fallback_stops_below_the_classified_tier():
+    router = mock_router()
+    tier = router.classify(ADVANCED_QUERY, None)
+    cheaper = RequestScheduler.DOWNGRADE_MAP[tier]
+    provider = router.model._get_provider("mock")
+    provider.generate = lambda prompt, level, model_name=None: "I'm not sure"
+
+    result = router.route_query_and_return_response(
+        ADVANCED_QUERY,
+        use_cache=False,
+        model_level=cheaper
+    )
+    assert result["model_name"] == f"mock-{cheaper}"
+    assert result["complexity"] == tier
@@ -0,0 +1,191 @@
+import http.client
+import json
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from router.cache import Cache
+from router.query_router import RuleRouter
+from router.scheduler import SchedulerOverloaded
+from server import RouterServer
+
+
+def mock_router():
+    return RuleRouter(
+        model_provider="mock",
+        cache=Cache(persist=False),
+        tuning=False
+    )
+
+
+class StubScheduler:
+    # Stands in for RequestScheduler: route() raises or returns whatever
+    # the test sets
+    default_deadlines = {"interactive": 60, "batch": None, "prefetch": 600}
+
+    def __init__(self, route):
+        self.route = route
+        self.shut_down = False
+
+    def shutdown(self, timeout=None):
+        self.shut_down = True
+
+    def stats(self):
+        return {}
+
+
+def serve(scheduler=None, router=None):
+    server = RouterServer(
+        router or mock_router(),
+        port=0,
+        workers=2,
+        scheduler=scheduler
+    )
+    server.start_workers()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, thread
+
+
+@pytest.fixture
+def server():
+    server, thread = serve()
+    yield server
+    server.drain(timeout=5)
+    thread.join(5)
+
+
+def post(server, path, body):
+    host, port = server.server_address[:2]
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    try:
+        connection.request(
+            "POST",
+            path,
+            json.dumps(body),
+            {"Content-Type": "application/json"}
+        )
+        response = connection.getresponse()
+        return response.status, response.read().decode("utf-8")
+    finally:
+        connection.close()
+
+
+def test_route_answers_a_query(server):
+    status, body = post(server, "/route", {"query": "What is 2+2?"})
+    result = json.loads(body)
+
+    assert status == 200
+    assert result["query"] == "What is 2+2?"
+    assert result["response"]
+
+
+def test_route_batch_answers_every_query(server):
+    queries = ["What is 2+2?", "What is the capital of France?"]
+    status, body = post(server, "/route_batch", {"queries": queries})
+    results = json.loads(body)["results"]
+
+    assert status == 200
+    assert [result["query"] for result in results] == queries
+    assert all("error" not in result for result in results)
+
+
+@pytest.mark.parametrize("deadline", [True, 0, -1, "10"])
+def test_invalid_deadlines_are_rejected(server, deadline):
+    status, _ = post(server, "/route", {
+        "query": "What is 2+2?",
+        "deadline": deadline
+    })
+    assert status == 400
+
+
+def test_stream_sends_start_chunks_and_end(server):
+    status, body = post(server, "/route/stream", {"query": "What is 2+2?"})
+    events = [json.loads(line) for line in body.splitlines()]
+
+    assert status == 200
+    assert events[0]["event"] == "start"
+    assert events[-1]["event"] == "end"
+    assert any(event["event"] == "chunk" for event in events)
+
+
+def test_overloaded_scheduler_answers_503():
+    def route(query, **kwargs):
+        raise SchedulerOverloaded("medium queue is full")
+
+    server, thread = serve(StubScheduler(route))
+    try:
+        status, body = post(server, "/route", {"query": "What is 2+2?"})
+    finally:
+        server.drain(timeout=5)
+        thread.join(5)
+
+    assert status == 503
+    assert "full" in json.loads(body)["error"]
+
+
+def test_missed_deadline_answers_504():
+    pending = []
+
+    def route(query, **kwargs):
+        pending.append(Future())
+        return pending[-1]
+
+    server, thread = serve(StubScheduler(route))
+    try:
+        status, _ = post(server, "/route", {
+            "query": "What is 2+2?",
+            "deadline": 0.1
+        })
+    finally:
+        server.drain(timeout=5)
+        thread.join(5)
+
+    assert status == 504
+    assert pending[0].cancelled()
+
+
+def test_stream_past_its_deadline_ends_with_an_error():
+    router = mock_router()
+    release = threading.Event()
+
+    def slow_stream(query, use_cache=True, session=None):
+        yield {"event": "start", "complexity": "simple", "cached": False}
+        release.wait(5)
+        yield {"event": "end", "model_name": "mock", "cached": False}
+
+    router.route_query_stream = slow_stream
+    server, thread = serve(router=router)
+    try:
+        status, body = post(server, "/route/stream", {
+            "query": "What is 2+2?",
+            "deadline": 0.1
+        })
+    finally:
+        release.set()
+        server.drain(timeout=5)
+        thread.join(5)
+
+    events = [json.loads(line) for line in body.splitlines()]
+    assert status == 200
+    assert [event["event"] for event in events] == ["start", "error"]
+
+
+def test_drain_returns_without_serve_forever():
+    scheduler = StubScheduler(None)
+    server = RouterServer(
+        mock_router(),
+        port=0,
+        workers=2,
+        scheduler=scheduler
+    )
+    server.start_workers()
+
+    drainer = threading.Thread(target=server.drain, args=(5,), daemon=True)
+    drainer.start()
+    drainer.join(10)
+
+    assert not drainer.is_alive()
+    assert scheduler.shut_down
+    assert not any(worker.is_alive() for worker in server.workers)
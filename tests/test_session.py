@@ -0,0 +1,108 @@
+import threading
+
+from router.cache import Cache
+from router.query_router import RuleRouter
+from router.session import Session, estimate_tokens, is_context_key
+
+
+def mock_router():
+    return RuleRouter(
+        model_provider="mock",
+        cache=Cache(persist=False),
+        tuning=False
+    )
+
+
+def test_standalone_questions_use_the_plain_cache_key():
+    session = Session()
+    assert session.cache_key("What is Python?") == "What is Python?"
+
+    session.add_turn("What is Python?", "A programming language.", "simple")
+    assert session.cache_key("What is Rust?") == "What is Rust?"
+
+
+def test_follow_ups_are_keyed_by_their_context():
+    session = Session()
+    assert session.cache_key("why?") == "why?"
+
+    session.add_turn("What is Python?", "A programming language.", "simple")
+    key = session.cache_key("why?")
+    assert is_context_key(key)
+    assert key.startswith("why?")
+
+    session.add_turn("why?", "It was designed that way.", "simple")
+    assert session.cache_key("why?") != key
+
+
+def test_repeated_standalone_question_hits_the_cache_in_a_session():
+    router = mock_router()
+    session = router.new_session()
+    first = router.route_query_and_return_response(
+        "What is the capital of France?",
+        session=session
+    )
+    router.route_query_and_return_response("What is 2+2?", session=session)
+    again = router.route_query_and_return_response(
+        "What is the capital of France?",
+        session=session
+    )
+
+    assert not first["cached"]
+    assert again["cached"]
+    assert not any(is_context_key(key) for key in router.cache.memory_cache)
+    assert session.turn_count == 3
+
+
+def test_context_stays_within_budget():
+    session = Session()
+    session.context_tokens = 200
+    session.summary_tokens = 50
+    for i in range(50):
+        session.add_turn(f"Question {i}?", "An answer. " * 20, "simple")
+
+    assert estimate_tokens(session.context()) <= session.context_tokens
+    assert session.turns
+    assert session.summary
+
+
+def test_summarizer_runs_outside_the_session_lock():
+    seen = []
+
+    def summarizer(summary, turns, max_tokens):
+        # Would deadlock if called with the session lock held
+        seen.append(session.to_dict()["turns"])
+        return "summary"
+
+    session = Session(summarizer=summarizer)
+    session.context_tokens = 100
+    session.summary_tokens = 20
+
+    def talk():
+        for i in range(10):
+            session.add_turn(f"Question {i}?", "An answer. " * 10, "simple")
+
+    thread = threading.Thread(target=talk, daemon=True)
+    thread.start()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert seen
+    assert session.summary == "summary"
+    assert not session.folding
+
+
+def test_record_turn_false_leaves_the_session_to_the_caller():
+    router = mock_router()
+    session = router.new_session()
+    result = router.route_query_and_return_response(
+        "What is 2+2?",
+        session=session,
+        record_turn=False
+    )
+    assert session.turn_count == 0
+
+    router.add_turn(session, result)
+    assert session.turn_count == 1
+    assert session.features()["last_tier"] == router.model.level_of(
+        result["model_name"]
+    )
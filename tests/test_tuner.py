@@ -0,0 +1,95 @@
+import json
+import os
+
+import pytest
+
+from router.cache import Cache
+from router.query_router import RuleRouter
+from router.rules import (
+    RoutingThresholds,
+    classify_query,
+    get_thresholds,
+    set_thresholds
+)
+from router.tuner import RoutingTuner
+
+
+@pytest.fixture
+def tuner(tmp_path, monkeypatch):
+    # The tuner keeps its files under data/tuning of the working directory
+    monkeypatch.chdir(tmp_path)
+    thresholds = get_thresholds()
+    yield RoutingTuner()
+    set_thresholds(thresholds)
+
+
+def observation(length, tier, final_tier):
+    return {
+        "features": {
+            "length": length,
+            "simple_factual": True,
+            "complex_keywords": []
+        },
+        "tier": tier,
+        "final_tier": final_tier,
+        "fallback": final_tier != tier,
+        "latency": None,
+        "response_length": 100,
+        "timestamp": 0
+    }
+
+
+def test_refit_lowers_the_simple_length_when_simple_falls_back(tuner):
+    # Simple answers short questions validly and fails on longer ones
+    observations = []
+    for length in range(10, 50):
+        if length <= 30:
+            observations.append(observation(length, "simple", "simple"))
+        else:
+            observations.append(observation(length, "simple", "medium"))
+
+    before = get_thresholds()
+    thresholds = tuner.refit(observations * 5)
+
+    assert thresholds.max_simple_length < before.max_simple_length
+    assert thresholds.max_simple_length >= before.max_simple_length / 2
+    assert thresholds.max_medium_length > thresholds.max_simple_length
+
+
+def test_applied_thresholds_are_loaded_with_the_tuner_off(tuner):
+    thresholds = RoutingThresholds.from_config()
+    thresholds.max_simple_length = 5
+    tuner.apply(thresholds)
+    with open(tuner.thresholds_file, "r", encoding="utf-8") as f:
+        assert json.load(f)["max_simple_length"] == 5
+
+    # A new process: configured thresholds until the router starts
+    set_thresholds(RoutingThresholds.from_config())
+    assert classify_query("What is 2+2?") == "simple"
+
+    router = RuleRouter(
+        model_provider="mock",
+        cache=Cache(persist=False),
+        tuning=False
+    )
+    assert router.tuner is None
+    assert get_thresholds().max_simple_length == 5
+    assert classify_query("What is 2+2?") != "simple"
+
+
+def test_observations_are_buffered_and_the_log_rotates(tuner):
+    tuner.flush_every = 10
+    tuner.log_limit = 25
+    tuner.min_observations = 10 ** 6
+    for i in range(9):
+        tuner.observe("What is 2+2?", "simple", "simple", 0.1, 10)
+    assert not os.path.exists(tuner.log_file)
+
+    for i in range(31):
+        tuner.observe("What is 2+2?", "simple", "simple", 0.1, 10)
+    assert os.path.exists(tuner.rotated_log_file)
+
+    tuner.flush()
+    assert len(tuner.load_log()) == 25
+    with open(tuner.log_file, "r", encoding="utf-8") as f:
+        assert sum(1 for _ in f) == 10
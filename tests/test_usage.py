@@ -0,0 +1,90 @@
+import json
+
+from router.cache import Cache
+from router.query_router import RuleRouter
+from router.usage import UsageTracker
+
+
+def mock_router():
+    return RuleRouter(
+        model_provider="mock",
+        cache=Cache(persist=False),
+        tuning=False
+    )
+
+
+def calls_by_cached(router):
+    counts = {}
+    for row in router.usage.summary():
+        counts[row["cached"]] = counts.get(row["cached"], 0) + row["calls"]
+    return counts
+
+
+def test_windows_only_count_recent_entries():
+    usage = UsageTracker()
+    usage.record("simple", "Rule-based", False, 0.5, 10, 20, 0.001)
+    usage.record("simple", "Rule-based", False, 1.5, 10, 20, 0.001)
+    buffer = usage.buffers[("simple", "Rule-based", False)]
+    buffer.columns["timestamp"][0] -= 3600
+
+    recent = usage.summary(60)
+    assert len(recent) == 1
+    assert recent[0]["calls"] == 1
+    assert recent[0]["input_tokens"] == 10
+    assert usage.summary()[0]["calls"] == 2
+
+
+def test_ring_buffer_keeps_the_newest_entries():
+    usage = UsageTracker()
+    usage.capacity = 3
+    for duration in range(5):
+        usage.record("simple", "Rule-based", True, float(duration))
+
+    row = usage.summary()[0]
+    assert row["calls"] == 3
+    assert row["mean_duration"] == 3.0
+
+
+def test_export_writes_every_window(tmp_path):
+    usage = UsageTracker()
+    usage.report_dir = str(tmp_path)
+    usage.record("medium", "Rule-based", False, 0.25, 5, 7, 0.002)
+
+    with open(usage.export(), "r", encoding="utf-8") as f:
+        report = json.load(f)
+
+    assert set(report["windows"]) == {
+        str(window or "all") for window in usage.windows
+    }
+    assert report["windows"]["all"][0]["output_tokens"] == 7
+
+
+def test_a_request_that_falls_back_is_recorded_once():
+    router = mock_router()
+    provider = router.model._get_provider("mock")
+    generate = provider.generate
+
+    def broken_simple(prompt, level, model_name=None):
+        if level == "simple":
+            raise RuntimeError("mock outage")
+        return generate(prompt, level, model_name)
+
+    provider.generate = broken_simple
+    result = router.route_query_and_return_response(
+        "What is 2+2?",
+        model_level="simple"
+    )
+
+    rows = router.usage.summary()
+    assert len(rows) == 1
+    assert rows[0]["calls"] == 1
+    assert rows[0]["tier"] == router.model.level_of(result["model_name"])
+
+
+def test_stream_records_hits_and_misses():
+    router = mock_router()
+    query = "What is the capital of France?"
+    list(router.route_query_stream(query))
+    list(router.route_query_stream(query))
+
+    assert calls_by_cached(router) == {False: 1, True: 1}